@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+
+def rolling_slope(values, window):
+    # Least-squares slope of every `window`-long run, with x = 0..window-1,
+    # computed for all windows at once from cumulative sums.
+    y = np.asarray(values, dtype=float)
+    n = len(y)
+    slopes = np.full(n, np.nan)
+    if window < 2 or n < window:
+        return slopes
+
+    missing = np.isnan(y)
+    # Centering keeps the cumulative sums small on long series; the slope is
+    # unaffected by a constant offset.
+    y = np.where(missing, 0.0, y - np.nanmean(y))
+    k = np.arange(n, dtype=float)
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    cum_ky = np.concatenate(([0.0], np.cumsum(k * y)))
+    cum_missing = np.concatenate(([0], np.cumsum(missing)))
+
+    start = np.arange(n - window + 1)
+    end = start + window
+    sum_y = cum_y[end] - cum_y[start]
+    sum_xy = (cum_ky[end] - cum_ky[start]) - start * sum_y
+
+    sum_x = window * (window - 1) / 2
+    sum_xx = (window - 1) * window * (2 * window - 1) / 6
+    window_slopes = (window * sum_xy - sum_x * sum_y) / (window * sum_xx - sum_x ** 2)
+    window_slopes[(cum_missing[end] - cum_missing[start]) > 0] = np.nan
+    slopes[window - 1:] = window_slopes
+    return slopes
+
+
+def dp_series(df):
+    return (df['P_In'] - df['P_Out']).rename('DP')
+
+
+def dp_trend(df, window=5):
+    return pd.Series(rolling_slope(dp_series(df).to_numpy(), window), index=df.index, name='DP_Slope')
+
+
+def analyze_dp_trend(df, window=5, threshold_slope=0.05):
+    if len(df) < window:
+        return False, 0
+    dp = dp_series(df.tail(window)).to_numpy()
+    slope = rolling_slope(dp, window)[-1]
+    return bool(slope > threshold_slope), float(slope)
+
+
+def performance_indicators(df, reference=0):
+    # Normalized to the row at position `reference` (the first reading by
+    # default), so values read as "relative to start-up conditions".
+    p_in = df['P_In'].to_numpy(dtype=float)
+    p_out = df['P_Out'].to_numpy(dtype=float)
+    p_perm = df['P_Perm'].to_numpy(dtype=float) if 'P_Perm' in df else np.zeros(len(df))
+    f_perm = df['F_Perm'].to_numpy(dtype=float)
+    f_rej = df['F_Rej'].to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        recovery = f_perm / (f_perm + f_rej)
+        # Net driving pressure without osmotic terms (no conductivity data).
+        ndp = (p_in + p_out) / 2 - p_perm
+        npf = f_perm * ndp[reference] / ndp
+        # Average feed-concentrate concentration factor for the recovery.
+        concentration = np.where(recovery > 0, -np.log1p(-recovery) / recovery, 1.0)
+        salt_passage = (concentration / f_perm) / (concentration[reference] / f_perm[reference])
+
+    return pd.DataFrame({
+        'DP': p_in - p_out,
+        'NDP': ndp,
+        'Recovery': recovery,
+        'NPF': npf,
+        'Salt_Passage': salt_passage,
+    }, index=df.index)
+
+
+def stock_alert_mask(inventory_df, critical_stock=20):
+    return inventory_df['Stock'].to_numpy(dtype=float) < critical_stock
+
+
+def lttb_indices(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the first and last points and, for
+    # each bucket in between, the point forming the largest triangle with the
+    # previously kept point and the average of the next bucket.
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + (int(np.nanargmax(area)) if not np.isnan(area).all() else 0)
+        kept[bucket + 1] = previous
+    return kept
+
+
+def downsample(df, x_column, y_column, max_points):
+    if len(df) <= max_points:
+        return df[[x_column, y_column]]
+    x = df[x_column]
+    if pd.api.types.is_datetime64_any_dtype(x):
+        x = x.astype('int64').to_numpy()
+    elif pd.api.types.is_numeric_dtype(x):
+        x = x.to_numpy()
+    else:
+        x = np.arange(len(df))
+    return df[[x_column, y_column]].iloc[lttb_indices(x, df[y_column].to_numpy(), max_points)]
@@ -4,8 +4,8 @@ from datetime import datetime
 import os
 
 from storage import ROStorage
-from logic import analyze_dp_trend, calculate_daily_production, check_stock_alerts
-from dashboard import create_gauge, create_line_chart
+from logic import calculate_daily_production, check_stock_alerts, stock_forecast, update_consumption_rate
+from caching import DASHBOARD_COLUMNS, dashboard_figures, dp_trend, get_storage, load_inventory, load_operational, load_rollups
 
 # Page config
 st.set_page_config(page_title="RO Monitoring System", layout="wide", initial_sidebar_state="expanded")
@@ -48,8 +48,9 @@ with st.sidebar:
     st.divider()
     page = st.selectbox("Menu", ["Dashboard", "Ingreso de Datos", "Inventario", "Configuración"])
 
-# Initialize storage
-storage = ROStorage(st.session_state.data_path)
+# Initialize storage (cached per data path, see caching.py)
+data_path = st.session_state.data_path
+storage = get_storage(data_path)
 
 # --- Pages Logic ---
 
@@ -59,28 +60,34 @@ if st.session_state.role is None:
 else:
     if page == "Dashboard":
         st.title("📊 Panel de Monitoreo")
-        df = storage.get_operational_data()
+        version = storage.operational_version()
+        df = load_operational(data_path, version, DASHBOARD_COLUMNS)
         
         if df.empty:
             st.info("No hay datos históricos. Por favor ingrese datos diarios.")
         else:
             # Alerts row
-            is_inc, slope = analyze_dp_trend(df)
+            is_inc, slope = dp_trend(data_path, version)
             if is_inc:
                 st.error(f"🚨 **ALERTA: Anticipación de Saturación de Membranas** (Tendencia ΔP positiva: {slope:.3f})")
             
             # Gauges
-            last_entry = df.iloc[-1]
+            gauges, line_chart = dashboard_figures(data_path, version, st.session_state.get('theme'))
             c1, c2, c3, c4 = st.columns(4)
-            with c1: st.plotly_chart(create_gauge(last_entry['P_In'], "P. Entrada", "psi", 0, 400), use_container_width=True)
-            with c2: st.plotly_chart(create_gauge(last_entry['P_Out'], "P. Salida", "psi", 0, 400), use_container_width=True)
-            with c3: st.plotly_chart(create_gauge(last_entry['F_Perm'], "C. Permeado", "LPH", 0, 2000), use_container_width=True)
-            with c4: st.plotly_chart(create_gauge(last_entry['F_Rej'], "C. Rechazo", "LPH", 0, 2000), use_container_width=True)
+            for col, gauge in zip((c1, c2, c3, c4), gauges):
+                with col: st.plotly_chart(gauge, use_container_width=True)
 
             # Trends
             st.subheader("Evolución de Presiones (ΔP)")
-            df['DP'] = df['P_In'] - df['P_Out']
-            st.plotly_chart(create_line_chart(df, ['P_In', 'P_Out', 'DP'], "Tendencia de Presiones"), use_container_width=True)
+            st.plotly_chart(line_chart, use_container_width=True)
+
+            # Period summary, read from the pre-aggregated rollups
+            st.subheader("Resumen por Periodo")
+            periods = {"Día": "day", "Semana": "week", "Mes": "month"}
+            period = st.radio("Agrupar por", list(periods), horizontal=True)
+            summary = load_rollups(data_path, version, periods[period])
+            st.bar_chart(summary, x='Period', y='Production')
+            st.dataframe(summary, use_container_width=True, hide_index=True)
 
     elif page == "Ingreso de Datos":
         st.title("📝 Registro de Operación Diaria")
@@ -103,13 +110,13 @@ else:
             
             st.subheader("Consumo Químicos")
             chem_cons = {}
-            inv_df = storage.get_inventory()
+            inv_df = load_inventory(data_path, storage.inventory_version())
             for chem in inv_df['Chemical']:
                 chem_cons[chem] = st.number_input(f"Consumo {chem} (L)", min_value=0.0)
 
             if st.form_submit_button("Guardar Registro"):
                 # Calculate production diff
-                df = storage.get_operational_data()
+                df = load_operational(data_path, storage.operational_version(), ('Meter_Reading',))
                 last_meter = df.iloc[-1]['Meter_Reading'] if not df.empty else meter
                 daily_prod = calculate_daily_production(meter, last_meter)
                 
@@ -124,13 +131,14 @@ else:
                 # Update inventory
                 for chem, cons in chem_cons.items():
                     inv_df.loc[inv_df['Chemical'] == chem, 'Stock'] -= cons
+                inv_df = update_consumption_rate(inv_df, chem_cons)
                 storage.update_inventory(inv_df)
                 
                 st.success(f"Registro guardado con éxito. Producción del día: {daily_prod} L")
 
     elif page == "Inventario":
         st.title("🧪 Gestión de Químicos")
-        inv_df = storage.get_inventory()
+        inv_df = load_inventory(data_path, storage.inventory_version())
         
         # Alerts
         alerts = check_stock_alerts(inv_df)
@@ -139,6 +147,13 @@ else:
         
         # Display table
         st.table(inv_df)
+
+        # Days to depletion from the weighted daily consumption (Daily_Cons)
+        st.subheader("Pronóstico de Reposición")
+        forecast = stock_forecast(inv_df)
+        for chem in forecast.loc[forecast['Reorder_In'] <= 0, 'Chemical']:
+            st.warning(f"Programar pedido: {chem}")
+        st.dataframe(forecast, use_container_width=True)
         
         if st.session_state.role == "Supervisor":
             st.subheader("Ajuste de Stock (Solo Supervisor)")
@@ -157,6 +172,13 @@ else:
             st.error("Acceso restringido a Supervisores.")
         else:
             new_path = st.text_input("Ruta de Almacenamiento Local", value=st.session_state.data_path)
+            backend = st.selectbox(
+                "Formato de datos operativos", ROStorage.BACKENDS,
+                index=ROStorage.BACKENDS.index(storage.backend_name),
+                help="csv: un único archivo CSV. columnar: un archivo binario por sensor, leído con memoria mapeada. sqlite: base de datos SQLite indexada por fecha."
+            )
             if st.button("Guardar Configuración"):
+                # Copies the operational history into the chosen format
+                storage.switch_backend(backend)
                 st.session_state.data_path = new_path
                 st.success("Configuración actualizada. Reinicie para aplicar cambios profundos.")
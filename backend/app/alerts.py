@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import Any
+
+from . import normalization
+from .config import AppConfig
+
+OPERATIONAL = "operational.json"
+CHEMICALS = "chemicals.json"
+
+
+def delta_p(entry: dict[str, Any]) -> float:
+    return float(entry["presiones"]["entrada"]) - float(entry["presiones"]["salida"])
+
+
+def delta_p_norm(entry: dict[str, Any]) -> float | None:
+    """Normalized ΔP stored with the entry, if any; flow changes alone do not move it."""
+    stored = entry.get(normalization.FIELD, {}).get("delta_p_norm")
+    return None if stored is None else float(stored)
+
+
+def linear_slope(values: deque[float] | list[float]) -> float:
+    n = len(values)
+    if n < 2:
+        return 0.0
+    mean_x = (n - 1) / 2
+    mean_y = sum(values) / n
+    numerator = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values))
+    denominator = n * (n * n - 1) / 12
+    return numerator / denominator
+
+
+class AlertEngine:
+    """Keeps alert state up to date as entries are written.
+
+    Storage events update the state incrementally; ``alerts()`` only checks
+    that no other process wrote in the meantime and returns the cached result.
+    """
+
+    def __init__(self, config: AppConfig) -> None:
+        self.config = config
+        self._lock = threading.Lock()
+        self._versions: dict[str, int | None] = {OPERATIONAL: None, CHEMICALS: None}
+        self._stock_alerts: list[dict[str, Any]] = []
+        self._window: deque[float] = deque(maxlen=config.dp_trend_window)
+        self._last_dp: float | None = None
+        self._last_dp_norm: float | None = None
+        self._result: dict[str, list[dict]] = {"stock": [], "delta_p": []}
+
+    def _set_chemicals(self, chemicals: list[dict[str, Any]]) -> None:
+        stock_alerts = []
+        for item in chemicals:
+            initial = float(item.get("stock_inicial", 0))
+            if initial <= 0:
+                continue
+            remaining = float(item.get("stock", 0))
+            percent = (remaining / initial) * 100
+            if percent < self.config.stock_alert_percent:
+                stock_alerts.append(
+                    {
+                        "nombre": item.get("nombre"),
+                        "percent": round(percent, 2),
+                        "stock": remaining,
+                    }
+                )
+        self._stock_alerts = stock_alerts
+
+    def _push_operational(self, entries: list[dict[str, Any]]) -> None:
+        for entry in entries:
+            self._last_dp = delta_p(entry)
+            self._last_dp_norm = delta_p_norm(entry)
+            # The trend follows the normalized value, so a flow change is not a slope.
+            self._window.append(self._last_dp if self._last_dp_norm is None else self._last_dp_norm)
+
+    def _refresh_result(self) -> None:
+        dp_alerts = []
+        if self._last_dp is not None:
+            if self._last_dp >= self.config.dp_threshold:
+                dp_alerts.append(
+                    {
+                        "mensaje": "ΔP alto: posible ensuciamiento de membranas",
+                        "delta_p": round(self._last_dp, 2),
+                    }
+                )
+            if self._last_dp_norm is not None and self._last_dp_norm >= self.config.dp_norm_threshold:
+                dp_alerts.append(
+                    {
+                        "mensaje": "ΔP normalizado alto: ensuciamiento de membranas no explicado por el caudal",
+                        "delta_p": round(self._last_dp, 2),
+                        "delta_p_norm": round(self._last_dp_norm, 2),
+                    }
+                )
+            if len(self._window) == self._window.maxlen:
+                slope = linear_slope(self._window)
+                if slope > self.config.dp_slope_threshold:
+                    dp_alerts.append(
+                        {
+                            "mensaje": "Tendencia de ΔP creciente: ensuciamiento progresivo de membranas",
+                            "delta_p": round(self._last_dp, 2),
+                            "pendiente": round(slope, 3),
+                        }
+                    )
+        self._result = {"stock": self._stock_alerts, "delta_p": dp_alerts}
+
+    def rebuild(self, storage: Any) -> None:
+        with self._lock:
+            chemicals, chem_version = storage.read_versioned(CHEMICALS, [])
+            operational, op_version = storage.read_versioned(OPERATIONAL, [])
+            self._set_chemicals(chemicals)
+            self._window.clear()
+            self._last_dp = None
+            self._last_dp_norm = None
+            self._push_operational(operational[-self.config.dp_trend_window:])
+            self._versions = {OPERATIONAL: op_version, CHEMICALS: chem_version}
+            self._refresh_result()
+
+    def on_storage_event(self, event: str, name: str, payload: Any, version: int) -> None:
+        if name not in self._versions:
+            return
+        with self._lock:
+            seen = self._versions[name]
+            if event == "write" and name == CHEMICALS:
+                self._set_chemicals(payload)
+            elif event == "append" and name == OPERATIONAL and seen is not None and version == seen + 1:
+                self._push_operational(payload)
+            else:
+                # Missed an intermediate write (another worker) or the whole
+                # history was replaced: rebuild on the next lookup.
+                self._versions[name] = None
+                return
+            self._versions[name] = version
+            self._refresh_result()
+
+    def alerts(self, storage: Any) -> dict[str, list[dict]]:
+        if any(storage.version(name) != seen for name, seen in self._versions.items()):
+            self.rebuild(storage)
+        return self._result
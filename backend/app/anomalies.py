@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import re
+from typing import Any
+
+from . import metrics
+from .config import AppConfig
+from .ingest import READINGS
+from .models import ID_PATTERN
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+ANOMALIES = "anomalies.json"
+ANOMALY_STATE = "anomaly_state.json"
+OPERATIONAL = "operational.json"
+SOURCES = {OPERATIONAL: "operational", READINGS: "readings"}
+
+# Sensor -> (group, field) of a record; the names are the Streamlit app's columns.
+SENSORS = {
+    "P_In": ("presiones", "entrada"),
+    "P_Out": ("presiones", "salida"),
+    "P_Rej": ("presiones", "rechazo"),
+    "F_Perm": ("caudales_gpm", "permeado"),
+    "F_Rej": ("caudales_gpm", "rechazo"),
+    "F_Rec": ("caudales_gpm", "recirculacion"),
+}
+
+# MAD * 1.4826 estimates the standard deviation of normally distributed values.
+MAD_SCALE = 1.4826
+# Spreads below 1 % of the level are treated as sensor noise, so a signal that
+# has been flat for a while is not flagged for a rounding-sized change.
+MIN_RELATIVE_SCALE = 0.01
+MIN_SCALE = 1e-6
+SKID_ID = re.compile(ID_PATTERN)
+
+
+def _empty_sensor() -> dict[str, Any]:
+    return {
+        "n": 0,
+        "media": 0.0,
+        "cusum_alta": 0.0,
+        "cusum_baja": 0.0,
+        "ventana": [],
+        "indice": 0,
+        "en_anomalia": False,
+    }
+
+
+def _scale(spread: float, level: float) -> float:
+    return max(spread, MIN_RELATIVE_SCALE * abs(level), MIN_SCALE)
+
+
+def _median(ordered: list[float]) -> float:
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def _medians(rows: Any) -> Any:
+    # Sorting the short rows is several times faster than np.median here.
+    ordered = np.sort(rows, axis=1)
+    middle = rows.shape[1] // 2
+    if rows.shape[1] % 2:
+        return ordered[:, middle]
+    return (ordered[:, middle - 1] + ordered[:, middle]) / 2
+
+
+def _robust(window: list[float]) -> tuple[float, float]:
+    """Median and MAD-based scale of the ring buffer."""
+    center = _median(sorted(window))
+    return center, _scale(MAD_SCALE * _median(sorted([abs(item - center) for item in window])), center)
+
+
+def _scan(
+    state: dict[str, Any], values: list[float], centers: list[float], scales: list[float], config: AppConfig
+) -> list[tuple[int, dict[str, Any]]]:
+    """Scores warmed-up values against the median and scale of the window before each.
+
+    Returns ``(position, scores)`` for every value that starts an anomaly: a
+    fault is reported once, not on every reading until the detector adapts
+    to the new level. The running state is kept in locals and stored at the end.
+    """
+    threshold, k, h, alpha = (
+        config.anomaly_z_threshold,
+        config.anomaly_cusum_k,
+        config.anomaly_cusum_h,
+        config.anomaly_alpha,
+    )
+    level, high, low, active = state["media"], state["cusum_alta"], state["cusum_baja"], state["en_anomalia"]
+    found = []
+    for position, (value, center, scale) in enumerate(zip(values, centers, scales)):
+        z = (value - center) / scale
+        # Two-sided CUSUM of the residual against the EWMA level, which picks
+        # up a sustained shift too small for the z-score. The window's robust
+        # spread is the scale: steadier than an EWMA variance.
+        residual = (value - level) / scale
+        high = high + residual - k
+        low = low - residual - k
+        high = high if high > 0.0 else 0.0
+        low = low if low > 0.0 else 0.0
+        # Outliers enter the EWMA clipped to the z-score limit, so a single
+        # spike does not drag the level and trip the CUSUM on the readings after it.
+        limit = threshold * scale
+        clipped = center - limit if value < center - limit else min(value, center + limit)
+        level += alpha * (clipped - level)
+        cusum = high if high > low else low
+        if abs(z) <= threshold and cusum <= h:
+            active = False
+            continue
+
+        methods = []
+        if abs(z) > threshold:
+            methods.append("z_robusto")
+        if cusum > h:
+            methods.append("cusum")
+        if not active:
+            upward = z > 0 if "z_robusto" in methods else high >= low
+            found.append(
+                (
+                    position,
+                    {
+                        "referencia": round(center, 4),
+                        "z": round(z, 2),
+                        "cusum": round(cusum, 2),
+                        "metodos": methods,
+                        "direccion": "alta" if upward else "baja",
+                    },
+                )
+            )
+        if cusum > h:
+            high = low = 0.0
+        active = True
+    state.update(media=level, cusum_alta=high, cusum_baja=low, en_anomalia=active, n=state["n"] + len(values))
+    return found
+
+
+def observe(state: dict[str, Any], value: float, config: AppConfig) -> dict[str, Any] | None:
+    """Feeds one value to a sensor's state (modified in place).
+
+    Returns the scores when the value starts an anomaly.
+    """
+    window = state["ventana"]
+    if len(window) > config.anomaly_window:
+        # The window was shortened in the config.
+        del window[config.anomaly_window:]
+        state["indice"] = 0
+    found = None
+    if state["n"] >= max(config.anomaly_warmup, 2):
+        center, scale = _robust(window)
+        scored = _scan(state, [value], [center], [scale], config)
+        found = scored[0][1] if scored else None
+    else:
+        state["media"] = value if state["n"] == 0 else state["media"] + config.anomaly_alpha * (value - state["media"])
+        state["n"] += 1
+    if len(window) < config.anomaly_window:
+        window.append(value)
+    else:
+        window[state["indice"]] = value
+        state["indice"] = (state["indice"] + 1) % config.anomaly_window
+    return found
+
+
+def observe_many(
+    state: dict[str, Any], values: list[float], config: AppConfig
+) -> list[tuple[int, dict[str, Any]]]:
+    """``observe`` over a batch; returns ``(position, scores)`` for each anomaly.
+
+    Once the ring buffer is full, the median and MAD of the window before
+    each value are computed for the whole batch at once with numpy; only
+    the CUSUM and EWMA recurrences run value by value.
+    """
+    size = config.anomaly_window
+    found = []
+    position = 0
+    while position < len(values) and (
+        np is None or len(state["ventana"]) != size or state["n"] < max(config.anomaly_warmup, 2)
+    ):
+        scores = observe(state, values[position], config)
+        if scores is not None:
+            found.append((position, scores))
+        position += 1
+    rest = values[position:]
+    if not rest:
+        return found
+
+    window, start = state["ventana"], state["indice"]
+    history = np.array(window[start:] + window[:start] + rest, dtype=float)
+    windows = sliding_window_view(history[:-1], size)
+    centers = _medians(windows)
+    spreads = MAD_SCALE * _medians(np.abs(windows - centers[:, None]))
+    scales = np.maximum(np.maximum(spreads, MIN_RELATIVE_SCALE * np.abs(centers)), MIN_SCALE)
+    for offset, scores in _scan(state, rest, centers.tolist(), scales.tolist(), config):
+        found.append((position + offset, scores))
+    state["ventana"] = history[-size:].tolist()
+    state["indice"] = 0
+    return found
+
+
+def _source_key(name: str, record: dict[str, Any]) -> str | None:
+    # Readings of different skids are separate series; a skid that is not a
+    # valid id (written around the API) is not scanned.
+    if name == READINGS:
+        skid = record.get("skid", "default")
+        return f"{SOURCES[name]}:{skid}" if isinstance(skid, str) and SKID_ID.match(skid) else None
+    return SOURCES[name]
+
+
+class AnomalyDetector:
+    """Online anomaly detection for every sensor, run as records are written.
+
+    The per-sensor state (EWMA level, CUSUM sums and a ring
+    buffer of the last ``anomaly_window`` values) is a fixed size and lives in
+    ``anomaly_state.json``; it is read and written under its lock on each
+    append, so with several workers each one continues from the state left
+    by the others. Detected events are appended to ``anomalies.json``.
+
+    At most ``anomaly_max_series`` series are kept: the ones that have gone
+    longest without readings are dropped (and start over if they return).
+
+    Bulk imports and rewrites of a dataset are history, not live readings,
+    and are not scanned.
+    """
+
+    def __init__(self, storage: Any, config: AppConfig) -> None:
+        self.storage = storage
+        self.config = config
+
+    def on_storage_event(self, event: str, name: str, payload: Any, version: int) -> None:
+        if name not in SOURCES or event != "append":
+            return
+        records: dict[str, list[int]] = {}
+        for index, record in enumerate(payload):
+            key = _source_key(name, record)
+            if key is not None:
+                records.setdefault(key, []).append(index)
+        # Values of each series in write order, with the record they came from.
+        series: dict[tuple[str, str], tuple[list[int], list[float]]] = {}
+        for key, indexes in records.items():
+            for sensor, (group, field) in SENSORS.items():
+                values = [payload[index].get(group, {}).get(field) for index in indexes]
+                positions = [index for index, value in zip(indexes, values) if value is not None]
+                if positions:
+                    series[key, sensor] = (positions, [float(value) for value in values if value is not None])
+        order = {sensor: position for position, sensor in enumerate(SENSORS)}
+
+        with self.storage.lock(ANOMALY_STATE):
+            stored = self.storage.read(ANOMALY_STATE, {})
+            # The stored document is shared with the cache: the series touched
+            # by this batch are copied before being updated, and moved to the
+            # end so the document stays ordered from least to most recent.
+            state = dict(stored)
+            for key in records:
+                state[key] = {
+                    sensor: {**values, "ventana": list(values["ventana"])}
+                    for sensor, values in state.pop(key, {}).items()
+                }
+            found = []
+            for (key, sensor), (positions, values) in series.items():
+                current = state[key].setdefault(sensor, _empty_sensor())
+                for offset, scores in observe_many(current, values, self.config):
+                    found.append((positions[offset], order[sensor], sensor, scores))
+            for key in list(state)[: max(len(state) - self.config.anomaly_max_series, 0)]:
+                del state[key]
+            self.storage.write(ANOMALY_STATE, state)
+
+            events = []
+            for index, _, sensor, scores in sorted(found, key=lambda item: item[:2]):
+                record = payload[index]
+                group, field = SENSORS[sensor]
+                metrics.ANOMALIES.inc(sensor)
+                event_record = {"fecha": record["fecha"], "origen": SOURCES[name]}
+                if name == READINGS:
+                    event_record["skid"] = record.get("skid", "default")
+                value = record[group][field]
+                events.append({**event_record, "sensor": sensor, "campo": f"{group}.{field}", "valor": value, **scores})
+            if events:
+                self.storage.append(ANOMALIES, events)
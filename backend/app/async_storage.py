@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, Hashable, Iterable
+
+from . import metrics
+from .query import IndexKey, RangeQuery
+
+
+class AsyncStorage:
+    """Awaitable view of a storage: every call runs on ``executor``.
+
+    The registry gives every partition the same pool of ``storage_threads``
+    threads, so a large rewrite or a burst of slow reads neither blocks the
+    event loop nor takes every thread of the server's default pool.
+
+    Reads of the same dataset at the same version are coalesced: callers
+    arriving while one is in flight await its result instead of reading the
+    file again. The version is part of the key, so a read never joins one
+    that started before a write this caller could have observed. Results
+    are shared like the values of ``read``: callers must not mutate them.
+    """
+
+    def __init__(self, storage: Any, executor: Executor) -> None:
+        self.storage = storage
+        self.executor = executor
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    async def run(self, function: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(function, *args))
+
+    async def _coalesced(self, operation: str, key: Hashable, function: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = self._inflight.get(key)
+        if future is None or future.get_loop() is not loop:
+            future = loop.run_in_executor(self.executor, partial(function, *args))
+            self._inflight[key] = future
+
+            def forget(_: asyncio.Future) -> None:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+            future.add_done_callback(forget)
+        else:
+            metrics.COALESCED_READS.inc(operation)
+        # Shielded: a caller that goes away does not cancel the others' read.
+        return await asyncio.shield(future)
+
+    async def read_versioned(self, name: str, default: Any) -> tuple[Any, int]:
+        key = ("read", name, self.storage.version(name))
+        return await self._coalesced("read", key, self.storage.read_versioned, name, default)
+
+    async def read(self, name: str, default: Any) -> Any:
+        return (await self.read_versioned(name, default))[0]
+
+    async def read_raw(self, name: str, default: Any) -> bytes:
+        key = ("read_raw", name, self.storage.version(name))
+        return await self._coalesced("read_raw", key, self.storage.read_raw, name, default)
+
+    async def query(self, name: str, query: RangeQuery) -> tuple[list[dict[str, Any]], IndexKey | None]:
+        key = ("query", name, self.storage.version(name), query.start, query.end, query.after, query.limit)
+        return await self._coalesced("query", key, self.storage.query, name, query)
+
+    async def write(self, name: str, payload: Any, expected_version: int | None = None) -> int:
+        return await self.run(self.storage.write, name, payload, expected_version)
+
+    async def append(self, name: str, records: list[dict[str, Any]]) -> int:
+        return await self.run(self.storage.append, name, records)
+
+    async def bulk_append(self, name: str, chunks: Iterable[list[dict[str, Any]]]) -> tuple[int, int]:
+        return await self.run(self.storage.bulk_append, name, chunks)
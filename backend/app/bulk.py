@@ -0,0 +1,336 @@
+"""Bulk import and streaming export of historical datasets.
+
+Also usable without the server, directly on the data directory:
+
+    cd backend
+    python -m app.bulk import bitacora.csv
+    python -m app.bulk export operational.csv --from 2020-01-01
+    python -m app.bulk export readings.parquet --dataset readings --plant norte
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import sys
+import tempfile
+from dataclasses import replace
+from functools import partial
+from pathlib import Path
+from typing import IO, Any, Callable, Iterable, Iterator
+
+from pydantic import TypeAdapter, ValidationError
+
+from . import normalization, serialization
+from .config import load_config
+from .ingest import READINGS
+from .models import OperationalEntry
+from .partitions import partition_dir
+from .query import RangeQuery
+from .storage import create_storage
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pq = None
+
+OPERATIONAL = "operational.json"
+EXPORT_DATASETS = {"operational": OPERATIONAL, "consumption": "consumption.json", "readings": READINGS}
+FORMATS = ("csv", "ndjson", "parquet")
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+MAX_REPORTED_ERRORS = 20
+
+_MEASURES = (
+    "presiones.entrada",
+    "presiones.salida",
+    "presiones.rechazo",
+    "caudales_gpm.permeado",
+    "caudales_gpm.rechazo",
+    "caudales_gpm.recirculacion",
+)
+# Known columns of each dataset, in export order; any other field found in
+# the exported records follows them.
+EXPORT_COLUMNS = {
+    OPERATIONAL: (
+        "fecha",
+        *_MEASURES,
+        *(
+            f"{normalization.FIELD}.{field}"
+            for field in ("recuperacion", "delta_p", "delta_p_norm", "caudal_permeado_norm")
+        ),
+    ),
+    "consumption.json": ("timestamp", "fecha", "nombre", "consumo", "stock_restante"),
+    READINGS: ("fecha", "skid", *_MEASURES),
+}
+
+# Columns of the Streamlit app's operational_data.csv -> (group, field).
+LEGACY_COLUMNS = {
+    "P_In": ("presiones", "entrada"),
+    "P_Out": ("presiones", "salida"),
+    "P_Rej": ("presiones", "rechazo"),
+    "F_Perm": ("caudales_gpm", "permeado"),
+    "F_Rej": ("caudales_gpm", "rechazo"),
+    "F_Rec": ("caudales_gpm", "recirculacion"),
+}
+
+_entries = TypeAdapter(list[OperationalEntry])
+
+
+class ImportErrors(Exception):
+    def __init__(self, errors: list[dict[str, Any]], total: int) -> None:
+        super().__init__(f"{total} filas inválidas")
+        self.errors = errors
+        self.total = total
+
+
+def format_for(filename: str | None, content_type: str | None = None) -> str:
+    fmt = None
+    for name, media_type in MEDIA_TYPES.items():
+        if content_type == media_type or (filename or "").lower().endswith(f".{name}"):
+            fmt = name
+    if content_type in ("application/ndjson", "application/jsonl") or (filename or "").endswith(".jsonl"):
+        fmt = "ndjson"
+    if fmt is None:
+        raise ValueError(f"Formato no soportado: {content_type or filename}")
+    if fmt == "parquet" and pq is None:
+        raise ValueError("El formato parquet requiere el paquete opcional pyarrow")
+    return fmt
+
+
+# -- reading rows ----------------------------------------------------------
+
+
+def _nest(row: dict[str, Any]) -> dict[str, Any]:
+    """Turns a flat row (``presiones.entrada`` or legacy ``P_In`` columns) into a record."""
+    if "Date" in row:
+        record: dict[str, Any] = {"fecha": row["Date"], "presiones": {}, "caudales_gpm": {}}
+        for column, (group, field) in LEGACY_COLUMNS.items():
+            record[group][field] = row.get(column)
+        return record
+    record = {}
+    for column, value in row.items():
+        target = record
+        *parents, leaf = column.split(".")
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = value
+    return record
+
+
+def iter_rows(handle: IO[bytes], fmt: str) -> Iterator[dict[str, Any]]:
+    if fmt == "csv":
+        text = io.TextIOWrapper(handle, encoding="utf-8-sig", newline="")
+        try:
+            for row in csv.DictReader(text):
+                # Empty cells are missing values, not empty strings.
+                yield _nest({column: value for column, value in row.items() if value not in ("", None)})
+        except csv.Error as error:
+            raise ValueError(f"CSV inválido: {error}") from None
+        finally:
+            text.detach()
+    elif fmt == "ndjson":
+        for line in handle:
+            if line.strip():
+                yield serialization.loads(line)
+    else:
+        for batch in pq.ParquetFile(handle).iter_batches():
+            for row in batch.to_pylist():
+                yield _nest(row)
+
+
+def _chunks(rows: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def validate_operational(rows: Iterable[dict[str, Any]], chunk_size: int, spool: IO[bytes]) -> int:
+    """Validates rows in chunks and spools the valid records as JSON Lines.
+
+    Raises ``ImportErrors`` with the first errors (1-based row numbers) after
+    checking every row, so a file is imported completely or not at all.
+    """
+    errors: list[dict[str, Any]] = []
+    total_errors = 0
+    count = 0
+    for chunk in _chunks(rows, chunk_size):
+        try:
+            entries = _entries.validate_python(chunk)
+        except ValidationError as error:
+            failed: dict[int, str] = {}
+            for item in error.errors():
+                failed.setdefault(item["loc"][0], f"{'.'.join(map(str, item['loc'][1:]))}: {item['msg']}")
+            total_errors += len(failed)
+            for index, message in sorted(failed.items()):
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"fila": count + index + 1, "error": message})
+        else:
+            if not total_errors:
+                records = (entry.model_dump(mode="json") for entry in entries)
+                spool.write(b"".join(serialization.dumps(record) + b"\n" for record in records))
+        count += len(chunk)
+    if total_errors:
+        raise ImportErrors(errors, total_errors)
+    return count
+
+
+def import_operational(storage: Any, handle: IO[bytes], fmt: str, chunk_size: int) -> tuple[int, int]:
+    with tempfile.TemporaryFile() as spool:
+        validate_operational(iter_rows(handle, fmt), chunk_size, spool)
+        spool.seek(0)
+        # Resolved before bulk_append locks the dataset, as every chunk uses it.
+        reference = normalization.reference(storage, (serialization.loads(line) for line in spool))
+        spool.seek(0)
+        records = normalization.annotate((serialization.loads(line) for line in spool), reference)
+        return storage.bulk_append(OPERATIONAL, _chunks(records, chunk_size))
+
+
+# -- export ----------------------------------------------------------------
+
+
+def iter_records(
+    storage: Any, name: str, query: RangeQuery, chunk_size: int
+) -> Iterator[list[dict[str, Any]]]:
+    """Pages through a dataset in date order, one chunk at a time."""
+    after = query.after
+    while True:
+        records, next_key = storage.query(
+            name, RangeQuery(start=query.start, end=query.end, after=after, limit=chunk_size)
+        )
+        if records:
+            yield records
+        if next_key is None:
+            return
+        after = next_key
+
+
+def _flatten(record: dict[str, Any], prefix: str = "") -> dict[str, Any]:
+    row = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            row.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            row[f"{prefix}{key}"] = value
+    return row
+
+
+def _export_schema(
+    chunks: Iterable[list[dict[str, Any]]], known: Iterable[str], typed: bool
+) -> tuple[list[str], Any]:
+    # A first pass over the export: the known columns plus every other field
+    # in the records and, for parquet, the type of each column.
+    columns = dict.fromkeys(known)
+    schemas = []
+    for chunk in chunks:
+        rows = [_flatten(record) for record in chunk]
+        for row in rows:
+            columns.update(dict.fromkeys(row))
+        if typed:
+            schemas.append(pa.Table.from_pylist(rows).schema)
+    if not typed:
+        return list(columns), None
+    found = pa.unify_schemas(schemas, promote_options="permissive") if schemas else pa.schema([])
+    schema = pa.schema(
+        [found.field(column) if column in found.names else pa.field(column, pa.null()) for column in columns]
+    )
+    return list(columns), schema
+
+
+def export_chunks(
+    open_chunks: Callable[[], Iterable[list[dict[str, Any]]]], fmt: str, name: str
+) -> Iterator[bytes]:
+    """Encodes the records of ``name`` returned by ``open_chunks()``.
+
+    CSV and parquet need every column up front, so they read the chunks
+    twice: once for the columns (a field present only in later records is
+    not dropped) and once to write them.
+    """
+    if fmt == "ndjson":
+        for chunk in open_chunks():
+            yield b"".join(serialization.dumps(record) + b"\n" for record in chunk)
+        return
+    columns, schema = _export_schema(open_chunks(), EXPORT_COLUMNS.get(name, ()), typed=fmt == "parquet")
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns)
+        writer.writeheader()
+        for chunk in open_chunks():
+            writer.writerows(_flatten(record) for record in chunk)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+        return
+    # One row group per chunk; only the current group is held in memory.
+    sink = io.BytesIO()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in open_chunks():
+            writer.write_table(pa.Table.from_pylist([_flatten(record) for record in chunk], schema=schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+# -- CLI -------------------------------------------------------------------
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plant", help="planta; por defecto, la de data_dir")
+    parser.add_argument("--skid", help="skid de la planta")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="importa registros operativos (csv, ndjson o parquet)")
+    importer.add_argument("path", type=Path)
+    exporter = commands.add_parser("export", help="exporta un conjunto de datos (csv, ndjson o parquet)")
+    exporter.add_argument("path", type=Path)
+    exporter.add_argument("--dataset", choices=sorted(EXPORT_DATASETS), default="operational")
+    exporter.add_argument("--from", dest="start")
+    exporter.add_argument("--to", dest="end")
+    args = parser.parse_args()
+
+    key = tuple(part for part in (args.plant, args.skid) if part)
+    config = load_config()
+    path = partition_dir(config.data_dir, key)
+    if key and not path.is_dir():
+        parser.error(f"No existe la partición {'/'.join(key)}")
+    storage = create_storage(replace(config, data_dir=path))
+
+    try:
+        fmt = format_for(args.path.name)
+        if args.command == "import":
+            with args.path.open("rb") as handle:
+                count, _ = import_operational(storage, handle, fmt, config.bulk_chunk_records)
+            print(f"{count} registros importados en {OPERATIONAL}")
+        else:
+            query = RangeQuery(start=args.start, end=args.end)
+            name = EXPORT_DATASETS[args.dataset]
+            with args.path.open("wb") as handle:
+                chunks = partial(iter_records, storage, name, query, config.bulk_chunk_records)
+                for block in export_chunks(chunks, fmt, name):
+                    handle.write(block)
+            print(f"Exportado {args.path}")
+    except ImportErrors as error:
+        for item in error.errors:
+            print(f"fila {item['fila']}: {item['error']}", file=sys.stderr)
+        print(f"{error.total} filas inválidas; no se importó nada", file=sys.stderr)
+        return 1
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
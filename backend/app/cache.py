@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable
+
+from .metrics import CACHE_EVICTIONS, CACHE_LOOKUPS
+
+MISSING = object()
+
+Stamp = tuple[int, int, int]
+
+
+def file_stamp(path: Path) -> Stamp | None:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class FileCache:
+    """LRU of parsed file contents, validated against a stamp on every lookup.
+
+    ``cost`` is the size in bytes of the source file, used as an approximation
+    of the memory taken by the parsed value.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self._entries: OrderedDict[Hashable, tuple[Any, Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, stamp: Any) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                CACHE_LOOKUPS.inc("miss")
+                return MISSING
+            self._entries.move_to_end(key)
+        CACHE_LOOKUPS.inc("hit")
+        return entry[1]
+
+    def put(self, key: Hashable, stamp: Any, value: Any, cost: int) -> None:
+        with self._lock:
+            self._discard(key)
+            if cost > self.max_bytes:
+                return
+            self._entries[key] = (stamp, value, cost)
+            self.used_bytes += cost
+            while self.used_bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.used_bytes -= evicted
+                CACHE_EVICTIONS.inc()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.used_bytes = 0
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.used_bytes -= entry[2]
@@ -2,34 +2,106 @@ from __future__ import annotations
 
 import json
 import os
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, fields
 from pathlib import Path
 
+from . import metrics, serialization
+from .cache import file_stamp
+
 BASE_DIR = Path(__file__).resolve().parents[2]
 CONFIG_PATH = BASE_DIR / "backend" / "config.json"
 DEFAULT_DATA_DIR = BASE_DIR / "data"
 
+STORAGE_ENGINES = ("json", "segments", "sqlite")
+SERIALIZER_CHOICES = (serialization.AUTO, *serialization.PREFERRED)
+
 
 @dataclass
 class AppConfig:
     data_dir: Path
     dp_threshold: float = 15.0
+    dp_norm_threshold: float = 15.0
+    dp_trend_window: int = 5
+    dp_slope_threshold: float = 0.05
+    stock_alert_percent: float = 20.0
+    forecast_alpha: float = 0.3
+    reorder_lead_days: int = 7
+    anomaly_window: int = 60
+    anomaly_warmup: int = 20
+    anomaly_z_threshold: float = 5.0
+    anomaly_alpha: float = 0.1
+    anomaly_cusum_k: float = 0.5
+    anomaly_cusum_h: float = 8.0
+    anomaly_max_series: int = 256
+    storage_engine: str = "json"
+    segment_max_bytes: int = 4 * 1024 * 1024
+    compact_after_segments: int = 8
+    sqlite_pool_size: int = 4
+    storage_threads: int = 8
+    cache_max_bytes: int = 64 * 1024 * 1024
+    compact_json: bool = False
+    serializer: str = serialization.AUTO
+    bulk_chunk_records: int = 10000
+    ingest_batch_records: int = 5000
+    ingest_flush_seconds: float = 0.5
+    ingest_max_pending: int = 200000
+    retention_days: int = 0
+    readings_retention_days: int = 0
+    retention_interval_seconds: float = 3600.0
+
+
+_FIELD_TYPES = {"Path": Path, "float": float, "int": int, "str": str, "bool": bool}
+
+
+def _config_from_payload(payload: dict) -> AppConfig:
+    values = {}
+    for item in fields(AppConfig):
+        if item.name in payload:
+            values[item.name] = _FIELD_TYPES[item.type](payload[item.name])
+    values.setdefault("data_dir", DEFAULT_DATA_DIR)
+
+    config = AppConfig(**values)
+    if config.storage_engine not in STORAGE_ENGINES:
+        raise ValueError(f"Motor de almacenamiento no soportado: {config.storage_engine}")
+    if config.serializer not in SERIALIZER_CHOICES:
+        raise ValueError(f"Serializador no soportado: {config.serializer}")
+    return config
+
+
+_config_cache: tuple[tuple, AppConfig] | None = None
+
+
+def _config_key() -> tuple:
+    return (file_stamp(CONFIG_PATH), os.getenv("DATA_DIR"), os.getenv("STORAGE_ENGINE"))
 
 
 def load_config() -> AppConfig:
-    data_dir = Path(os.getenv("DATA_DIR")) if os.getenv("DATA_DIR") else None
-    if data_dir:
-        return AppConfig(data_dir=data_dir)
+    global _config_cache
+    key = _config_key()
+    if _config_cache is not None and _config_cache[0] == key:
+        return _config_cache[1]
+
+    with metrics.phase("config"):
+        payload: dict = {}
+        if CONFIG_PATH.exists():
+            payload = json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
 
-    if CONFIG_PATH.exists():
-        payload = json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
-        return AppConfig(data_dir=Path(payload.get("data_dir", DEFAULT_DATA_DIR)))
+        if os.getenv("DATA_DIR"):
+            payload["data_dir"] = os.getenv("DATA_DIR")
+        if os.getenv("STORAGE_ENGINE"):
+            payload["storage_engine"] = os.getenv("STORAGE_ENGINE")
 
-    return AppConfig(data_dir=DEFAULT_DATA_DIR)
+        config = _config_from_payload(payload)
+        # Process-wide: applied at startup and whenever config.json changes.
+        # A serializer that is not installed fails here, not on first use.
+        serialization.use(config.serializer)
+    _config_cache = (key, config)
+    return config
 
 
 def save_config(config: AppConfig) -> None:
-    CONFIG_PATH.write_text(
-        json.dumps({"data_dir": str(config.data_dir), "dp_threshold": config.dp_threshold}, indent=2),
-        encoding="utf-8",
-    )
+    global _config_cache
+    payload = asdict(config)
+    payload["data_dir"] = str(config.data_dir)
+    CONFIG_PATH.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    _config_cache = None
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import Any, Iterator
+
+
+def numeric_leaves(record: dict[str, Any], prefix: str = "") -> Iterator[tuple[str, float]]:
+    for key, value in record.items():
+        if isinstance(value, dict):
+            yield from numeric_leaves(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}{key}", float(value)
+
+
+def minmax_indices(records: list[dict[str, Any]], max_points: int) -> list[int]:
+    # Splits the series into buckets and keeps, per bucket, its first record
+    # plus the records holding the minimum and maximum of every numeric field,
+    # so peaks of every plotted line survive. Never more than max_points.
+    n = len(records)
+    if n <= max_points:
+        return list(range(n))
+    if max_points < 3:
+        return [0, n - 1][:max(max_points, 0)]
+
+    leaves = [dict(numeric_leaves(record)) for record in records]
+    fields = sorted({name for values in leaves for name in values})
+    buckets = (max_points - 2) // (2 * len(fields) + 1)
+    if buckets == 0:
+        # Not even one bucket with the extremes of every field fits: one
+        # record per bucket instead.
+        fields = []
+        buckets = max_points - 2
+    size = (n - 2) / buckets
+
+    kept = {0, n - 1}
+    for bucket in range(buckets):
+        start = int(bucket * size) + 1
+        end = int((bucket + 1) * size) + 1
+        if start >= end:
+            continue
+        kept.add(start)
+        for name in fields:
+            present = [i for i in range(start, end) if name in leaves[i]]
+            if present:
+                kept.add(min(present, key=lambda i: leaves[i][name]))
+                kept.add(max(present, key=lambda i: leaves[i][name]))
+    return sorted(kept)
+
+
+def downsample_records(
+    records: list[dict[str, Any]], max_points: int, group_key: str | None = None
+) -> list[dict[str, Any]]:
+    if group_key is None:
+        return [records[i] for i in minmax_indices(records, max_points)]
+
+    # Interleaved series (one per chemical) are reduced independently and
+    # share the budget: the shortest series are kept whole and what they
+    # leave over goes to the longer ones.
+    groups: dict[Any, list[int]] = {}
+    for position, record in enumerate(records):
+        groups.setdefault(record.get(group_key), []).append(position)
+    kept: list[int] = []
+    budget = max_points
+    ordered = sorted(groups.values(), key=len)
+    for remaining, positions in zip(range(len(ordered), 0, -1), ordered):
+        share = min(len(positions), budget // remaining)
+        members = [records[i] for i in positions]
+        kept.extend(positions[i] for i in minmax_indices(members, share))
+        budget -= share
+    return [records[i] for i in sorted(kept)]
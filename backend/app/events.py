@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable
+
+from . import serialization
+from .anomalies import ANOMALIES
+from .ingest import READINGS
+
+OPERATIONAL = "operational.json"
+CHEMICALS = "chemicals.json"
+CONSUMPTION = "consumption.json"
+WATCHED = (OPERATIONAL, CHEMICALS, CONSUMPTION, READINGS, ANOMALIES)
+APPEND_EVENTS = {
+    OPERATIONAL: "operational",
+    CONSUMPTION: "consumption",
+    READINGS: "readings",
+    ANOMALIES: "anomalies",
+}
+TOPICS = ("operational", "consumption", "readings", "chemicals", "alerts", "anomalies")
+
+SUBSCRIBER_QUEUE_SIZE = 256
+RESYNC_CHECK_SECONDS = 2.0
+
+
+def format_sse(event_id: int, event: str, data: Any) -> str:
+    payload = serialization.dumps(data).decode("utf-8")
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, topics: set[str]) -> None:
+        self.loop = loop
+        self.topics = topics
+        self.queue: asyncio.Queue[tuple[int, str, Any]] = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    async def get(self) -> tuple[int, str, Any]:
+        message = await self.queue.get()
+        if message[1] == "resync":
+            self.overflowed = False
+        return message
+
+    def put(self, message: tuple[int, str, Any]) -> None:
+        # Runs on the subscriber's loop. A client too slow to drain its queue
+        # gets a single "resync" instead of an unbounded backlog.
+        if self.overflowed or (message[1] != "resync" and message[1] not in self.topics):
+            return
+        if self.queue.full():
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait((message[0], "resync", {"datasets": list(WATCHED)}))
+            return
+        self.queue.put_nowait(message)
+
+
+class EventBroker:
+    """In-process pub/sub turning storage writes into deltas for live clients.
+
+    Storage listeners may run on any thread (request handlers, the ingest
+    flusher), so messages are handed to each subscriber's event loop. Writes
+    made by other worker processes are never seen as events; ``check_versions``
+    notices them from the storage version counters and asks clients to
+    resync.
+    """
+
+    def __init__(self, storage: Any, alerts: Callable[[], dict[str, list[dict]]]) -> None:
+        self.storage = storage
+        self.alerts = alerts
+        self._lock = threading.Lock()
+        self._subscribers: set[_Subscriber] = set()
+        self._next_id = 0
+        self._versions = {name: storage.version(name) for name in WATCHED}
+        self._chemicals = {item["nombre"]: item for item in storage.read(CHEMICALS, [])}
+        self._last_alerts = alerts()
+        self._checked_at = time.monotonic()
+
+    def subscribe(self, topics: set[str] | None = None) -> _Subscriber:
+        subscriber = _Subscriber(asyncio.get_running_loop(), topics or set(TOPICS))
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event: str, data: Any) -> None:
+        with self._lock:
+            self._next_id += 1
+            message = (self._next_id, event, data)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.put, message)
+            except RuntimeError:
+                # The subscriber's loop is closed.
+                self.unsubscribe(subscriber)
+
+    def on_storage_event(self, event: str, name: str, payload: Any, version: int) -> None:
+        if name not in WATCHED:
+            return
+        with self._lock:
+            self._versions[name] = version
+        if event == "append" and name in APPEND_EVENTS:
+            self.publish(APPEND_EVENTS[name], payload)
+        elif name == CHEMICALS:
+            chemicals = {item["nombre"]: item for item in payload}
+            changed = [item for nombre, item in chemicals.items() if self._chemicals.get(nombre) != item]
+            self._chemicals = chemicals
+            if changed:
+                self.publish("chemicals", changed)
+        else:
+            # The whole history was replaced: clients reload it.
+            self.publish("resync", {"datasets": [name]})
+        if name in (OPERATIONAL, CHEMICALS):
+            alerts = self.alerts()
+            if alerts != self._last_alerts:
+                self._last_alerts = alerts
+                self.publish("alerts", alerts)
+
+    def check_versions(self) -> None:
+        with self._lock:
+            if time.monotonic() - self._checked_at < RESYNC_CHECK_SECONDS:
+                return
+            self._checked_at = time.monotonic()
+            changed = [name for name in WATCHED if self.storage.version(name) != self._versions[name]]
+            for name in changed:
+                self._versions[name] = self.storage.version(name)
+        if changed:
+            self._chemicals = {item["nombre"]: item for item in self.storage.read(CHEMICALS, [])}
+            self._last_alerts = self.alerts()
+            self.publish("resync", {"datasets": changed})
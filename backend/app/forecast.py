@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Any
+
+from .config import AppConfig
+
+FORECAST = "forecast.json"
+CONSUMPTION = "consumption.json"
+CHEMICALS = "chemicals.json"
+# Bumped when the way rates are computed changes, so stored rates are rebuilt.
+FORMAT = 2
+
+
+def _empty() -> dict[str, Any]:
+    return {"version": 0, "formato": FORMAT, "quimicos": {}}
+
+
+def _add(state: dict[str, Any], item: dict[str, Any], alpha: float) -> bool:
+    """Adds one consumption record to the per-chemical rate state.
+
+    Consumption is summed per day; when a later day starts, the finished
+    day's total is folded into the EWMA, followed by a zero for every
+    calendar day without records in between (intermittent dosing). Returns
+    False for a record older than the chemical's current day, which needs a
+    rebuild.
+    """
+    day = item["fecha"][:10]
+    current = state.get(item["nombre"])
+    if current is not None and day < current["dia"]:
+        return False
+    if current is None:
+        current = {"dia": day, "total_dia": 0.0, "tasa": None, "dias": 0}
+    elif day > current["dia"]:
+        idle = (date.fromisoformat(day) - date.fromisoformat(current["dia"])).days - 1
+        current = {
+            "dia": day,
+            "total_dia": 0.0,
+            # Blending in ``idle`` zeros scales the rate by (1 - alpha) ** idle.
+            "tasa": _blend(current["tasa"], current["total_dia"], alpha) * (1 - alpha) ** idle,
+            "dias": current["dias"] + 1 + idle,
+        }
+    else:
+        current = dict(current)
+    current["total_dia"] += float(item["consumo"])
+    state[item["nombre"]] = current
+    return True
+
+
+def _blend(rate: float | None, value: float, alpha: float) -> float:
+    return value if rate is None else alpha * value + (1 - alpha) * rate
+
+
+class ForecastStore:
+    """EWMA daily consumption per chemical, persisted in ``forecast.json``.
+
+    Kept current from consumption append events like the rollups; the
+    forecast itself only combines these rates with the current stock.
+    """
+
+    def __init__(self, storage: Any, config: AppConfig) -> None:
+        self.storage = storage
+        self.config = config
+
+    def rebuild(self) -> dict[str, Any]:
+        with self.storage.lock(CONSUMPTION), self.storage.lock(FORECAST):
+            records, version = self.storage.read_versioned(CONSUMPTION, [])
+            state: dict[str, Any] = {}
+            for record in sorted(records, key=lambda item: item["fecha"][:10]):
+                _add(state, record, self.config.forecast_alpha)
+            forecast = {"version": version, "formato": FORMAT, "quimicos": state}
+            self.storage.write(FORECAST, forecast)
+            return forecast
+
+    def on_storage_event(self, event: str, name: str, payload: Any, version: int) -> None:
+        if name != CONSUMPTION or event != "append":
+            return
+        with self.storage.lock(FORECAST):
+            forecast = self.storage.read(FORECAST, None)
+            if forecast is None or forecast.get("formato") != FORMAT or forecast["version"] != version - 1:
+                # Missed a write; current() rebuilds on the next read.
+                return
+            state = dict(forecast["quimicos"])
+            for record in payload:
+                if not _add(state, record, self.config.forecast_alpha):
+                    return
+            self.storage.write(FORECAST, {"version": version, "formato": FORMAT, "quimicos": state})
+
+    def current(self) -> dict[str, Any]:
+        forecast = self.storage.read(FORECAST, None)
+        if (
+            forecast is None
+            or forecast.get("formato") != FORMAT
+            or forecast["version"] != self.storage.version(CONSUMPTION)
+        ):
+            forecast = self.rebuild()
+        return forecast
+
+    def rows(self, lead_days: int | None = None) -> list[dict[str, Any]]:
+        lead = timedelta(days=self.config.reorder_lead_days if lead_days is None else lead_days)
+        state = self.current()["quimicos"]
+        rows = []
+        for chemical in self.storage.read(CHEMICALS, []):
+            stock = float(chemical.get("stock", 0))
+            row: dict[str, Any] = {
+                "nombre": chemical["nombre"],
+                "unidad": chemical.get("unidad", "L"),
+                "stock": stock,
+                "consumo_diario": None,
+                "dias_restantes": None,
+                "fecha_agotamiento": None,
+                "fecha_pedido": None,
+            }
+            rate_state = state.get(chemical["nombre"])
+            if rate_state is not None:
+                # The day in progress counts as an observation so far.
+                rate = _blend(rate_state["tasa"], rate_state["total_dia"], self.config.forecast_alpha)
+                row["consumo_diario"] = round(rate, 4)
+                if rate > 0:
+                    days = stock / rate
+                    depletion = date.fromisoformat(rate_state["dia"]) + timedelta(days=days)
+                    row["dias_restantes"] = round(days, 1)
+                    row["fecha_agotamiento"] = depletion.isoformat()
+                    row["fecha_pedido"] = (depletion - lead).isoformat()
+            rows.append(row)
+        # Most urgent first; chemicals without consumption go last.
+        rows.sort(key=lambda row: (row["dias_restantes"] is None, row["dias_restantes"] or 0.0))
+        return rows
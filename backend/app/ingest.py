@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import logging
+import math
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+from pydantic import ValidationError
+
+from .models import SensorReading
+
+logger = logging.getLogger(__name__)
+
+READINGS = "readings.json"
+
+# Binary batches are a plain array of little-endian records: epoch seconds
+# (float64) followed by presiones entrada/salida/rechazo and caudales
+# permeado/rechazo/recirculacion (float32 each), 32 bytes per reading.
+BINARY_RECORD = struct.Struct("<d6f")
+
+
+def _timestamp(value: datetime) -> str:
+    # Stored as naive UTC with fixed precision so timestamps sort as strings.
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec="milliseconds")
+
+
+def _record(fecha: datetime, skid: str, presiones: dict[str, float], caudales: dict[str, float]) -> dict[str, Any]:
+    return {"fecha": _timestamp(fecha), "skid": skid, "presiones": presiones, "caudales_gpm": caudales}
+
+
+def parse_ndjson(body: bytes, skid: str) -> list[dict[str, Any]]:
+    records = []
+    for number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            reading = SensorReading.model_validate_json(line)
+        except ValidationError as error:
+            raise ValueError(f"Línea {number}: {error.errors()[0]['msg']}") from None
+        records.append(
+            _record(
+                reading.fecha,
+                reading.skid if "skid" in reading.model_fields_set else skid,
+                reading.presiones.model_dump(),
+                reading.caudales_gpm.model_dump(),
+            )
+        )
+    return records
+
+
+def parse_binary(body: bytes, skid: str) -> list[dict[str, Any]]:
+    if len(body) % BINARY_RECORD.size:
+        raise ValueError(f"El tamaño del cuerpo no es múltiplo de {BINARY_RECORD.size} bytes")
+    records = []
+    for number, values in enumerate(BINARY_RECORD.iter_unpack(body), start=1):
+        seconds, *measures = values
+        if not all(math.isfinite(value) and value >= 0 for value in measures) or not math.isfinite(seconds):
+            raise ValueError(f"Lectura {number}: valores fuera de rango")
+        try:
+            fecha = datetime.fromtimestamp(seconds, tz=timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            # Finite epochs outside the years datetime can represent.
+            raise ValueError(f"Lectura {number}: fecha fuera de rango") from None
+        entrada, salida, rechazo, permeado, rechazo_caudal, recirculacion = measures
+        records.append(
+            _record(
+                fecha,
+                skid,
+                {"entrada": entrada, "salida": salida, "rechazo": rechazo},
+                {"permeado": permeado, "rechazo": rechazo_caudal, "recirculacion": recirculacion},
+            )
+        )
+    return records
+
+
+class IngestBackpressure(Exception):
+    def __init__(self, pending: int) -> None:
+        super().__init__(f"{pending} lecturas pendientes de escritura")
+        self.pending = pending
+
+
+class WriteBuffer:
+    """Groups records in memory and appends them to storage in batches.
+
+    A batch is flushed by a background thread once ``batch_records`` are
+    pending or ``flush_seconds`` after its first record, whichever comes
+    first. ``submit`` refuses records beyond ``max_pending`` (including the
+    batch being written) so the API can tell clients to back off.
+    """
+
+    def __init__(
+        self, storage: Any, name: str, batch_records: int, flush_seconds: float, max_pending: int
+    ) -> None:
+        self.storage = storage
+        self.name = name
+        self.batch_records = batch_records
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._pending: list[dict[str, Any]] = []
+        self._first_at: float | None = None
+        self._in_flight = 0
+        self._force = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"ingest-{name}", daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._pending) + self._in_flight
+
+    def submit(self, records: list[dict[str, Any]]) -> int:
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("El búfer de ingesta está cerrado")
+            pending = len(self._pending) + self._in_flight
+            if pending + len(records) > self.max_pending:
+                raise IngestBackpressure(pending)
+            # Wake the flusher when a batch starts (to arm its timer) or fills up.
+            notify = not self._pending or len(self._pending) + len(records) >= self.batch_records
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending.extend(records)
+            if notify:
+                self._condition.notify_all()
+            return pending + len(records)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        with self._condition:
+            self._force = True
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _due(self) -> bool:
+        if not self._pending:
+            return False
+        if self._force or self._closed or len(self._pending) >= self.batch_records:
+            return True
+        return time.monotonic() - self._first_at >= self.flush_seconds
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._due():
+                    if self._closed:
+                        return
+                    timeout = None
+                    if self._pending:
+                        timeout = self.flush_seconds - (time.monotonic() - self._first_at)
+                    self._condition.wait(timeout)
+                batch, self._pending = self._pending, []
+                self._in_flight = len(batch)
+                self._first_at = None
+
+            failed = False
+            try:
+                self.storage.append(self.name, batch)
+            except Exception:
+                logger.exception("Error escribiendo %s lecturas en %s", len(batch), self.name)
+                failed = True
+
+            with self._condition:
+                self._in_flight = 0
+                if failed and not self._closed:
+                    # Keep the batch in front of newer records and retry later.
+                    self._pending[:0] = batch
+                    self._first_at = time.monotonic()
+                elif failed:
+                    logger.error("Se descartan %s lecturas al cerrar el búfer", len(batch))
+                if not self._pending:
+                    self._force = False
+                self._condition.notify_all()
+                if failed and not self._closed:
+                    self._condition.wait(self.flush_seconds)
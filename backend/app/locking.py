@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+VERSION_WIDTH = 20
+
+
+class StorageConflict(Exception):
+    pass
+
+
+class FileLock:
+    """Re-entrant lock shared by threads (``RLock``) and processes (``flock``).
+
+    The lock file also stores a write counter used for optimistic versioning:
+    writers bump it while holding the lock and readers may peek at it freely.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd: int | None = None
+
+    def __enter__(self) -> FileLock:
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+    def version(self) -> int:
+        try:
+            with open(self.path, "rb") as handle:
+                raw = handle.read(VERSION_WIDTH)
+        except FileNotFoundError:
+            return 0
+        return int(raw) if raw.strip() else 0
+
+    def bump(self) -> int:
+        if self._fd is None:
+            raise RuntimeError("FileLock.bump() requires holding the lock")
+        version = self.version() + 1
+        os.pwrite(self._fd, str(version).zfill(VERSION_WIDTH).encode("ascii"), 0)
+        return version
+
+
+_registry: dict[Path, FileLock] = {}
+_registry_lock = threading.Lock()
+
+
+def lock_for(path: Path) -> FileLock:
+    path = path.resolve()
+    with _registry_lock:
+        if path not in _registry:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _registry[path] = FileLock(path)
+        return _registry[path]
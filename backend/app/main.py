@@ -1,11 +1,30 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+import tempfile
+from dataclasses import replace
+from datetime import date
+from functools import partial
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
+from typing import Any, Literal
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 
+from . import bulk, metrics, serialization
+from .anomalies import ANOMALIES, SENSORS
+from .async_storage import AsyncStorage
+from .cache import MISSING
 from .config import AppConfig, load_config, save_config
-from .models import ConfigPayload, ConsumptionPayload, OperationalEntry
+from .downsample import downsample_records
+from .events import TOPICS, format_sse
+from .ingest import READINGS, IngestBackpressure, parse_binary, parse_ndjson
+from .locking import StorageConflict
+from .models import ID_PATTERN, ConfigPayload, ConsumptionPayload, OperationalEntry
+from .partitions import DEFAULT_CHEMICALS, Partition, PartitionRegistry, UnknownPartition
+from .query import RangeQuery, decode_cursor, encode_cursor, parse_fields, project
+from .snapshot import encode_body, etag, matches, negotiate_encoding, snapshot_tag
 from .storage import JSONStorage
 
 app = FastAPI(title="PTAP Monitor API", version="1.0.0")
@@ -16,32 +35,116 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Ingest-Pending", "ETag"],
 )
+# The API router is included under each of these (see the end of the module).
+ROUTER_PREFIXES = ("/api", "/api/plants/{plant_id}", "/api/plants/{plant_id}/skids/{skid_id}")
+# Outermost, so the time includes CORS handling and the whole response body.
+app.add_middleware(metrics.MetricsMiddleware, prefixes=("", *ROUTER_PREFIXES))
+
+
+CONSUME_RETRIES = 20
+MAX_PAGE_SIZE = 10000
+MIN_CHART_POINTS = 10
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+BINARY_TYPE = "application/octet-stream"
+EVENTS_KEEPALIVE_SECONDS = 5.0
+BULK_SPOOL_BYTES = 16 * 1024 * 1024
+SNAPSHOT_DATASETS = ("operational.json", "chemicals.json", "consumption.json")
+
+_registry = PartitionRegistry()
+_retention_task: asyncio.Task | None = None
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_usage() -> list[tuple[tuple[str, ...], float]]:
+    return [
+        (("/".join(partition.key) or "default",), partition.cache.used_bytes)
+        for partition in _registry.open_partitions()
+    ]
+
+
+metrics.REGISTRY.gauge(
+    "ptap_cache_bytes", "Bytes ocupados en la caché de cada planta o skid abierto.", ("partition",), _cache_usage
+)
+
+# Dataset endpoints are declared once and served for the default plant under
+# /api, for each plant under /api/plants/{plant_id} and for each skid under
+# /api/plants/{plant_id}/skids/{skid_id}.
+router = APIRouter()
+
+
+def open_partition(key: tuple[str, ...], create: bool = False) -> Partition:
+    try:
+        return _registry.get(load_config(), key, create)
+    except UnknownPartition as error:
+        raise HTTPException(status_code=404, detail=f"Planta o skid no encontrado: {error}") from None
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error)) from None
+
+
+def get_partition(request: Request) -> Partition:
+    params = request.path_params
+    return open_partition(tuple(params[name] for name in ("plant_id", "skid_id") if name in params))
 
 
 def get_storage() -> tuple[AppConfig, JSONStorage]:
+    partition = _registry.get(load_config())
+    return partition.config, partition.storage
+
+
+def apply_retention() -> float:
+    """Applies the retention policy of every plant and skid and returns the
+    seconds until the next pass. Blocking: config, registry and storage
+    are all file I/O."""
     config = load_config()
-    storage = JSONStorage(config)
-    return config, storage
-
-
-def ensure_seed_data(storage: JSONStorage) -> None:
-    storage.read(
-        "chemicals.json",
-        [
-            {"nombre": "Antiescalante", "stock_inicial": 200.0, "stock": 180.0, "unidad": "L"},
-            {"nombre": "Hipoclorito", "stock_inicial": 150.0, "stock": 120.0, "unidad": "L"},
-            {"nombre": "Cloruro férrico", "stock_inicial": 100.0, "stock": 90.0, "unidad": "L"},
-        ],
-    )
-    storage.read("operational.json", [])
-    storage.read("consumption.json", [])
+    if config.retention_days > 0 or config.readings_retention_days > 0:
+        keys: list[tuple[str, ...]] = [()]
+        for plant in _registry.plants(config):
+            keys.append((plant["id"],))
+            keys.extend((plant["id"], skid) for skid in plant["skids"])
+        for key in keys:
+            label = "/".join(key) or "default"
+            try:
+                partition = _registry.get(config, key)
+                moved = partition.retention.run()
+            except Exception:
+                logger.exception("Error aplicando la retención en %s", label)
+                continue
+            for name, count in moved.items():
+                if count:
+                    logger.info("%s: %d registros archivados de %s", label, count, name)
+    return config.retention_interval_seconds
+
+
+async def run_retention() -> None:
+    """Runs ``apply_retention`` off the event loop every
+    ``retention_interval_seconds``; each worker runs it, the dataset locks
+    make the runs after the first one find nothing to move."""
+    interval = AppConfig.retention_interval_seconds
+    while True:
+        try:
+            interval = await asyncio.to_thread(apply_retention)
+        except Exception:
+            # A broken config.json or an I/O error must not end the task:
+            # it is retried after the last known interval.
+            logger.exception("Error aplicando la retención")
+        await asyncio.sleep(interval)
 
 
 @app.on_event("startup")
 async def startup_event() -> None:
-    _, storage = get_storage()
-    ensure_seed_data(storage)
+    global _retention_task
+    get_storage()
+    _retention_task = asyncio.create_task(run_retention())
+
+
+@app.on_event("shutdown")
+async def shutdown_event() -> None:
+    if _retention_task is not None:
+        _retention_task.cancel()
+    _registry.close()
 
 
 @app.get("/api/health")
@@ -49,49 +152,177 @@ async def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/api/metrics")
+async def get_metrics() -> Response:
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+def config_payload(config: AppConfig) -> dict[str, str | float]:
+    return {
+        "data_dir": str(config.data_dir),
+        "dp_threshold": config.dp_threshold,
+        "dp_norm_threshold": config.dp_norm_threshold,
+    }
+
+
 @app.get("/api/config")
 async def get_config() -> dict[str, str | float]:
     config, _ = get_storage()
-    return {"data_dir": str(config.data_dir), "dp_threshold": config.dp_threshold}
+    return config_payload(config)
 
 
 @app.post("/api/config")
 async def update_config(payload: ConfigPayload) -> dict[str, str]:
     data_dir = Path(payload.data_dir).expanduser()
-    config = AppConfig(data_dir=data_dir)
+    config = replace(load_config(), data_dir=data_dir)
     data_dir.mkdir(parents=True, exist_ok=True)
     save_config(config)
     return {"status": "ok"}
 
 
-@app.get("/api/operational")
-async def list_operational() -> list[dict]:
-    _, storage = get_storage()
-    ensure_seed_data(storage)
-    return storage.read("operational.json", [])
+def json_response(payload: Any, headers: dict[str, str] | None = None) -> Response:
+    # Returning a Response skips FastAPI's response-model validation and
+    # jsonable_encoder pass; the records are plain JSON values already.
+    with metrics.phase("serialize"):
+        content = serialization.dumps(payload)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+def _encode_records(
+    records: list[dict[str, Any]], paths: list[list[str]] | None, max_points: int | None, group_key: str | None
+) -> bytes:
+    if paths:
+        records = [project(record, paths) for record in records]
+    if max_points is not None:
+        records = downsample_records(records, max_points, group_key)
+    with metrics.phase("serialize"):
+        return serialization.dumps(records)
+
+
+async def query_records(
+    storage: AsyncStorage,
+    name: str,
+    start: date | None,
+    end: date | None,
+    cursor: str | None,
+    limit: int | None,
+    fields: str | None,
+    max_points: int | None = None,
+    group_key: str | None = None,
+) -> Response:
+    headers = {}
+    if start is None and end is None and cursor is None and limit is None:
+        if fields is None and max_points is None:
+            # Whole dataset: the stored bytes are sent as they are.
+            return Response(content=await storage.read_raw(name, []), media_type="application/json")
+        records = await storage.read(name, [])
+    else:
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        records, next_key = await storage.query(
+            name,
+            RangeQuery(
+                start=start.isoformat() if start else None,
+                end=end.isoformat() if end else None,
+                after=after,
+                limit=limit,
+            ),
+        )
+        if next_key is not None:
+            headers["X-Next-Cursor"] = encode_cursor(next_key)
+
+    # Projection, downsampling and encoding of a large page are CPU work too.
+    content = await storage.run(_encode_records, records, parse_fields(fields), max_points, group_key)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+@router.get("/operational")
+async def list_operational(
+    start: date | None = Query(None, alias="from"),
+    end: date | None = Query(None, alias="to"),
+    cursor: str | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    fields: str | None = None,
+    max_points: int | None = Query(None, ge=MIN_CHART_POINTS),
+    partition: Partition = Depends(get_partition),
+) -> Response:
+    return await query_records(
+        partition.aio, "operational.json", start, end, cursor, limit, fields, max_points
+    )
 
 
-@app.post("/api/operational")
-async def add_operational(entry: OperationalEntry) -> dict[str, str]:
-    _, storage = get_storage()
-    ensure_seed_data(storage)
-    storage.append_operational(entry.model_dump())
+@router.post("/operational")
+async def add_operational(
+    entry: OperationalEntry, partition: Partition = Depends(get_partition)
+) -> dict[str, str]:
+    await partition.aio.run(partition.storage.append_operational, entry.model_dump(mode="json"))
     return {"status": "saved"}
 
 
-@app.get("/api/chemicals")
-async def list_chemicals() -> list[dict]:
-    _, storage = get_storage()
-    ensure_seed_data(storage)
-    return storage.read("chemicals.json", [])
+@router.post("/readings", status_code=202)
+async def ingest_readings(
+    request: Request,
+    response: Response,
+    skid: str = Query("default", pattern=ID_PATTERN),
+    partition: Partition = Depends(get_partition),
+) -> dict[str, int]:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_TYPES:
+        parse = parse_ndjson
+    elif content_type == BINARY_TYPE:
+        parse = parse_binary
+    else:
+        raise HTTPException(status_code=415, detail=f"Tipo de contenido no soportado: {content_type}")
+    body = await request.body()
+    try:
+        # A batch holds thousands of readings: parsed in the storage
+        # executor so the event loop keeps serving other requests.
+        records = await partition.aio.run(parse, body, skid)
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error)) from None
+
+    buffer = partition.ingest_buffer
+    try:
+        pending = buffer.submit(records)
+    except IngestBackpressure as error:
+        raise HTTPException(
+            status_code=429,
+            detail="Búfer de ingesta lleno, reintente",
+            headers={
+                "Retry-After": str(max(1, round(buffer.flush_seconds))),
+                "X-Ingest-Pending": str(error.pending),
+            },
+        ) from None
+    response.headers["X-Ingest-Pending"] = str(pending)
+    return {"aceptadas": len(records), "pendientes": pending}
+
+
+@router.get("/readings")
+async def list_readings(
+    start: date | None = Query(None, alias="from"),
+    end: date | None = Query(None, alias="to"),
+    cursor: str | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    fields: str | None = None,
+    max_points: int | None = Query(None, ge=MIN_CHART_POINTS),
+    partition: Partition = Depends(get_partition),
+) -> Response:
+    return await query_records(partition.aio, READINGS, start, end, cursor, limit, fields, max_points, "skid")
+
+
+@router.get("/chemicals")
+async def list_chemicals(partition: Partition = Depends(get_partition)) -> Response:
+    return Response(
+        content=await partition.aio.read_raw("chemicals.json", DEFAULT_CHEMICALS), media_type="application/json"
+    )
 
 
-@app.post("/api/chemicals/consume")
-async def consume_chemicals(payload: ConsumptionPayload) -> dict[str, str]:
-    _, storage = get_storage()
-    ensure_seed_data(storage)
-    chemicals = storage.read("chemicals.json", [])
-    chem_index = {item["nombre"].lower(): item for item in chemicals}
+def apply_consumption(
+    chemicals: list[dict], payload: ConsumptionPayload
+) -> tuple[list[dict], list[dict]]:
+    chem_index = {item["nombre"].lower(): dict(item) for item in chemicals}
 
     updates = []
     for item in payload.items:
@@ -108,52 +339,290 @@ async def consume_chemicals(payload: ConsumptionPayload) -> dict[str, str]:
                 "stock_restante": chemical["stock"],
             }
         )
+    return list(chem_index.values()), updates
+
+
+def consume(storage: JSONStorage, payload: ConsumptionPayload) -> bool:
+    for _ in range(CONSUME_RETRIES):
+        chemicals, version = storage.read_versioned("chemicals.json", DEFAULT_CHEMICALS)
+        chemicals, updates = apply_consumption(chemicals, payload)
+        try:
+            with storage.lock("chemicals.json", "consumption.json"):
+                storage.update_chemicals(chemicals, expected_version=version)
+                storage.append_consumption(updates)
+        except StorageConflict:
+            continue
+        return True
+    return False
 
-    storage.update_chemicals(list(chem_index.values()))
-    storage.append_consumption(updates)
-    return {"status": "updated"}
 
+@router.post("/chemicals/consume")
+async def consume_chemicals(
+    payload: ConsumptionPayload, partition: Partition = Depends(get_partition)
+) -> dict[str, str]:
+    if not await partition.aio.run(consume, partition.storage, payload):
+        raise HTTPException(status_code=409, detail="Inventario modificado concurrentemente, reintente")
+    return {"status": "updated"}
 
-@app.get("/api/chemicals/consumption")
-async def list_consumption() -> list[dict]:
-    _, storage = get_storage()
-    ensure_seed_data(storage)
-    return storage.read("consumption.json", [])
 
+@router.get("/chemicals/consumption")
+async def list_consumption(
+    start: date | None = Query(None, alias="from"),
+    end: date | None = Query(None, alias="to"),
+    cursor: str | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    fields: str | None = None,
+    max_points: int | None = Query(None, ge=MIN_CHART_POINTS),
+    partition: Partition = Depends(get_partition),
+) -> Response:
+    return await query_records(
+        partition.aio, "consumption.json", start, end, cursor, limit, fields, max_points, "nombre"
+    )
 
-@app.get("/api/alerts")
-async def get_alerts() -> dict[str, list[dict]]:
-    config, storage = get_storage()
-    ensure_seed_data(storage)
-    chemicals = storage.read("chemicals.json", [])
-    operational = storage.read("operational.json", [])
 
-    stock_alerts = []
-    for item in chemicals:
-        initial = float(item.get("stock_inicial", 0))
-        if initial <= 0:
-            continue
-        remaining = float(item.get("stock", 0))
-        percent = (remaining / initial) * 100
-        if percent < 20:
-            stock_alerts.append(
-                {
-                    "nombre": item.get("nombre"),
-                    "percent": round(percent, 2),
-                    "stock": remaining,
-                }
+@router.get("/chemicals/forecast")
+async def chemicals_forecast(
+    lead_days: int | None = Query(None, ge=0), partition: Partition = Depends(get_partition)
+) -> Response:
+    return json_response(await partition.aio.run(partition.forecast.rows, lead_days))
+
+
+@router.post("/import/operational")
+async def import_operational(
+    request: Request, format: str | None = None, partition: Partition = Depends(get_partition)
+) -> dict[str, int]:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    try:
+        fmt = bulk.format_for(f".{format}" if format else None, content_type)
+    except ValueError as error:
+        raise HTTPException(status_code=415, detail=str(error)) from None
+
+    # The body is spooled to disk as it arrives; rows are then validated and
+    # written in chunks outside the event loop.
+    with tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_BYTES) as upload:
+        async for block in request.stream():
+            upload.write(block)
+        upload.seek(0)
+        try:
+            count, _ = await partition.aio.run(
+                bulk.import_operational, partition.storage, upload, fmt, partition.config.bulk_chunk_records
             )
+        except bulk.ImportErrors as error:
+            raise HTTPException(
+                status_code=422,
+                detail={"mensaje": f"{error.total} filas inválidas; no se importó nada", "errores": error.errors},
+            ) from None
+        except ValueError as error:
+            raise HTTPException(status_code=422, detail=str(error)) from None
+    return {"importados": count}
+
+
+@router.get("/export/{dataset}")
+async def export_dataset(
+    dataset: Literal["operational", "consumption", "readings"],
+    format: Literal["csv", "ndjson", "parquet"] = "csv",
+    start: date | None = Query(None, alias="from"),
+    end: date | None = Query(None, alias="to"),
+    partition: Partition = Depends(get_partition),
+) -> StreamingResponse:
+    try:
+        bulk.format_for(f".{format}")
+    except ValueError as error:
+        raise HTTPException(status_code=415, detail=str(error)) from None
+    query = RangeQuery(start=start.isoformat() if start else None, end=end.isoformat() if end else None)
+    name = bulk.EXPORT_DATASETS[dataset]
+    chunks = partial(bulk.iter_records, partition.storage, name, query, partition.config.bulk_chunk_records)
+    return StreamingResponse(
+        bulk.export_chunks(chunks, format, name),
+        media_type=bulk.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{format}"'},
+    )
+
+
+@router.get("/archive")
+async def list_archive(partition: Partition = Depends(get_partition)) -> Response:
+    return json_response(await partition.aio.run(partition.retention.archive.partitions))
+
+
+@router.get("/archive/{dataset}")
+async def read_archive(
+    dataset: Literal["operational", "consumption", "readings"],
+    format: Literal["csv", "ndjson", "parquet"] = "ndjson",
+    start: date | None = Query(None, alias="from"),
+    end: date | None = Query(None, alias="to"),
+    partition: Partition = Depends(get_partition),
+) -> StreamingResponse:
+    try:
+        bulk.format_for(f".{format}")
+    except ValueError as error:
+        raise HTTPException(status_code=415, detail=str(error)) from None
+    query = RangeQuery(start=start.isoformat() if start else None, end=end.isoformat() if end else None)
+    # Decompressed one month at a time while the response is sent.
+    name = bulk.EXPORT_DATASETS[dataset]
+    chunks = partial(partition.retention.archive.iter_records, name, query)
+    return StreamingResponse(
+        bulk.export_chunks(chunks, format, name),
+        media_type=bulk.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{dataset}-archivo.{format}"'},
+    )
+
+
+@router.get("/alerts")
+async def get_alerts(partition: Partition = Depends(get_partition)) -> dict[str, list[dict]]:
+    return await partition.aio.run(partition.alerts)
+
+
+@router.get("/anomalies")
+async def list_anomalies(
+    start: date | None = Query(None, alias="from"),
+    end: date | None = Query(None, alias="to"),
+    sensor: str | None = None,
+    cursor: str | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    partition: Partition = Depends(get_partition),
+) -> Response:
+    if sensor is None:
+        return await query_records(partition.aio, ANOMALIES, start, end, cursor, limit, None)
+    if sensor not in SENSORS:
+        raise HTTPException(status_code=422, detail=f"Sensor desconocido: {sensor}")
+    # Events are few: the whole range is filtered and ``limit`` keeps the latest.
+    records, _ = await partition.aio.query(
+        ANOMALIES,
+        RangeQuery(start=start.isoformat() if start else None, end=end.isoformat() if end else None),
+    )
+    records = [record for record in records if record["sensor"] == sensor]
+    return json_response(records[-limit:] if limit else records)
+
+
+@router.get("/rollups")
+async def list_rollups(
+    dataset: Literal["operational", "consumption", "readings"] = "operational",
+    period: Literal["day", "week", "month"] = "day",
+    start: date | None = Query(None, alias="from"),
+    end: date | None = Query(None, alias="to"),
+    partition: Partition = Depends(get_partition),
+) -> Response:
+    return json_response(await partition.aio.run(partition.rollups.rows, dataset, period, start, end))
+
+
+@router.get("/events")
+async def stream_events(
+    request: Request, topics: str | None = None, partition: Partition = Depends(get_partition)
+) -> StreamingResponse:
+    selected = {topic.strip() for topic in topics.split(",") if topic.strip()} if topics else set(TOPICS)
+    if not selected <= set(TOPICS):
+        raise HTTPException(status_code=422, detail=f"Temas no soportados: {sorted(selected - set(TOPICS))}")
+    broker = partition.events
+    subscriber = broker.subscribe(selected)
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                await partition.aio.run(broker.check_versions)
+                try:
+                    event_id, event, data = await asyncio.wait_for(
+                        subscriber.get(), timeout=EVENTS_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield format_sse(event_id, event, data)
+        finally:
+            broker.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _snapshot_key(max_points: int | None, encoding: str | None) -> tuple:
+    return ("snapshot", max_points, encoding)
+
+
+def build_snapshot(
+    partition: Partition, max_points: int | None, encoding: str | None
+) -> tuple[tuple[bytes, str | None], str]:
+    config, storage = partition.config, partition.storage
+    with storage.lock(*SNAPSHOT_DATASETS):
+        tag = snapshot_tag(config, max_points, *(storage.version(name) for name in SNAPSHOT_DATASETS))
+        key = _snapshot_key(max_points, encoding)
+        cached = partition.cache.get(key, tag)
+        if cached is MISSING:
+            operational = storage.read("operational.json", [])
+            consumption = storage.read("consumption.json", [])
+            if max_points is not None:
+                operational = downsample_records(operational, max_points)
+                consumption = downsample_records(consumption, max_points, "nombre")
+            payload = {
+                "config": config_payload(config),
+                "operational": operational,
+                "chemicals": storage.read("chemicals.json", DEFAULT_CHEMICALS),
+                "consumption": consumption,
+                "alerts": partition.alerts(),
+            }
+            with metrics.phase("serialize"):
+                cached = encode_body(payload, encoding)
+            partition.cache.put(key, tag, cached, len(cached[0]))
+    return cached, tag
+
+
+@router.get("/snapshot")
+async def get_snapshot(
+    request: Request,
+    max_points: int | None = Query(None, ge=MIN_CHART_POINTS),
+    partition: Partition = Depends(get_partition),
+) -> Response:
+    config, storage = partition.config, partition.storage
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    # The ETag names the encoding actually sent, and bodies under
+    # MIN_COMPRESS_BYTES go uncompressed, so it is known once the body was
+    # built. While the cached body is current, an unchanged dashboard costs
+    # no file read and no serialization.
+    if_none_match = request.headers.get("if-none-match")
+    tag = snapshot_tag(config, max_points, *(storage.version(name) for name in SNAPSHOT_DATASETS))
+    cached = partition.cache.get(_snapshot_key(max_points, encoding), tag)
+    if cached is not MISSING and matches(if_none_match, etag(tag, cached[1])):
+        return Response(status_code=304, headers={**headers, "ETag": etag(tag, cached[1])})
+
+    (body, used), tag = await partition.aio.run(build_snapshot, partition, max_points, encoding)
+    headers["ETag"] = etag(tag, used)
+    if matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    if used:
+        headers["Content-Encoding"] = used
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/plants")
+async def list_plants() -> dict[str, list[dict]]:
+    return {"plantas": _registry.plants(load_config())}
+
+
+@app.put("/api/plants/{plant_id}")
+async def create_plant(plant_id: str) -> dict[str, str]:
+    await asyncio.to_thread(open_partition, (plant_id,), create=True)
+    return {"status": "ok", "id": plant_id}
+
+
+@app.put("/api/plants/{plant_id}/skids/{skid_id}")
+async def create_skid(plant_id: str, skid_id: str) -> dict[str, str]:
+    await asyncio.to_thread(open_partition, (plant_id, skid_id), create=True)
+    return {"status": "ok", "id": f"{plant_id}/{skid_id}"}
+
+
+async def plant_path(plant_id: str) -> None:
+    pass
+
+
+async def skid_path(plant_id: str, skid_id: str) -> None:
+    pass
 
-    dp_alerts = []
-    if operational:
-        last = operational[-1]
-        dp = float(last["presiones"]["entrada"]) - float(last["presiones"]["salida"])
-        if dp >= config.dp_threshold:
-            dp_alerts.append(
-                {
-                    "mensaje": "ΔP alto: posible ensuciamiento de membranas",
-                    "delta_p": round(dp, 2),
-                }
-            )
 
-    return {"stock": stock_alerts, "delta_p": dp_alerts}
+# The path dependencies only document the ids; get_partition resolves them.
+for prefix, path_dependency in zip(ROUTER_PREFIXES, (None, plant_path, skid_path)):
+    app.include_router(router, prefix=prefix, dependencies=[Depends(path_dependency)] if path_dependency else [])
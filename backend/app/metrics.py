@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from typing import Any, Callable, Iterable, Iterator
+
+# Seconds; from a cached read (well under a millisecond) to a full rewrite of
+# a large history.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label_names: Labels = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        # An unlabelled counter is reported from the start, as 0.
+        self._values: dict[Labels, float] = {} if label_names else {(): 0.0}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """Fixed buckets per label set; an observation is a bisect and two adds.
+
+    Counts are kept per bucket and only made cumulative when rendered.
+    """
+
+    def __init__(
+        self, name: str, help: str, label_names: Labels = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._series: dict[Labels, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return sum(series[:-1]) if series else 0
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in snapshot:
+            total = 0
+            for bound, count in zip((*self.buckets, float("inf")), series[:-1]):
+                total += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket = _format_labels(self.label_names, labels, f'le="{le}"')
+                yield f"{self.name}_bucket{bucket} {total}"
+            suffix = _format_labels(self.label_names, labels)
+            yield f"{self.name}_sum{suffix} {_format_value(series[-1])}"
+            yield f"{self.name}_count{suffix} {total}"
+
+
+class Gauge:
+    """Read when rendered from a callback returning ``(labels, value)`` pairs."""
+
+    def __init__(
+        self, name: str, help: str, label_names: Labels, collect: Callable[[], Iterable[tuple[Labels, float]]]
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.collect = collect
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in sorted(self.collect()):
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Histogram | Gauge] = {}
+
+    def _register(self, metric: Any) -> Any:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, label_names: Labels = ()) -> Counter:
+        return self._register(Counter(name, help, label_names))
+
+    def histogram(
+        self, name: str, help: str, label_names: Labels = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, label_names, buckets))
+
+    def gauge(
+        self, name: str, help: str, label_names: Labels, collect: Callable[[], Iterable[tuple[Labels, float]]]
+    ) -> Gauge:
+        return self._register(Gauge(name, help, label_names, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Metrics are per process: with several workers each one reports its own.
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "ptap_http_request_duration_seconds",
+    "Duración de las peticiones HTTP por ruta.",
+    ("method", "route", "status"),
+)
+STORAGE_SECONDS = REGISTRY.histogram(
+    "ptap_storage_operation_duration_seconds",
+    "Duración de las operaciones de almacenamiento.",
+    ("operation", "dataset"),
+)
+STORAGE_BYTES = REGISTRY.counter(
+    "ptap_storage_bytes_total",
+    "Bytes leídos y escritos en disco por conjunto de datos.",
+    ("direction", "dataset"),
+)
+COALESCED_READS = REGISTRY.counter(
+    "ptap_storage_coalesced_reads_total",
+    "Lecturas atendidas con el resultado de otra lectura en curso del mismo archivo.",
+    ("operation",),
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "ptap_cache_lookups_total", "Consultas a la caché en memoria.", ("result",)
+)
+CACHE_EVICTIONS = REGISTRY.counter(
+    "ptap_cache_evictions_total", "Entradas desalojadas de la caché por falta de espacio."
+)
+ANOMALIES = REGISTRY.counter(
+    "ptap_anomalies_total", "Anomalías detectadas en las lecturas, por sensor.", ("sensor",)
+)
+PHASE_SECONDS = REGISTRY.histogram(
+    "ptap_phase_duration_seconds",
+    "Duración de fases internas: configuración, parseo, datos iniciales, alertas y serialización.",
+    ("phase",),
+)
+
+
+@contextmanager
+def timer(histogram: Histogram, *labels: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, *labels)
+
+
+def phase(name: str) -> Any:
+    return timer(PHASE_SECONDS, name)
+
+
+def timed_storage(operation: str) -> Callable:
+    """Times a storage method whose first argument is the dataset name."""
+
+    def decorate(method: Callable) -> Callable:
+        @wraps(method)
+        def wrapper(self: Any, name: str, *args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return method(self, name, *args, **kwargs)
+            finally:
+                STORAGE_SECONDS.observe(time.perf_counter() - start, operation, name)
+
+        return wrapper
+
+    return decorate
+
+
+def record_bytes(direction: str, name: str, size: int) -> None:
+    STORAGE_BYTES.inc(direction, name, amount=size)
+
+
+_PATH_PARAM = re.compile(r"\{[^}]*\}")
+
+
+@lru_cache(maxsize=None)
+def _template_regex(template: str) -> re.Pattern[str]:
+    literals = _PATH_PARAM.split(template)
+    params = [".+" if param.endswith(":path}") else "[^/]+" for param in _PATH_PARAM.findall(template)]
+    pattern = re.escape(literals[0])
+    for param, literal in zip(params, literals[1:]):
+        pattern += param + re.escape(literal)
+    return re.compile(pattern)
+
+
+def route_template(scope: dict, prefixes: tuple[str, ...] = ("",)) -> str:
+    """The matched route's template, with the router prefix it was reached through.
+
+    Taken from the route, not rebuilt from the path, so a parameter equal
+    to a literal segment (a plant called "api") cannot be mistaken for it.
+    A router included under several prefixes may report only its own path;
+    the prefix is the one that, joined to it, matches the whole path.
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    template = route.path_format
+    for prefix in prefixes:
+        if _template_regex(prefix + template).fullmatch(scope["path"]):
+            return prefix + template
+    return template
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request until its last body chunk.
+
+    Requests are labelled with the route template (``/api/plants/{plant_id}/
+    operational``) rather than the path, so the number of series stays
+    bounded; paths that match no route share ``route="unmatched"``.
+    """
+
+    def __init__(
+        self, app: Any, histogram: Histogram = REQUEST_SECONDS, prefixes: tuple[str, ...] = ("",)
+    ) -> None:
+        self.app = app
+        self.histogram = histogram
+        self.prefixes = prefixes
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_template(scope, self.prefixes)
+            self.histogram.observe(time.perf_counter() - start, scope["method"], route, str(status))
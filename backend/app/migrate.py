@@ -0,0 +1,72 @@
+"""Move the file-based datasets into the SQLite engine.
+
+Imports every ``data/*.json`` (and segment logs) into ``ptap.sqlite3`` and,
+optionally, the Streamlit dashboard's ``operational_data.csv``:
+
+    cd backend
+    python -m app.migrate --csv ../operational_data.csv --activate
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from dataclasses import replace
+from pathlib import Path
+from typing import Any
+
+from . import normalization
+from .bulk import iter_rows
+from .config import CONFIG_PATH, load_config
+from .models import OperationalEntry
+from .sqlite_storage import SQLiteStorage
+
+OPERATIONAL = "operational.json"
+
+
+def read_operational_csv(path: Path) -> list[dict[str, Any]]:
+    with path.open("rb") as handle:
+        return [
+            OperationalEntry.model_validate(row).model_dump(mode="json")
+            for row in iter_rows(handle, "csv")
+            if row.get("fecha")
+        ]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", type=Path, help="por defecto, el de backend/config.json")
+    parser.add_argument("--csv", type=Path, help="operational_data.csv del panel Streamlit")
+    parser.add_argument("--activate", action="store_true", help="usar el motor sqlite en backend/config.json")
+    args = parser.parse_args()
+
+    config = load_config()
+    if args.data_dir is not None:
+        config = replace(config, data_dir=args.data_dir.resolve())
+    storage = SQLiteStorage(replace(config, storage_engine="sqlite"))
+    for name, count in storage.migrated.items():
+        print(f"{name}: {count} registros importados")
+    for path in sorted([*config.data_dir.glob("*.json"), *config.data_dir.glob("*.segments")]):
+        print(f"{path.name}: no importado, la base de datos ya tiene ese conjunto")
+
+    if args.csv is not None:
+        with storage.lock(OPERATIONAL, normalization.NORMALIZATION):
+            # Dates already stored are skipped, so the import can be repeated.
+            known = {record["fecha"] for record in storage.read(OPERATIONAL, [])}
+            records = [record for record in read_operational_csv(args.csv) if record["fecha"] not in known]
+            if records:
+                reference = normalization.reference(storage, records)
+                storage.append(OPERATIONAL, list(normalization.annotate(records, reference)))
+        print(f"{args.csv.name}: {len(records)} registros operativos nuevos")
+
+    if args.activate:
+        payload = json.loads(CONFIG_PATH.read_text(encoding="utf-8")) if CONFIG_PATH.exists() else {}
+        payload["storage_engine"] = "sqlite"
+        CONFIG_PATH.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+        print("backend/config.json: storage_engine = sqlite")
+    print(f"Base de datos: {storage.database}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-from datetime import date
+from datetime import date, datetime
 from pydantic import BaseModel, Field
 
+# Plant and skid ids: also directory names, so no separators or dots.
+ID_PATTERN = r"^[a-z0-9][a-z0-9_-]{0,63}$"
+
 
 class PressureData(BaseModel):
     entrada: float = Field(..., ge=0)
@@ -22,6 +25,13 @@ class OperationalEntry(BaseModel):
     caudales_gpm: FlowData
 
 
+class SensorReading(BaseModel):
+    fecha: datetime
+    skid: str = Field("default", pattern=ID_PATTERN)
+    presiones: PressureData
+    caudales_gpm: FlowData
+
+
 class ChemicalItem(BaseModel):
     nombre: str
     stock_inicial: float = Field(..., ge=0)
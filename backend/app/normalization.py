@@ -0,0 +1,212 @@
+"""Normalized membrane performance, stored with every operational record.
+
+Raw ΔP and permeate flow also move with feed pressure and flow; normalized
+to the reference (start-up) conditions, as in ASTM D4516, they only move
+with fouling and scaling. Records written before this existed are updated
+with:
+
+    cd backend
+    python -m app.normalization
+    python -m app.normalization --plant norte --skid skid-1
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from dataclasses import replace
+from typing import Any, Iterable, Iterator
+
+from .query import RangeQuery
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+OPERATIONAL = "operational.json"
+NORMALIZATION = "normalization.json"
+FIELD = "normalizado"
+
+# Feed-channel pressure drop grows with the mean feed-concentrate flow to
+# this power (ASTM D4516, pressure drop normalization).
+DP_FLOW_EXPONENT = 1.4
+DIGITS = 4
+# Stored records read per query while looking for the reference.
+REFERENCE_PAGE = 500
+
+# The backend has no permeate pressure or temperature/conductivity readings:
+# the net driving pressure is the mean feed-side pressure, and no
+# temperature or osmotic correction is applied.
+
+
+def conditions(entry: dict[str, Any]) -> dict[str, Any]:
+    """Operating conditions of one entry, the ones a reference keeps."""
+    pressures, flows = entry["presiones"], entry["caudales_gpm"]
+    permeate, reject = float(flows["permeado"]), float(flows["rechazo"])
+    return {
+        "fecha": entry["fecha"],
+        "ndp": (float(pressures["entrada"]) + float(pressures["salida"])) / 2,
+        "caudal_permeado": permeate,
+        "caudal_medio": permeate / 2 + reject,
+    }
+
+
+def usable_conditions(entry: dict[str, Any]) -> dict[str, Any] | None:
+    """The conditions of ``entry`` if it can be a reference: with zero or
+    missing flow or pressure every normalized value would be 0 or undefined."""
+    try:
+        current = conditions(entry)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if current["caudal_permeado"] > 0 and current["caudal_medio"] > 0 and current["ndp"] > 0:
+        return current
+    return None
+
+
+def _ratio(numerator: float, denominator: float) -> float | None:
+    return numerator / denominator if denominator > 0 else None
+
+
+def _round(value: float | None) -> float | None:
+    return None if value is None else round(value, DIGITS)
+
+
+def normalize(entry: dict[str, Any], reference: dict[str, Any]) -> dict[str, float | None]:
+    current = conditions(entry)
+    pressures, flows = entry["presiones"], entry["caudales_gpm"]
+    delta_p = float(pressures["entrada"]) - float(pressures["salida"])
+    permeate = current["caudal_permeado"]
+    flow_ratio = _ratio(reference["caudal_medio"], current["caudal_medio"])
+    pressure_ratio = _ratio(reference["ndp"], current["ndp"])
+    return {
+        "recuperacion": _round(_ratio(permeate, permeate + float(flows["rechazo"]))),
+        "delta_p": _round(delta_p),
+        "delta_p_norm": _round(None if flow_ratio is None else delta_p * flow_ratio**DP_FLOW_EXPONENT),
+        "caudal_permeado_norm": _round(None if pressure_ratio is None else permeate * pressure_ratio),
+    }
+
+
+def annotate(records: Iterable[dict[str, Any]], reference: dict[str, Any] | None) -> Iterator[dict[str, Any]]:
+    # Without a reference the records are stored without normalized values.
+    for record in records:
+        yield record if reference is None else {**record, FIELD: normalize(record, reference)}
+
+
+def _first_usable(records: Iterable[dict[str, Any]]) -> dict[str, Any] | None:
+    for record in records:
+        current = usable_conditions(record)
+        if current is not None:
+            return current
+    return None
+
+
+def _stored_records(storage: Any) -> Iterator[dict[str, Any]]:
+    query = RangeQuery(limit=REFERENCE_PAGE)
+    while True:
+        records, next_key = storage.query(OPERATIONAL, query)
+        yield from records
+        if next_key is None:
+            return
+        query = replace(query, after=next_key)
+
+
+def reference(storage: Any, pending: Iterable[dict[str, Any]] = ()) -> dict[str, Any] | None:
+    """The stored reference conditions, created from the oldest record with
+    flow and pressure.
+
+    ``pending`` (the records about to be written) is searched when no stored
+    record qualifies; if none does either, there is no reference yet.
+    """
+    with storage.lock(NORMALIZATION):
+        current = storage.read(NORMALIZATION, None)
+        if current is None:
+            current = _first_usable(_stored_records(storage)) or _first_usable(pending)
+            if current is None:
+                return None
+            storage.write(NORMALIZATION, current)
+        return current
+
+
+# -- backfill --------------------------------------------------------------
+
+
+def _normalize_all(records: list[dict[str, Any]], reference: dict[str, Any]) -> list[dict[str, float | None]]:
+    if np is None:
+        return [normalize(record, reference) for record in records]
+    columns = np.array(
+        [
+            (
+                record["presiones"]["entrada"],
+                record["presiones"]["salida"],
+                record["caudales_gpm"]["permeado"],
+                record["caudales_gpm"]["rechazo"],
+            )
+            for record in records
+        ],
+        dtype=float,
+    ).reshape(-1, 4)
+    inlet, outlet, permeate, reject = columns.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ndp = (inlet + outlet) / 2
+        mean_flow = permeate / 2 + reject
+        delta_p = inlet - outlet
+        values = {
+            "recuperacion": np.where(permeate + reject > 0, permeate / (permeate + reject), np.nan),
+            "delta_p": delta_p,
+            "delta_p_norm": np.where(
+                mean_flow > 0, delta_p * (reference["caudal_medio"] / mean_flow) ** DP_FLOW_EXPONENT, np.nan
+            ),
+            "caudal_permeado_norm": np.where(ndp > 0, permeate * reference["ndp"] / ndp, np.nan),
+        }
+    # Non-finite values (zero flow or pressure) are stored as null.
+    rows = {name: np.round(column, DIGITS).astype(object) for name, column in values.items()}
+    for column in rows.values():
+        column[~np.isfinite(column.astype(float))] = None
+    return [dict(zip(rows, items)) for items in zip(*(column.tolist() for column in rows.values()))]
+
+
+def backfill(storage: Any) -> int:
+    """Recomputes the stored values of the whole history in one pass.
+
+    The reference is taken again from the oldest record with flow and
+    pressure, so this is also
+    the way to re-normalize after a history import or an edit of old data.
+    """
+    with storage.lock(OPERATIONAL, NORMALIZATION):
+        records = storage.read(OPERATIONAL, [])
+        if not records:
+            return 0
+        current = _first_usable(sorted(records, key=lambda record: record["fecha"]))
+        if current is None:
+            return 0
+        normalized = _normalize_all(records, current)
+        storage.write(NORMALIZATION, current)
+        storage.write(
+            OPERATIONAL, [{**record, FIELD: values} for record, values in zip(records, normalized)]
+        )
+        return len(records)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plant", help="planta; por defecto, la de data_dir")
+    parser.add_argument("--skid", help="skid de la planta")
+    args = parser.parse_args()
+
+    # Imported here: storage imports this module for its write path.
+    from .config import load_config
+    from .partitions import partition_dir
+    from .storage import create_storage
+
+    key = tuple(part for part in (args.plant, args.skid) if part)
+    config = load_config()
+    path = partition_dir(config.data_dir, key)
+    if key and not path.is_dir():
+        parser.error(f"No existe la partición {'/'.join(key)}")
+    count = backfill(create_storage(replace(config, data_dir=path)))
+    print(f"{count} registros normalizados en {OPERATIONAL}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+from typing import Any
+
+from . import metrics
+from .alerts import AlertEngine
+from .anomalies import AnomalyDetector
+from .async_storage import AsyncStorage
+from .cache import FileCache
+from .config import AppConfig
+from .events import EventBroker
+from .forecast import ForecastStore
+from .ingest import READINGS, WriteBuffer
+from .models import ID_PATTERN
+from .retention import RetentionPolicy
+from .rollups import RollupStore
+from .storage import JSONStorage, create_storage
+
+PLANTS_DIR = "plants"
+SKIDS_DIR = "skids"
+PARTITION_ID = re.compile(ID_PATTERN)
+
+DEFAULT_CHEMICALS = [
+    {"nombre": "Antiescalante", "stock_inicial": 200.0, "stock": 180.0, "unidad": "L"},
+    {"nombre": "Hipoclorito", "stock_inicial": 150.0, "stock": 120.0, "unidad": "L"},
+    {"nombre": "Cloruro férrico", "stock_inicial": 100.0, "stock": 90.0, "unidad": "L"},
+]
+
+# () is the plant the API served before partitioning, stored directly in
+# data_dir; (plant,) and (plant, skid) live under data_dir/plants/.
+PartitionKey = tuple[str, ...]
+
+
+class UnknownPartition(Exception):
+    pass
+
+
+def partition_dir(data_dir: Path, key: PartitionKey) -> Path:
+    if not key:
+        return data_dir
+    path = data_dir / PLANTS_DIR / key[0]
+    if len(key) > 1:
+        path = path / SKIDS_DIR / key[1]
+    return path
+
+
+def ensure_seed_data(storage: JSONStorage) -> None:
+    storage.read("chemicals.json", DEFAULT_CHEMICALS)
+    storage.read("operational.json", [])
+    storage.read("consumption.json", [])
+
+
+class Partition:
+    """Everything one plant or skid needs, isolated from the other partitions.
+
+    Each partition has its own directory, so its own lock files and version
+    counters, plus its own cache, derived state (alerts, rollups, forecast,
+    anomaly detection), event broker and ingest buffer: a busy skid never
+    contends with or evicts another one.
+    """
+
+    def __init__(self, key: PartitionKey, config: AppConfig, executor: ThreadPoolExecutor) -> None:
+        self.key = key
+        self.config = config
+        self.cache = FileCache(config.cache_max_bytes)
+        self.storage = create_storage(config, self.cache)
+        self.aio = AsyncStorage(self.storage, executor)
+        with metrics.phase("seed"):
+            ensure_seed_data(self.storage)
+        self.alert_engine = AlertEngine(config)
+        self.storage.subscribe(self.alert_engine.on_storage_event)
+        self.rollups = RollupStore(self.storage)
+        self.storage.subscribe(self.rollups.on_storage_event)
+        self.forecast = ForecastStore(self.storage, config)
+        self.storage.subscribe(self.forecast.on_storage_event)
+        self.anomalies = AnomalyDetector(self.storage, config)
+        self.storage.subscribe(self.anomalies.on_storage_event)
+        self.retention = RetentionPolicy(self.storage, config, self.rollups)
+        self.events = EventBroker(self.storage, self.alerts)
+        self.storage.subscribe(self.events.on_storage_event)
+        self._buffer: WriteBuffer | None = None
+        self._buffer_lock = threading.Lock()
+
+    def alerts(self) -> dict[str, list[dict]]:
+        with metrics.phase("alerts"):
+            return self.alert_engine.alerts(self.storage)
+
+    @property
+    def ingest_buffer(self) -> WriteBuffer:
+        # Also recreated after an app shutdown/startup cycle within one process.
+        with self._buffer_lock:
+            if self._buffer is None or self._buffer.closed:
+                self._buffer = WriteBuffer(
+                    self.storage,
+                    READINGS,
+                    batch_records=self.config.ingest_batch_records,
+                    flush_seconds=self.config.ingest_flush_seconds,
+                    max_pending=self.config.ingest_max_pending,
+                )
+            return self._buffer
+
+    def close(self) -> None:
+        with self._buffer_lock:
+            if self._buffer is not None:
+                self._buffer.close()
+
+
+class PartitionRegistry:
+    """Opens partitions on first use and reopens them when the config changes.
+
+    Plants and skids have to be created before use, so a mistyped id in a
+    URL is a 404 instead of a new directory.
+    """
+
+    def __init__(self) -> None:
+        self._config: AppConfig | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._executor_threads = 0
+        self._partitions: dict[PartitionKey, Partition] = {}
+        self._lock = threading.Lock()
+
+    def get(self, config: AppConfig, key: PartitionKey = (), create: bool = False) -> Partition:
+        for part in key:
+            if not PARTITION_ID.match(part):
+                raise ValueError(f"Identificador inválido: {part}")
+        with self._lock:
+            if config != self._config:
+                self._close_all()
+                self._config = config
+                if config.storage_threads != self._executor_threads:
+                    if self._executor is not None:
+                        self._executor.shutdown(wait=False)
+                    self._executor = ThreadPoolExecutor(config.storage_threads, thread_name_prefix="storage")
+                    self._executor_threads = config.storage_threads
+            partition = self._partitions.get(key)
+            executor = self._executor
+        if partition is not None:
+            return partition
+
+        # Opening a partition reads its datasets, so it is done outside the
+        # registry lock: other partitions stay available meanwhile.
+        path = partition_dir(config.data_dir, key)
+        if key and not path.is_dir():
+            if not create or (len(key) > 1 and not partition_dir(config.data_dir, key[:1]).is_dir()):
+                raise UnknownPartition("/".join(key))
+            path.mkdir(parents=True, exist_ok=True)
+        opened = Partition(key, replace(config, data_dir=path), executor)
+        with self._lock:
+            if config != self._config:
+                # The config changed while opening: open it again with the new one.
+                opened.close()
+                return self.get(self._config, key, create)
+            partition = self._partitions.setdefault(key, opened)
+        if partition is not opened:
+            # Another request opened it first.
+            opened.close()
+        return partition
+
+    def open_partitions(self) -> list[Partition]:
+        with self._lock:
+            return list(self._partitions.values())
+
+    def plants(self, config: AppConfig) -> list[dict[str, Any]]:
+        root = config.data_dir / PLANTS_DIR
+        if not root.is_dir():
+            return []
+        return [
+            {
+                "id": plant.name,
+                "skids": sorted(skid.name for skid in (plant / SKIDS_DIR).glob("*") if skid.is_dir()),
+            }
+            for plant in sorted(root.iterdir())
+            if plant.is_dir() and PARTITION_ID.match(plant.name)
+        ]
+
+    def _close_all(self) -> None:
+        for partition in self._partitions.values():
+            partition.close()
+        self._partitions.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            for partition in self._partitions.values():
+                partition.close()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import base64
+import binascii
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+DATE_FIELD = "fecha"
+
+# Sort key of a record inside a dataset: its date plus its position in the
+# log, which breaks ties between records of the same day.
+IndexKey = tuple[str, int]
+
+# Appended to the upper bound so that "to=2024-10-05" also covers timestamps
+# such as "2024-10-05T23:00:00".
+_END_OF_DAY = "\uffff"
+
+
+@dataclass
+class RangeQuery:
+    start: str | None = None
+    end: str | None = None
+    after: IndexKey | None = None
+    limit: int | None = None
+
+    def bounds(self, keys: Sequence[IndexKey]) -> tuple[int, int]:
+        low = 0
+        if self.start is not None:
+            low = bisect_left(keys, (self.start, -1))
+        if self.after is not None:
+            low = max(low, bisect_right(keys, self.after))
+        high = len(keys)
+        if self.end is not None:
+            high = bisect_right(keys, (self.end_bound(), -1))
+        return low, max(low, high)
+
+    def end_bound(self) -> str:
+        return self.end + _END_OF_DAY
+
+    def page(self, keys: Sequence[IndexKey]) -> tuple[int, int, IndexKey | None]:
+        low, high = self.bounds(keys)
+        stop = high if self.limit is None else min(high, low + self.limit)
+        next_key = keys[stop - 1] if stop < high and stop > low else None
+        return low, stop, next_key
+
+
+def build_index(records: Sequence[dict[str, Any]], field: str = DATE_FIELD) -> list[IndexKey]:
+    return sorted((str(record.get(field, "")), position) for position, record in enumerate(records))
+
+
+def encode_cursor(key: IndexKey) -> str:
+    return base64.urlsafe_b64encode(f"{key[0]}|{key[1]}".encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> IndexKey:
+    try:
+        value, _, position = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").rpartition("|")
+        return value, int(position)
+    except (binascii.Error, UnicodeError, ValueError) as exc:
+        raise ValueError(f"Cursor inválido: {cursor}") from exc
+
+
+def parse_fields(fields: str | None) -> list[list[str]] | None:
+    if not fields:
+        return None
+    return [path.strip().split(".") for path in fields.split(",") if path.strip()]
+
+
+def project(record: dict[str, Any], paths: list[list[str]]) -> dict[str, Any]:
+    result: dict[str, Any] = {}
+    for path in paths:
+        value: Any = record
+        for part in path:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = result
+            for part in path[:-1]:
+                target = target.setdefault(part, {})
+            target[path[-1]] = value
+    return result
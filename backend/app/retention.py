@@ -0,0 +1,241 @@
+"""Retention: moves old records out of the hot datasets into the archive.
+
+Records older than ``retention_days`` (``readings_retention_days`` for sensor
+readings) are folded into the archived rollups and written to compressed
+month files under ``archive/``, then removed from the dataset. The server
+runs it every ``retention_interval_seconds``; also usable on its own:
+
+    cd backend
+    python -m app.retention
+    python -m app.retention --plant norte --skid skid-1
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import re
+import sys
+from collections import Counter
+from dataclasses import replace
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Iterator
+
+from . import serialization
+from .config import AppConfig, load_config
+from .ingest import READINGS
+from .query import RangeQuery, build_index
+from .rollups import RollupStore
+from .storage import atomic_write_bytes, create_storage
+
+ARCHIVE_DIR = "archive"
+ARCHIVE_SUFFIX = ".ndjson.gz"
+OPERATIONAL = "operational.json"
+CONSUMPTION = "consumption.json"
+# Dataset -> config field with its retention in days (0 keeps everything).
+RETAINED = {OPERATIONAL: "retention_days", CONSUMPTION: "retention_days", READINGS: "readings_retention_days"}
+
+PENDING = "pendiente.json"
+
+# ``<month>.antes-<cutoff>``; ``<month>.v<version>`` files were written by
+# earlier versions and are still read.
+_ARCHIVE_FILE = re.compile(r"^(\d{4}-\d{2})\.(antes-\d{4}-\d{2}-\d{2}|v\d+)" + re.escape(ARCHIVE_SUFFIX) + "$")
+
+
+def _stem(name: str) -> str:
+    return name.rsplit(".", 1)[0]
+
+
+class Archive:
+    """Gzipped JSON Lines files, one per dataset, month and retention cutoff.
+
+    ``archive/operational/2024-01.antes-2024-03-01.ndjson.gz`` holds the
+    January records removed by the pass that kept from March 1st on. A file
+    is only ever extended at the end, by a later pass with the same cutoff.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    def _files(self, name: str) -> list[tuple[str, Path]]:
+        folder = self.directory / _stem(name)
+        if not folder.is_dir():
+            return []
+        files = []
+        for path in folder.iterdir():
+            match = _ARCHIVE_FILE.match(path.name)
+            if match:
+                files.append((match.group(1), path.name, path))
+        return [(month, path) for month, _, path in sorted(files)]
+
+    def _path(self, name: str, month: str, cutoff: str) -> Path:
+        return self.directory / _stem(name) / f"{month}.antes-{cutoff}{ARCHIVE_SUFFIX}"
+
+    @staticmethod
+    def _read(path: Path) -> list[dict[str, Any]]:
+        if not path.exists():
+            return []
+        with gzip.open(path, "rb") as handle:
+            return [serialization.loads(line) for line in handle]
+
+    def extend(self, name: str, records: list[dict[str, Any]], cutoff: str) -> dict[str, list[dict[str, Any]]]:
+        """Adds to the files of ``cutoff`` the records they do not hold yet.
+
+        Returns the full contents of the files of the months in ``records``.
+        A record already in its month's file (written by an interrupted pass
+        or an earlier one with the same cutoff) is not added again.
+        """
+        months: dict[str, list[dict[str, Any]]] = {}
+        for record in records:
+            months.setdefault(record["fecha"][:7], []).append(record)
+        (self.directory / _stem(name)).mkdir(parents=True, exist_ok=True)
+        files = {}
+        for month, items in months.items():
+            path = self._path(name, month, cutoff)
+            stored = self._read(path)
+            seen = Counter(serialization.dumps(item) for item in stored)
+            missing = []
+            for item in items:
+                raw = serialization.dumps(item)
+                if seen[raw]:
+                    seen[raw] -= 1
+                else:
+                    missing.append(item)
+            if missing:
+                stored = [*stored, *missing]
+                raw = b"".join(serialization.dumps(item) + b"\n" for item in stored)
+                atomic_write_bytes(path, gzip.compress(raw))
+            files[path.name] = stored
+        return files
+
+    def pending(self, name: str) -> str | None:
+        """Cutoff of a pass over ``name`` that has not finished."""
+        path = self.directory / _stem(name) / PENDING
+        return serialization.loads(path.read_bytes())["corte"] if path.exists() else None
+
+    def set_pending(self, name: str, cutoff: str | None) -> None:
+        path = self.directory / _stem(name) / PENDING
+        if cutoff is None:
+            path.unlink(missing_ok=True)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_bytes(path, serialization.dumps({"corte": cutoff}))
+
+    def partitions(self) -> list[dict[str, Any]]:
+        rows = []
+        for name in RETAINED:
+            for month, path in self._files(name):
+                rows.append(
+                    {"dataset": _stem(name), "mes": month, "archivo": path.name, "bytes": path.stat().st_size}
+                )
+        return rows
+
+    def iter_records(self, name: str, query: RangeQuery) -> Iterator[list[dict[str, Any]]]:
+        """Archived records in the query's date range, in date order, one month at a time.
+
+        Only the files of the months in the range are opened.
+        """
+        low = query.start[:7] if query.start else None
+        high = query.end[:7] if query.end else None
+        months: dict[str, list[Path]] = {}
+        for month, path in self._files(name):
+            if (low and month < low) or (high and month > high):
+                continue
+            months.setdefault(month, []).append(path)
+        for month in sorted(months):
+            records = []
+            for path in months[month]:
+                records.extend(self._read(path))
+            index = build_index(records)
+            start, stop = RangeQuery(start=query.start, end=query.end).bounds(index)
+            if stop > start:
+                yield [records[position] for _, position in index[start:stop]]
+
+
+class RetentionPolicy:
+    def __init__(self, storage: Any, config: AppConfig, rollups: RollupStore) -> None:
+        self.storage = storage
+        self.config = config
+        self.rollups = rollups
+        self.archive = Archive(config.data_dir / ARCHIVE_DIR)
+
+    def cutoffs(self, today: date | None = None) -> dict[str, str]:
+        # First day kept in each dataset with a retention. Whole days, so the
+        # runs after the first one of a day find nothing to move.
+        today = today or date.today()
+        return {
+            name: (today - timedelta(days=getattr(self.config, field))).isoformat()
+            for name, field in RETAINED.items()
+            if getattr(self.config, field) > 0
+        }
+
+    def run(self, today: date | None = None) -> dict[str, int]:
+        moved = {}
+        for name, cutoff in self.cutoffs(today).items():
+            moved[name] = self._apply(name, cutoff)
+        return moved
+
+    def _apply(self, name: str, cutoff: str) -> int:
+        moved = 0
+        pending = self.archive.pending(name)
+        if pending is not None and pending != cutoff:
+            # An interrupted pass is finished first: its records are matched
+            # against its own files, so none is archived twice.
+            moved += self._move(name, pending)
+        return moved + self._move(name, cutoff)
+
+    def _move(self, name: str, cutoff: str) -> int:
+        """Archives and removes the records of ``name`` dated before ``cutoff``.
+
+        The dataset lock is held for the pass, but only the old records are
+        read and the dataset removes them with a ranged delete, so the time it
+        blocks writers grows with what is moved, not with the history kept.
+        Every step can be repeated: the files skip records they already hold,
+        the aggregates fold only what was added to the files, and the pending
+        marker makes the next run repeat an interrupted pass with its cutoff.
+        """
+        last_day = (date.fromisoformat(cutoff) - timedelta(days=1)).isoformat()
+        # Checked through the date index first, so a run with nothing to move
+        # reads nothing else.
+        old, _ = self.storage.query(name, RangeQuery(end=last_day, limit=1))
+        if not old:
+            self.archive.set_pending(name, None)
+            return 0
+        with self.storage.lock(name):
+            old, _ = self.storage.query(name, RangeQuery(end=last_day))
+            self.archive.set_pending(name, cutoff)
+            files = self.archive.extend(name, old, cutoff)
+            # Folded before the records leave the dataset: the rollups rebuild
+            # that the removal triggers then already counts them.
+            self.rollups.archive(name, files, cutoff)
+            count, _ = self.storage.delete_before(name, cutoff)
+            self.archive.set_pending(name, None)
+        return count
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plant", help="planta; por defecto, la de data_dir")
+    parser.add_argument("--skid", help="skid de la planta")
+    args = parser.parse_args()
+
+    # Imported here: partitions imports this module.
+    from .partitions import partition_dir
+
+    key = tuple(part for part in (args.plant, args.skid) if part)
+    config = load_config()
+    path = partition_dir(config.data_dir, key)
+    if key and not path.is_dir():
+        parser.error(f"No existe la partición {'/'.join(key)}")
+    config = replace(config, data_dir=path)
+    storage = create_storage(config)
+    moved = RetentionPolicy(storage, config, RollupStore(storage)).run()
+    if not moved:
+        print("Sin retención configurada (retention_days, readings_retention_days)")
+    for name, count in moved.items():
+        print(f"{name}: {count} registros archivados")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
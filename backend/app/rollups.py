@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import Any
+
+from .downsample import numeric_leaves
+from .ingest import READINGS
+
+ROLLUPS = "rollups.json"
+# Aggregates of the records moved to the archive by the retention job; the
+# rollups are rebuilt on top of them.
+ARCHIVED = "rollups_archive.json"
+DATASETS = {"operational": "operational.json", "consumption": "consumption.json", "readings": READINGS}
+PERIODS = ("day", "week", "month")
+
+
+def period_keys(fecha: str) -> dict[str, str]:
+    day = date.fromisoformat(fecha[:10])
+    year, week, _ = day.isocalendar()
+    return {"day": day.isoformat(), "week": f"{year}-W{week:02d}", "month": day.isoformat()[:7]}
+
+
+def period_key(period: str, value: date) -> str:
+    return period_keys(value.isoformat())[period]
+
+
+def _empty() -> dict[str, Any]:
+    return {
+        "versions": {name: 0 for name in DATASETS.values()},
+        **{dataset: {period: {} for period in PERIODS} for dataset in DATASETS},
+    }
+
+
+# Adders never modify buckets in place: the document read from storage is
+# shared with the cache, so every touched bucket is copied first.
+def _add_operational(section: dict[str, dict], entry: dict[str, Any]) -> None:
+    for period, key in period_keys(entry["fecha"]).items():
+        bucket = _copy(section[period].get(key) or {"registros": 0, "campos": {}})
+        bucket["registros"] += 1
+        for name, value in numeric_leaves(entry):
+            stats = bucket["campos"].get(name)
+            if stats is None:
+                bucket["campos"][name] = {"min": value, "max": value, "sum": value, "count": 1}
+            else:
+                stats["min"] = min(stats["min"], value)
+                stats["max"] = max(stats["max"], value)
+                stats["sum"] += value
+                stats["count"] += 1
+        section[period][key] = bucket
+
+
+def _add_consumption(section: dict[str, dict], item: dict[str, Any]) -> None:
+    for period, key in period_keys(item["fecha"]).items():
+        bucket = _copy(section[period].get(key) or {"registros": 0, "consumo": {}})
+        bucket["registros"] += 1
+        bucket["consumo"][item["nombre"]] = bucket["consumo"].get(item["nombre"], 0.0) + float(item["consumo"])
+        section[period][key] = bucket
+
+
+# Readings are aggregated like operational entries (the skid is not numeric).
+_ADDERS = {"operational.json": _add_operational, "consumption.json": _add_consumption, READINGS: _add_operational}
+_SECTIONS = {name: dataset for dataset, name in DATASETS.items()}
+
+
+def _copy(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    return value
+
+
+class RollupStore:
+    """Day/week/month aggregates persisted in ``rollups.json``.
+
+    Updated from storage append events; if an event does not directly follow
+    the version the rollups were built from, they are rebuilt from history,
+    starting from the aggregates of the archived records.
+    """
+
+    def __init__(self, storage: Any) -> None:
+        self.storage = storage
+
+    def rebuild(self) -> dict[str, Any]:
+        # Sources are locked before the rollups, the same order used by the
+        # write path (dataset lock held -> listener takes the rollups lock).
+        with self.storage.lock(*DATASETS.values()), self.storage.lock(ROLLUPS):
+            archived = self.storage.read(ARCHIVED, None) or _empty()
+            rollups = _empty()
+            for name, add in _ADDERS.items():
+                records, version = self.storage.read_versioned(name, [])
+                dataset = _SECTIONS[name]
+                if dataset in archived:
+                    rollups[dataset] = _copy(archived[dataset])
+                section = rollups[dataset]
+                for record in records:
+                    add(section, record)
+                rollups["versions"][name] = version
+            self.storage.write(ROLLUPS, rollups)
+            return rollups
+
+    def on_storage_event(self, event: str, name: str, payload: Any, version: int) -> None:
+        if name not in _ADDERS or event != "append":
+            return
+        with self.storage.lock(ROLLUPS):
+            rollups = self.storage.read(ROLLUPS, None)
+            if rollups is None or rollups["versions"].get(name) != version - 1:
+                # Missed a write; current() rebuilds on the next read.
+                return
+            dataset = _SECTIONS[name]
+            section = {period: dict(buckets) for period, buckets in rollups[dataset].items()}
+            for record in payload:
+                _ADDERS[name](section, record)
+            rollups = {**rollups, dataset: section, "versions": {**rollups["versions"], name: version}}
+            self.storage.write(ROLLUPS, rollups)
+
+    def current(self) -> dict[str, Any]:
+        rollups = self.storage.read(ROLLUPS, None)
+        if rollups is None or any(
+            rollups["versions"].get(name) != self.storage.version(name) for name in DATASETS.values()
+        ):
+            rollups = self.rebuild()
+        return rollups
+
+    def archive(self, name: str, files: dict[str, list[dict[str, Any]]], cutoff: str) -> None:
+        """Folds archive files of ``name`` into the archived aggregates.
+
+        ``files`` maps archive file names of the retention pass up to
+        ``cutoff`` to their records. Those files only grow at the end, and the
+        number of records already folded from each is kept, so folding the
+        same file again adds only the records written to it since.
+        """
+        with self.storage.lock(ARCHIVED):
+            archived = self.storage.read(ARCHIVED, None) or _empty()
+            folded = archived.get("archivos", {}).get(name, {})
+            if folded.get("corte") != cutoff:
+                folded = {"corte": cutoff, "registros": {}}
+            counts = dict(folded["registros"])
+            dataset = _SECTIONS[name]
+            section = {
+                period: dict(buckets)
+                for period, buckets in archived.get(dataset, _empty()[dataset]).items()
+            }
+            for file, records in files.items():
+                for record in records[counts.get(file, 0):]:
+                    _ADDERS[name](section, record)
+                counts[file] = len(records)
+            if counts == folded["registros"]:
+                return
+            self.storage.write(
+                ARCHIVED,
+                {
+                    **archived,
+                    dataset: section,
+                    "archivos": {**archived.get("archivos", {}), name: {"corte": cutoff, "registros": counts}},
+                },
+            )
+
+    def rows(
+        self, dataset: str, period: str, start: date | None = None, end: date | None = None
+    ) -> list[dict[str, Any]]:
+        buckets = self.current()[dataset][period]
+        low = period_key(period, start) if start else None
+        high = period_key(period, end) if end else None
+        rows = []
+        for key in sorted(buckets):
+            if (low and key < low) or (high and key > high):
+                continue
+            bucket = buckets[key]
+            row: dict[str, Any] = {"periodo": key, "registros": bucket["registros"]}
+            if dataset != "consumption":
+                for name, stats in bucket["campos"].items():
+                    target = row
+                    *parents, leaf = name.split(".")
+                    for part in parents:
+                        target = target.setdefault(part, {})
+                    target[leaf] = {
+                        "min": stats["min"],
+                        "max": stats["max"],
+                        "mean": round(stats["sum"] / stats["count"], 4),
+                    }
+            else:
+                row["consumo"] = bucket["consumo"]
+            rows.append(row)
+        return rows
+
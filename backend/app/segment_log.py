@@ -0,0 +1,360 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Iterator
+
+from . import serialization
+from .cache import file_stamp
+from .query import DATE_FIELD, IndexKey, RangeQuery
+
+SEGMENT_SUFFIX = ".jsonl"
+MERGE_SUFFIX = ".merge"
+
+
+def _encode(record: Any) -> bytes:
+    return serialization.dumps(record) + b"\n"
+
+
+def _segment_range(path: Path) -> tuple[int, int]:
+    # ``00000003.jsonl`` holds segment 3; a compacted ``00000001-00000008.jsonl``
+    # holds what segments 1 to 8 did.
+    first, _, last = path.name[: -len(SEGMENT_SUFFIX)].partition("-")
+    return int(first), int(last or first)
+
+
+_DATE_PATTERN = re.compile(rb'"' + DATE_FIELD.encode() + rb'":"([^"]*)"')
+
+
+def _line_date(line: bytes) -> str:
+    # Records are written compactly, so the date can be pulled out of the raw
+    # line without decoding the whole record.
+    match = _DATE_PATTERN.search(line)
+    if match:
+        return match.group(1).decode("utf-8")
+    return str(serialization.loads(line).get(DATE_FIELD, ""))
+
+
+class SegmentLog:
+    """Append-only JSON-Lines log split into numbered segment files.
+
+    Only the newest segment is ever appended to; once it reaches
+    ``max_segment_bytes`` a new one is started. When more than
+    ``compact_after`` sealed segments pile up that were never merged, they
+    are merged into one. Merged segments are not merged again, so each
+    record is rewritten by compaction at most once.
+
+    Readers take no lock. A merged segment is renamed into place before the
+    segments it covers are removed, so every listing of the directory holds
+    the whole log; covered segments still on disk are skipped.
+    """
+
+    def __init__(self, directory: Path, max_segment_bytes: int, compact_after: int) -> None:
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.compact_after = compact_after
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._recover()
+        self._index_lock = threading.Lock()
+        self._reset_index()
+
+    def _segment_path(self, first: int, last: int | None = None) -> Path:
+        if last is None or last == first:
+            return self.directory / f"{first:08d}{SEGMENT_SUFFIX}"
+        return self.directory / f"{first:08d}-{last:08d}{SEGMENT_SUFFIX}"
+
+    def _listing(self) -> tuple[list[Path], list[Path]]:
+        """Segments of the log in order, and those covered by a merged segment."""
+        paths = sorted(
+            self.directory.glob(f"*{SEGMENT_SUFFIX}"),
+            key=lambda path: (_segment_range(path)[0], -_segment_range(path)[1]),
+        )
+        live: list[Path] = []
+        covered: list[Path] = []
+        end = 0
+        for path in paths:
+            first, last = _segment_range(path)
+            if last <= end:
+                covered.append(path)
+            else:
+                live.append(path)
+                end = last
+        return live, covered
+
+    def segments(self) -> list[Path]:
+        # A directory scan can miss a file renamed into place while it runs,
+        # but not one present for the whole scan: two equal listings in a row
+        # are a state the log was actually in.
+        listing = self._listing()[0]
+        while True:
+            again = self._listing()[0]
+            if again == listing:
+                return listing
+            listing = again
+
+    def stamp(self) -> tuple:
+        return tuple((path.name, file_stamp(path)) for path in self.segments())
+
+    def size(self) -> int:
+        return sum(path.stat().st_size for path in self.segments())
+
+    def _recover(self) -> None:
+        # Compactions of earlier versions wrote a complete ``<first>-<last>.merge``
+        # file before removing the segments it replaced; it is rolled forward.
+        for merge in self.directory.glob(f"*{MERGE_SUFFIX}"):
+            first, last = (int(part) for part in merge.name[: -len(MERGE_SUFFIX)].split("-"))
+            os.replace(merge, self._segment_path(first, last))
+        self._drop_covered()
+        for tmp in self.directory.glob("*.tmp"):
+            tmp.unlink()
+
+    def _drop_covered(self) -> None:
+        for path in self._listing()[1]:
+            path.unlink(missing_ok=True)
+
+    def _write_file(self, path: Path, records: Iterable[Any]) -> None:
+        self._write_lines(path, (_encode(record) for record in records))
+
+    @staticmethod
+    def _write_lines(path: Path, lines: Iterable[bytes]) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("wb") as handle:
+            for line in lines:
+                handle.write(line)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp, path)
+
+    def _active_segment(self) -> Path:
+        segments = self.segments()
+        if not segments:
+            return self._segment_path(1)
+        active = segments[-1]
+        if active.stat().st_size >= self.max_segment_bytes:
+            return self._segment_path(_segment_range(active)[1] + 1)
+        return active
+
+    @staticmethod
+    def _trim_torn_tail(path: Path) -> None:
+        # A crash mid-append can leave a record without its trailing newline.
+        size = path.stat().st_size
+        if size == 0:
+            return
+        with path.open("rb+") as handle:
+            handle.seek(size - 1)
+            if handle.read(1) == b"\n":
+                return
+            handle.seek(0)
+            data = handle.read()
+            handle.truncate(data.rfind(b"\n") + 1)
+
+    def append(self, records: list[Any]) -> int:
+        """Returns the number of bytes written."""
+        if not records:
+            return 0
+        path = self._active_segment()
+        if path.exists():
+            self._trim_torn_tail(path)
+        raw = b"".join(_encode(record) for record in records)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, raw)
+        finally:
+            os.close(fd)
+
+        if len(self._unmerged(self.segments()[:-1])) > self.compact_after:
+            self.compact()
+        return len(raw)
+
+    @staticmethod
+    def _unmerged(sealed: list[Path]) -> list[Path]:
+        # The newest sealed segments that are still single appended segments.
+        unmerged = []
+        for path in reversed(sealed):
+            first, last = _segment_range(path)
+            if first != last:
+                break
+            unmerged.append(path)
+        return unmerged[::-1]
+
+    @staticmethod
+    def _iter_lines(handle: BinaryIO) -> Iterator[Any]:
+        for line in handle:
+            if not line.endswith(b"\n"):
+                break
+            yield serialization.loads(line)
+
+    @contextmanager
+    def _open_segments(self) -> Iterator[list[BinaryIO]]:
+        # An open segment stays readable after a compaction removes it; if one
+        # is removed between the listing and the open, the log is listed again.
+        while True:
+            handles: list[BinaryIO] = []
+            try:
+                for path in self.segments():
+                    handles.append(path.open("rb"))
+            except FileNotFoundError:
+                for handle in handles:
+                    handle.close()
+                continue
+            break
+        try:
+            yield handles
+        finally:
+            for handle in handles:
+                handle.close()
+
+    def iter_records(self) -> Iterator[Any]:
+        with self._open_segments() as handles:
+            for handle in handles:
+                yield from self._iter_lines(handle)
+
+    def read_raw(self) -> bytes:
+        # Records are single-line compact JSON, so the complete lines of every
+        # segment joined with commas form the JSON array of the whole log.
+        bodies = []
+        with self._open_segments() as handles:
+            for handle in handles:
+                data = handle.read()
+                data = data[: data.rfind(b"\n") + 1]
+                if data:
+                    bodies.append(data[:-1].replace(b"\n", b","))
+        return b"[" + b",".join(bodies) + b"]"
+
+    def read_all(self) -> list[Any]:
+        return serialization.loads(self.read_raw())
+
+    def replace(self, records: list[Any]) -> None:
+        segments = self.segments()
+        if not segments:
+            self._write_file(self._segment_path(1), records)
+            return
+        self._write_file(self._segment_path(_segment_range(segments[0])[0], _segment_range(segments[-1])[1]), records)
+        self._drop_covered()
+
+    def compact(self) -> None:
+        run = self._unmerged(self.segments()[:-1])
+        if len(run) < 2:
+            return
+        merged = self._segment_path(_segment_range(run[0])[0], _segment_range(run[-1])[1])
+        self._write_lines(merged, (line for segment in run for line in self._iter_raw_lines(segment)))
+        self._drop_covered()
+
+    @staticmethod
+    def _iter_raw_lines(path: Path) -> Iterator[bytes]:
+        with path.open("rb") as handle:
+            for line in handle:
+                if not line.endswith(b"\n"):
+                    break
+                yield line
+
+    def delete_before(self, cutoff: str) -> int:
+        """Removes the records dated before ``cutoff`` and returns how many.
+
+        Found through the date index, so only the segments holding such
+        records are touched: sealed ones holding nothing else are removed
+        whole, the others are rewritten without them. Callers hold the
+        dataset lock.
+        """
+        with self._index_lock:
+            self._refresh_index()
+            stop = bisect_left(self._keys, (cutoff,))
+            old: dict[Path, set[int]] = {}
+            for _, position in self._keys[:stop]:
+                path, offset = self._locations[position]
+                old.setdefault(path, set()).add(offset)
+            totals = Counter(path for path, _ in self._locations)
+        active = self.segments()[-1] if old else None
+        for path, offsets in old.items():
+            if len(offsets) == totals[path] and path != active:
+                path.unlink()
+                continue
+            with path.open("rb") as handle:
+                lines, offset = [], 0
+                for line in handle:
+                    if not line.endswith(b"\n"):
+                        break
+                    if offset not in offsets:
+                        lines.append(line)
+                    offset += len(line)
+            self._write_lines(path, lines)
+        return stop
+
+    def _reset_index(self) -> None:
+        # segment name -> (inode, bytes already indexed)
+        self._scanned: dict[str, tuple[int, int]] = {}
+        self._keys: list[IndexKey] = []
+        # position in the log -> (segment path, byte offset of the line)
+        self._locations: list[tuple[Path, int]] = []
+
+    def _refresh_index(self) -> None:
+        segments = self.segments()
+        stats = {path.name: path.stat() for path in segments}
+        known = list(self._scanned)
+        if [path.name for path in segments[: len(known)]] != known or any(
+            stats[name].st_ino != self._scanned[name][0] or stats[name].st_size < self._scanned[name][1]
+            for name in known
+        ):
+            # Segments were merged or rewritten (possibly by another process).
+            self._reset_index()
+
+        for path in segments:
+            stat = stats[path.name]
+            _, offset = self._scanned.get(path.name, (stat.st_ino, 0))
+            if stat.st_size <= offset:
+                continue
+            with path.open("rb") as handle:
+                handle.seek(offset)
+                for line in handle:
+                    if not line.endswith(b"\n"):
+                        break
+                    key = (_line_date(line), len(self._locations))
+                    self._locations.append((path, offset))
+                    if not self._keys or key >= self._keys[-1]:
+                        self._keys.append(key)
+                    else:
+                        insort(self._keys, key)
+                    offset += len(line)
+            self._scanned[path.name] = (stat.st_ino, offset)
+
+    def query(self, query: RangeQuery) -> tuple[list[Any], IndexKey | None]:
+        while True:
+            try:
+                return self._query(query)
+            except FileNotFoundError:
+                # Compacted by another process since the segments were listed;
+                # the index is rebuilt from the new segments.
+                continue
+
+    def _query(self, query: RangeQuery) -> tuple[list[Any], IndexKey | None]:
+        with self._index_lock:
+            self._refresh_index()
+            low, stop, next_key = query.page(self._keys)
+            locations = [self._locations[position] for _, position in self._keys[low:stop]]
+
+        records = []
+        handles: dict[Path, Any] = {}
+        try:
+            for path, offset in locations:
+                if path not in handles:
+                    handles[path] = path.open("rb")
+                handle = handles[path]
+                handle.seek(offset)
+                records.append(serialization.loads(handle.readline()))
+        finally:
+            for handle in handles.values():
+                handle.close()
+        return records, next_key
+
+    def migrate_from(self, path: Path) -> bool:
+        if not path.exists() or self.segments():
+            return False
+        records = serialization.loads(path.read_bytes())
+        self._write_file(self._segment_path(1), records)
+        os.replace(path, path.with_name(path.name + ".migrated"))
+        return True
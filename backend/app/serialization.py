@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # optional
+    msgspec = None
+
+
+def _json_dumps(value: Any, indent: bool = False) -> bytes:
+    if indent:
+        return json.dumps(value, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _orjson_dumps(value: Any, indent: bool = False) -> bytes:
+    return orjson.dumps(value, option=orjson.OPT_INDENT_2 if indent else 0)
+
+
+def _msgspec_dumps(value: Any, indent: bool = False) -> bytes:
+    raw = msgspec.json.encode(value)
+    return msgspec.json.format(raw, indent=2) if indent else raw
+
+
+SERIALIZERS: dict[str, tuple[Callable[..., bytes], Callable[[bytes], Any]]] = {"json": (_json_dumps, json.loads)}
+if msgspec is not None:
+    SERIALIZERS["msgspec"] = (_msgspec_dumps, msgspec.json.decode)
+if orjson is not None:
+    SERIALIZERS["orjson"] = (_orjson_dumps, orjson.loads)
+
+# Fastest available first; every backend produces plain UTF-8 JSON, so files
+# written by one are read by any other.
+PREFERRED = ("orjson", "msgspec", "json")
+
+AUTO = "auto"
+
+name = next(item for item in PREFERRED if item in SERIALIZERS)
+_dumps, _loads = SERIALIZERS[name]
+
+
+def use(serializer: str) -> None:
+    """Selects the backend for the whole process; ``"auto"`` picks the fastest installed."""
+    global name, _dumps, _loads
+    if serializer == AUTO:
+        serializer = next(item for item in PREFERRED if item in SERIALIZERS)
+    if serializer not in SERIALIZERS:
+        if serializer in PREFERRED:
+            raise ValueError(f"Serializador {serializer} no instalado (pip install {serializer})")
+        raise ValueError(f"Serializador no soportado: {serializer}")
+    name = serializer
+    _dumps, _loads = SERIALIZERS[serializer]
+
+
+def dumps(value: Any, indent: bool = False) -> bytes:
+    return _dumps(value, indent)
+
+
+# Records per call when encoding a long list: between calls other threads,
+# the event loop among them, get the GIL back.
+ARRAY_SLICE = 5000
+
+
+def dumps_array(values: Any, indent: bool = False) -> bytes:
+    """Same bytes as ``dumps(values, indent)``; a long list is encoded one slice at a time."""
+    if not isinstance(values, list) or len(values) <= ARRAY_SLICE:
+        return _dumps(values, indent)
+    bodies = [
+        _dumps(values[start : start + ARRAY_SLICE], indent)[1:-1].strip()
+        for start in range(0, len(values), ARRAY_SLICE)
+    ]
+    if indent:
+        return b"[\n  " + b",\n  ".join(bodies) + b"\n]"
+    return b"[" + b",".join(bodies) + b"]"
+
+
+def loads(raw: bytes | str) -> Any:
+    return _loads(raw)
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+from typing import Any
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+from . import serialization
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Smaller bodies are sent as-is; compressing them costs more than it saves.
+MIN_COMPRESS_BYTES = 1024
+
+
+def snapshot_tag(*parts: Any) -> str:
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    offered = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            offered[name.lower()] = quality
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def etag(tag: str, encoding: str | None) -> str:
+    # Each content encoding is a different representation, so it gets its
+    # own strong validator.
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def matches(if_none_match: str | None, current: str) -> bool:
+    """Whether ``If-None-Match`` names ``current``, the ETag that would be sent."""
+    if not if_none_match:
+        return False
+    for value in if_none_match.split(","):
+        value = value.strip()
+        if value == "*":
+            return True
+        if value.startswith("W/"):
+            value = value[2:]
+        if value == current:
+            return True
+    return False
+
+
+def encode_body(payload: Any, encoding: str | None) -> tuple[bytes, str | None]:
+    raw = serialization.dumps(payload)
+    if encoding is None or len(raw) < MIN_COMPRESS_BYTES:
+        return raw, None
+    if encoding == "br":
+        return brotli.compress(raw, quality=BROTLI_QUALITY), "br"
+    return gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0), "gzip"
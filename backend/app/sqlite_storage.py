@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import os
+import queue
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from . import metrics, serialization
+from .cache import MISSING, FileCache
+from .config import AppConfig
+from .locking import StorageConflict
+from .query import DATE_FIELD, IndexKey, RangeQuery, build_index
+from .segment_log import SegmentLog
+from .storage import JSONStorage
+
+DATABASE = "ptap.sqlite3"
+# Approximate cache cost of a decoded record whose encoded size is unknown.
+RECORD_COST = 256
+
+# Append-only datasets become tables (dataset -> table, indexed extra columns);
+# any other dataset is a JSON document in ``documents``.
+TABLES: dict[str, tuple[str, tuple[str, ...]]] = {
+    "operational.json": ("operational", ()),
+    "consumption.json": ("consumption", ("nombre",)),
+    "readings.json": ("readings", ("skid",)),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (name TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS operational (id INTEGER PRIMARY KEY, fecha TEXT NOT NULL, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS operational_fecha ON operational (fecha, id);
+CREATE TABLE IF NOT EXISTS consumption (
+    id INTEGER PRIMARY KEY, fecha TEXT NOT NULL, nombre TEXT, data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS consumption_fecha ON consumption (fecha, id);
+CREATE INDEX IF NOT EXISTS consumption_nombre ON consumption (nombre, fecha);
+CREATE TABLE IF NOT EXISTS readings (id INTEGER PRIMARY KEY, fecha TEXT NOT NULL, skid TEXT, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS readings_fecha ON readings (fecha, id);
+CREATE INDEX IF NOT EXISTS readings_skid ON readings (skid, fecha);
+"""
+
+
+class ConnectionPool:
+    """Fixed set of WAL-mode connections shared by all threads of a process.
+
+    Each connection keeps its own cache of prepared statements, so reusing
+    connections also reuses the compiled queries.
+    """
+
+    def __init__(self, path: Path, size: int) -> None:
+        self.path = path
+        self._connections: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        for _ in range(size):
+            self._connections.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path, timeout=30, isolation_level=None, check_same_thread=False, cached_statements=256
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        connection = self._connections.get()
+        try:
+            yield connection
+        finally:
+            self._connections.put(connection)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self.connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+
+def _row(record: dict[str, Any], columns: tuple[str, ...]) -> tuple[Any, ...]:
+    return (
+        str(record.get(DATE_FIELD, "")),
+        *(record.get(column) for column in columns),
+        serialization.dumps(record).decode("utf-8"),
+    )
+
+
+class SQLiteStorage(JSONStorage):
+    """Stores every dataset in one SQLite database (``ptap.sqlite3``).
+
+    Locks, version counters, listeners and the cache work as in the file
+    engines; range queries and appends go through indexed tables instead of
+    whole files.
+    """
+
+    LOG_DATASETS = ()
+
+    def __init__(self, config: AppConfig, cache: FileCache | None = None) -> None:
+        super().__init__(config, cache)
+        self.database = config.data_dir / DATABASE
+        self.pool = ConnectionPool(self.database, config.sqlite_pool_size)
+        with self.lock(*TABLES, "documents"):
+            with self.pool.connection() as connection:
+                connection.executescript(SCHEMA)
+            self.migrated = self.migrate_files()
+
+    # -- reads -------------------------------------------------------------
+
+    def _fetch_raw(self, name: str) -> bytes | None:
+        with self.pool.connection() as connection:
+            if name in TABLES:
+                rows = connection.execute(f"SELECT data FROM {TABLES[name][0]} ORDER BY id").fetchall()
+                raw = ("[" + ",".join(row[0] for row in rows) + "]").encode("utf-8")
+            else:
+                row = connection.execute("SELECT data FROM documents WHERE name = ?", (name,)).fetchone()
+                raw = row[0].encode("utf-8") if row else None
+        if raw is not None:
+            metrics.record_bytes("read", name, len(raw))
+        return raw
+
+    def _cached_raw(self, name: str, default: Any) -> tuple[bytes, int]:
+        version = self.version(name)
+        key = (self.database, name, "raw")
+        raw = self.cache.get(key, version)
+        if raw is MISSING:
+            raw = self._fetch_raw(name)
+            if raw is None:
+                with self.lock(name):
+                    if self._fetch_raw(name) is None:
+                        version = self.write(name, default)
+                        return serialization.dumps(default), version
+                return self._cached_raw(name, default)
+            self.cache.put(key, version, raw, len(raw))
+        return raw, version
+
+    @metrics.timed_storage("read")
+    def read_versioned(self, name: str, default: Any) -> tuple[Any, int]:
+        key = (self.database, name)
+        version = self.version(name)
+        data = self.cache.get(key, version)
+        if data is not MISSING:
+            return data, version
+        raw, version = self._cached_raw(name, default)
+        with metrics.phase("parse"):
+            data = serialization.loads(raw)
+        self.cache.put(key, version, data, len(raw))
+        return data, version
+
+    @metrics.timed_storage("read_raw")
+    def read_raw(self, name: str, default: Any) -> bytes:
+        return self._cached_raw(name, default)[0]
+
+    @metrics.timed_storage("query")
+    def query(self, name: str, query: RangeQuery) -> tuple[list[dict[str, Any]], IndexKey | None]:
+        if name not in TABLES:
+            records, version = self.read_versioned(name, [])
+            index_key = (self.database, name, "index")
+            index = self.cache.get(index_key, version)
+            if index is MISSING:
+                index = build_index(records)
+                self.cache.put(index_key, version, index, 64 * len(index))
+            low, stop, next_key = query.page(index)
+            return [records[position] for _, position in index[low:stop]], next_key
+
+        clauses, params = [], []
+        if query.start is not None:
+            clauses.append("fecha >= ?")
+            params.append(query.start)
+        if query.end is not None:
+            clauses.append("fecha <= ?")
+            params.append(query.end_bound())
+        if query.after is not None:
+            clauses.append("(fecha, id) > (?, ?)")
+            params.extend(query.after)
+        sql = f"SELECT fecha, id, data FROM {TABLES[name][0]}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY fecha, id"
+        if query.limit is not None:
+            # One extra row tells whether there is a next page.
+            sql += " LIMIT ?"
+            params.append(query.limit + 1)
+
+        with self.pool.connection() as connection:
+            rows = connection.execute(sql, params).fetchall()
+        next_key = None
+        if query.limit is not None and len(rows) > query.limit:
+            rows = rows[: query.limit]
+            next_key = (rows[-1][0], rows[-1][1])
+        raw = "[" + ",".join(row[2] for row in rows) + "]"
+        metrics.record_bytes("read", name, len(raw))
+        records = serialization.loads(raw)
+        return records, next_key
+
+    # -- writes ------------------------------------------------------------
+
+    def _insert(self, connection: sqlite3.Connection, name: str, records: list[dict[str, Any]]) -> None:
+        table, columns = TABLES[name]
+        names = ", ".join(("fecha", *columns, "data"))
+        marks = ", ".join("?" * (len(columns) + 2))
+        rows = [_row(record, columns) for record in records]
+        connection.executemany(f"INSERT INTO {table} ({names}) VALUES ({marks})", rows)
+        metrics.record_bytes("write", name, sum(len(row[-1]) for row in rows))
+
+    def _write(self, name: str, payload: Any, expected_version: int | None = None) -> int:
+        lock = self._lock(name)
+        with lock:
+            if expected_version is not None and lock.version() != expected_version:
+                raise StorageConflict(name)
+            raw = serialization.dumps(payload)
+            with self.pool.transaction() as connection:
+                if name in TABLES:
+                    connection.execute(f"DELETE FROM {TABLES[name][0]}")
+                    self._insert(connection, name, payload)
+                else:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO documents (name, data) VALUES (?, ?)", (name, raw.decode("utf-8"))
+                    )
+                    metrics.record_bytes("write", name, len(raw))
+            version = lock.bump()
+            self.cache.put((self.database, name), version, payload, len(raw))
+            self.cache.put((self.database, name, "raw"), version, raw, len(raw))
+        return version
+
+    def _append(self, name: str, records: list[dict[str, Any]]) -> int:
+        if name not in TABLES:
+            return self._write(name, [*self.read(name, []), *records])
+        lock = self._lock(name)
+        with lock:
+            key = (self.database, name)
+            cached = self.cache.get(key, lock.version())
+            with self.pool.transaction() as connection:
+                self._insert(connection, name, records)
+            version = lock.bump()
+            if cached is not MISSING:
+                # Extend the cached history instead of re-reading the table.
+                history = [*cached, *records]
+                self.cache.put(key, version, history, RECORD_COST * len(history))
+        return version
+
+    def _bulk_append(self, name: str, chunks: Iterable[list[dict[str, Any]]]) -> tuple[int, int]:
+        if name not in TABLES:
+            return super()._bulk_append(name, chunks)
+        lock = self._lock(name)
+        with lock:
+            count = 0
+            with self.pool.transaction() as connection:
+                for chunk in chunks:
+                    self._insert(connection, name, chunk)
+                    count += len(chunk)
+            return count, lock.bump()
+
+    def _delete_before(self, name: str, cutoff: str) -> tuple[int, int]:
+        if name not in TABLES:
+            return super()._delete_before(name, cutoff)
+        lock = self._lock(name)
+        with lock:
+            # One ranged DELETE on the date index.
+            with self.pool.transaction() as connection:
+                count = connection.execute(f"DELETE FROM {TABLES[name][0]} WHERE fecha < ?", (cutoff,)).rowcount
+            return count, lock.bump() if count else lock.version()
+
+    # -- migration ---------------------------------------------------------
+
+    def _is_empty(self, name: str) -> bool:
+        with self.pool.connection() as connection:
+            if name in TABLES:
+                return connection.execute(f"SELECT 1 FROM {TABLES[name][0]} LIMIT 1").fetchone() is None
+            return connection.execute("SELECT 1 FROM documents WHERE name = ?", (name,)).fetchone() is None
+
+    def migrate_files(self) -> dict[str, int]:
+        """Imports the datasets of the file engines found in ``data_dir``.
+
+        Only datasets still empty in the database are imported; the source
+        is then renamed to ``*.migrated``, as the segments engine does.
+        """
+        data_dir = self.config.data_dir
+        sources: dict[str, Path] = {path.name: path for path in data_dir.glob("*.json")}
+        for path in data_dir.glob("*.segments"):
+            sources.setdefault(path.with_suffix(".json").name, path)
+
+        imported = {}
+        for name, path in sorted(sources.items()):
+            with self.lock(name):
+                if not self._is_empty(name):
+                    continue
+                if path.is_dir():
+                    records = SegmentLog(
+                        path,
+                        max_segment_bytes=self.config.segment_max_bytes,
+                        compact_after=self.config.compact_after_segments,
+                    ).read_all()
+                else:
+                    records = serialization.loads(path.read_bytes())
+                self._write(name, records)
+                os.replace(path, path.with_name(path.name + ".migrated"))
+                imported[name] = len(records) if isinstance(records, list) else 1
+        return imported
@@ -1,45 +1,331 @@
 from __future__ import annotations
 
-import json
+import logging
+import os
+import tempfile
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterable, Iterator
 
+from . import metrics, normalization, serialization
+from .cache import MISSING, FileCache, file_stamp
 from .config import AppConfig
+from .locking import FileLock, StorageConflict, lock_for
+from .query import DATE_FIELD, IndexKey, RangeQuery, build_index
+from .segment_log import SegmentLog
+
+logger = logging.getLogger(__name__)
+
+# (event, dataset name, payload, version after the write). ``event`` is
+# "append" (payload = new records), "write" (payload = full document) or
+# "bulk" (payload = number of records appended by a bulk import) or "trim"
+# (payload = number of old records removed by the retention job); listeners
+# treat the last two like a missed write.
+Listener = Callable[[str, str, Any, int], None]
+
+# Lock-free reads of a segment log that keeps changing while it is read.
+LOG_READ_ATTEMPTS = 3
+
+
+def atomic_write_bytes(path: Path, raw: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(raw)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
 
 
 class JSONStorage:
-    def __init__(self, config: AppConfig) -> None:
+    # High-frequency sensor readings are too large and too frequent to be
+    # rewritten as one JSON document, so they always live in a segment log.
+    LOG_DATASETS: tuple[str, ...] = ("readings.json",)
+
+    def __init__(self, config: AppConfig, cache: FileCache | None = None) -> None:
         self.config = config
+        self.cache = cache if cache is not None else FileCache(config.cache_max_bytes)
+        self.listeners: list[Listener] = []
         self.config.data_dir.mkdir(parents=True, exist_ok=True)
+        self.logs: dict[str, SegmentLog] = {}
+        for name in self.LOG_DATASETS:
+            with self.lock(name):
+                log = SegmentLog(
+                    self._path(name).with_suffix(".segments"),
+                    max_segment_bytes=config.segment_max_bytes,
+                    compact_after=config.compact_after_segments,
+                )
+                log.migrate_from(self._path(name))
+            self.logs[name] = log
 
     def _path(self, name: str) -> Path:
         return self.config.data_dir / name
 
+    def _lock(self, name: str) -> FileLock:
+        return lock_for(self.config.data_dir / ".locks" / f"{name}.lock")
+
+    @contextmanager
+    def lock(self, *names: str) -> Iterator[None]:
+        # Always acquire in the same order so that multi-file updates cannot deadlock.
+        with ExitStack() as stack:
+            for name in sorted(set(names)):
+                stack.enter_context(self._lock(name))
+            yield
+
+    def version(self, name: str) -> int:
+        return self._lock(name).version()
+
+    # Values returned by ``read`` are shared with the cache: callers must copy
+    # before mutating them.
     def read(self, name: str, default: Any) -> Any:
+        return self.read_versioned(name, default)[0]
+
+    @metrics.timed_storage("read")
+    def read_versioned(self, name: str, default: Any) -> tuple[Any, int]:
+        if name in self.logs:
+            return self._read_log(name)
+        data, stamp = self._load(name, default)
+        return data, stamp[0]
+
+    def _read_log(self, name: str) -> tuple[list[Any], int]:
+        log = self.logs[name]
+        version = self.version(name)
+        stamp = (version, log.stamp())
+        cached = self.cache.get(log.directory, stamp)
+        if cached is not MISSING:
+            return cached, version
+        raw, stamp, stable = self._read_log_raw(name, stamp)
+        metrics.record_bytes("read", name, len(raw))
+        with metrics.phase("parse"):
+            data = serialization.loads(raw)
+        if stable:
+            self.cache.put(log.directory, stamp, data, len(raw))
+        return data, stamp[0]
+
+    def _read_log_raw(self, name: str, stamp: tuple) -> tuple[bytes, tuple, bool]:
+        # Segment logs are read without the lock. If an append or a compaction
+        # changed the stamp during the read, it is read again, so cached bytes
+        # always match their stamp; a log that keeps changing is returned
+        # uncached, with the stamp taken before its last read (the version can
+        # only look older than the data).
+        log = self.logs[name]
+        for _ in range(LOG_READ_ATTEMPTS):
+            raw = log.read_raw()
+            after = (self.version(name), log.stamp())
+            if after == stamp:
+                return raw, stamp, True
+            before, stamp = stamp, after
+        return raw, before, False
+
+    def _load(self, name: str, default: Any) -> tuple[Any, tuple]:
+        # The version is read before the data, so a concurrent write can only
+        # make the returned version look older than the data, never newer.
+        version = self.version(name)
         path = self._path(name)
-        if not path.exists():
-            self.write(name, default)
-            return default
-        return json.loads(path.read_text(encoding="utf-8"))
+        stamp = file_stamp(path)
+        if stamp is None:
+            with self.lock(name):
+                if file_stamp(path) is None:
+                    version = self.write(name, default)
+                    return default, (version, file_stamp(path))
+            return self._load(name, default)
+        cached = self.cache.get(path, (version, stamp))
+        if cached is not MISSING:
+            return cached, (version, stamp)
+        raw = path.read_bytes()
+        metrics.record_bytes("read", name, len(raw))
+        with metrics.phase("parse"):
+            data = serialization.loads(raw)
+        self.cache.put(path, (version, stamp), data, len(raw))
+        return data, (version, stamp)
 
-    def write(self, name: str, payload: Any) -> None:
+    # The stored bytes of a dataset as a JSON document, for endpoints that
+    # return it unchanged: no decode/encode round-trip.
+    @metrics.timed_storage("read_raw")
+    def read_raw(self, name: str, default: Any) -> bytes:
+        if name in self.logs:
+            log = self.logs[name]
+            stamp = (self.version(name), log.stamp())
+            key = (log.directory, "raw")
+            raw = self.cache.get(key, stamp)
+            if raw is MISSING:
+                raw, stamp, stable = self._read_log_raw(name, stamp)
+                metrics.record_bytes("read", name, len(raw))
+                if stable:
+                    self.cache.put(key, stamp, raw, len(raw))
+            return raw
+        # Same ordering as _load: version first, then the file.
+        version = self.version(name)
         path = self._path(name)
-        path.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+        stamp = file_stamp(path)
+        if stamp is None:
+            self._load(name, default)
+            return self.read_raw(name, default)
+        key = (path, "raw")
+        raw = self.cache.get(key, (version, stamp))
+        if raw is MISSING:
+            raw = path.read_bytes()
+            metrics.record_bytes("read", name, len(raw))
+            self.cache.put(key, (version, stamp), raw, len(raw))
+        return raw
+
+    @metrics.timed_storage("query")
+    def query(self, name: str, query: RangeQuery) -> tuple[list[dict[str, Any]], IndexKey | None]:
+        if name in self.logs:
+            with self.lock(name):
+                return self.logs[name].query(query)
+        records, stamp = self._load(name, [])
+        index_key = (self._path(name), "index")
+        index = self.cache.get(index_key, stamp)
+        if index is MISSING:
+            index = build_index(records)
+            self.cache.put(index_key, stamp, index, 64 * len(index))
+        low, stop, next_key = query.page(index)
+        return [records[position] for _, position in index[low:stop]], next_key
+
+    def subscribe(self, listener: Listener) -> None:
+        self.listeners.append(listener)
+
+    def _emit(self, event: str, name: str, payload: Any, version: int) -> None:
+        for listener in list(self.listeners):
+            try:
+                listener(event, name, payload, version)
+            except Exception:
+                logger.exception("Error en listener de almacenamiento para %s", name)
+
+    # Listeners run while the dataset lock is still held, so they observe
+    # writes in the same order they hit the disk.
+    @metrics.timed_storage("write")
+    def write(self, name: str, payload: Any, expected_version: int | None = None) -> int:
+        with self._lock(name):
+            version = self._write(name, payload, expected_version)
+            self._emit("write", name, payload, version)
+        return version
+
+    @metrics.timed_storage("append")
+    def append(self, name: str, records: list[dict[str, Any]]) -> int:
+        with self._lock(name):
+            version = self._append(name, records)
+            self._emit("append", name, records, version)
+        return version
+
+    @metrics.timed_storage("bulk_append")
+    def bulk_append(self, name: str, chunks: Iterable[list[dict[str, Any]]]) -> tuple[int, int]:
+        with self._lock(name):
+            count, version = self._bulk_append(name, chunks)
+            self._emit("bulk", name, count, version)
+        return count, version
+
+    @metrics.timed_storage("delete_before")
+    def delete_before(self, name: str, cutoff: str) -> tuple[int, int]:
+        """Removes the records dated before ``cutoff``; returns how many and the version."""
+        with self._lock(name):
+            count, version = self._delete_before(name, cutoff)
+            if count:
+                self._emit("trim", name, count, version)
+        return count, version
+
+    def _write(self, name: str, payload: Any, expected_version: int | None = None) -> int:
+        lock = self._lock(name)
+        with lock:
+            if expected_version is not None and lock.version() != expected_version:
+                raise StorageConflict(name)
+            if name in self.logs:
+                log = self.logs[name]
+                log.replace(payload)
+                version = lock.bump()
+                size = log.size()
+                metrics.record_bytes("write", name, size)
+                self.cache.put(log.directory, (version, log.stamp()), payload, size)
+                return version
+            path = self._path(name)
+            raw = serialization.dumps_array(payload, indent=not self.config.compact_json)
+            atomic_write_bytes(path, raw)
+            metrics.record_bytes("write", name, len(raw))
+            version = lock.bump()
+            self.cache.put(path, (version, file_stamp(path)), payload, len(raw))
+        return version
+
+    def _append(self, name: str, records: list[dict[str, Any]]) -> int:
+        if name not in self.logs:
+            return self._write(name, [*self.read(name, []), *records])
+        log = self.logs[name]
+        lock = self._lock(name)
+        with lock:
+            cached = self.cache.get(log.directory, (lock.version(), log.stamp()))
+            metrics.record_bytes("write", name, log.append(records))
+            version = lock.bump()
+            if cached is not MISSING:
+                # Extend the cached history instead of re-reading every segment.
+                self.cache.put(log.directory, (version, log.stamp()), [*cached, *records], log.size())
+        return version
+
+    # Appends many chunks as one write (one version bump, one event). Log
+    # datasets consume the chunks one at a time; a JSON file is rewritten once.
+    def _bulk_append(self, name: str, chunks: Iterable[list[dict[str, Any]]]) -> tuple[int, int]:
+        if name not in self.logs:
+            records = list(self.read(name, []))
+            before = len(records)
+            for chunk in chunks:
+                records.extend(chunk)
+            return len(records) - before, self._write(name, records)
+        log = self.logs[name]
+        lock = self._lock(name)
+        with lock:
+            count = 0
+            for chunk in chunks:
+                metrics.record_bytes("write", name, log.append(chunk))
+                count += len(chunk)
+            return count, lock.bump()
+
+    # A segment log drops or rewrites only the segments holding old records;
+    # a JSON document is rewritten, as on any other write.
+    def _delete_before(self, name: str, cutoff: str) -> tuple[int, int]:
+        lock = self._lock(name)
+        with lock:
+            if name in self.logs:
+                count = self.logs[name].delete_before(cutoff)
+                return count, lock.bump() if count else lock.version()
+            records = self.read(name, [])
+            kept = [record for record in records if str(record.get(DATE_FIELD, "")) >= cutoff]
+            if len(kept) == len(records):
+                return 0, lock.version()
+            return len(records) - len(kept), self._write(name, kept)
 
     def append_operational(self, entry: dict[str, Any]) -> list[dict[str, Any]]:
-        data = self.read("operational.json", [])
-        data.append(entry)
-        self.write("operational.json", data)
-        return data
+        # Normalized values are stored with the entry, so reads never recompute them.
+        with self.lock("operational.json", normalization.NORMALIZATION):
+            reference = normalization.reference(self, [entry])
+            records = list(normalization.annotate([entry], reference))
+            self.append("operational.json", records)
+        return records
 
-    def update_chemicals(self, chemicals: list[dict[str, Any]]) -> None:
-        self.write("chemicals.json", chemicals)
+    def update_chemicals(self, chemicals: list[dict[str, Any]], expected_version: int | None = None) -> None:
+        self.write("chemicals.json", chemicals, expected_version=expected_version)
 
     def append_consumption(self, items: list[dict[str, Any]]) -> list[dict[str, Any]]:
-        data = self.read("consumption.json", [])
         timestamp = datetime.utcnow().isoformat()
-        for item in items:
-            data.append({"timestamp": timestamp, **item})
-        self.write("consumption.json", data)
-        return data
+        records = [{"timestamp": timestamp, **item} for item in items]
+        self.append("consumption.json", records)
+        return records
+
+
+class SegmentedStorage(JSONStorage):
+    """Keeps every append-only dataset in segment logs; documents stay JSON."""
+
+    LOG_DATASETS = ("operational.json", "consumption.json", "readings.json")
+
+
+def create_storage(config: AppConfig, cache: FileCache | None = None) -> JSONStorage:
+    if config.storage_engine == "segments":
+        return SegmentedStorage(config, cache)
+    if config.storage_engine == "sqlite":
+        from .sqlite_storage import SQLiteStorage
+
+        return SQLiteStorage(config, cache)
+    return JSONStorage(config, cache)
@@ -0,0 +1,142 @@
+"""Measure sustained sensor ingestion through /api/readings.
+
+Starts uvicorn on a temporary data directory, has one client per skid post
+batches of readings (NDJSON or the packed binary format) as fast as the
+server accepts them, honouring 429 + Retry-After, and checks after shutdown
+that every accepted reading reached storage:
+
+    cd backend
+    python -m benchmarks.bench_ingest --skids 4 --readings 200000 --batch 500 --format binary
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from benchmarks.stress_consume import BACKEND_DIR, _free_port, _wait_ready
+
+BINARY_RECORD = struct.Struct("<d6f")
+START = datetime(2024, 10, 1, tzinfo=timezone.utc)
+
+
+def _batch(skid: str, first: int, size: int, fmt: str) -> tuple[bytes, str]:
+    if fmt == "binary":
+        body = b"".join(
+            BINARY_RECORD.pack(START.timestamp() + index, 20.0 + index % 7, 5.0, 3.0, 10.0, 4.0, 1.0)
+            for index in range(first, first + size)
+        )
+        return body, "application/octet-stream"
+    lines = (
+        json.dumps(
+            {
+                "fecha": (START + timedelta(seconds=index)).isoformat(),
+                "skid": skid,
+                "presiones": {"entrada": 20.0 + index % 7, "salida": 5.0, "rechazo": 3.0},
+                "caudales_gpm": {"permeado": 10.0, "rechazo": 4.0, "recirculacion": 1.0},
+            }
+        )
+        for index in range(first, first + size)
+    )
+    return "\n".join(lines).encode("utf-8"), "application/x-ndjson"
+
+
+def _post(url: str, body: bytes, content_type: str) -> tuple[int, float]:
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": content_type})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            return response.status, 0.0
+    except urllib.error.HTTPError as error:
+        error.read()
+        return error.code, float(error.headers.get("Retry-After", "1"))
+
+
+def _stored_readings(data_dir: Path) -> int:
+    database = data_dir / "ptap.sqlite3"
+    if database.exists():
+        with sqlite3.connect(database) as connection:
+            return connection.execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+    total = 0
+    for path in (data_dir / "readings.segments").glob("*.jsonl"):
+        with path.open("rb") as handle:
+            total += sum(1 for _ in handle)
+    return total
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--skids", type=int, default=4)
+    parser.add_argument("--readings", type=int, default=200000, help="total de lecturas a enviar")
+    parser.add_argument("--batch", type=int, default=500, help="lecturas por petición")
+    parser.add_argument("--format", choices=["ndjson", "binary"], default="binary")
+    parser.add_argument("--engine", choices=["json", "segments", "sqlite"], default="json")
+    args = parser.parse_args()
+
+    data_dir = Path(tempfile.mkdtemp(prefix="ptap-ingest-"))
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "DATA_DIR": str(data_dir), "STORAGE_ENGINE": args.engine}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    try:
+        _wait_ready(base_url)
+        per_skid = args.readings // args.skids
+
+        def feed(skid_index: int) -> tuple[int, int]:
+            skid = f"skid-{skid_index + 1}"
+            url = f"{base_url}/api/readings?skid={skid}"
+            sent = rejected = 0
+            while sent < per_skid:
+                size = min(args.batch, per_skid - sent)
+                body, content_type = _batch(skid, sent, size, args.format)
+                status, retry_after = _post(url, body, content_type)
+                if status == 429:
+                    rejected += 1
+                    time.sleep(retry_after)
+                    continue
+                if status != 202:
+                    raise RuntimeError(f"Respuesta inesperada {status}")
+                sent += size
+            return sent, rejected
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.skids) as pool:
+            results = list(pool.map(feed, range(args.skids)))
+        elapsed = time.perf_counter() - started
+    finally:
+        # Graceful shutdown flushes whatever is still buffered.
+        server.terminate()
+        server.wait(timeout=60)
+
+    try:
+        accepted = sum(sent for sent, _ in results)
+        rejected = sum(count for _, count in results)
+        stored = _stored_readings(data_dir)
+        print(f"{accepted} lecturas de {args.skids} skids en {elapsed:.2f}s: {accepted / elapsed:.0f} lecturas/s "
+              f"({accepted / elapsed / args.skids:.0f} por skid, formato {args.format}, lotes de {args.batch})")
+        print(f"peticiones rechazadas por contrapresión (429): {rejected}")
+        print(f"lecturas en disco: {stored} (esperadas {accepted})")
+        print("OK: sin pérdidas" if stored == accepted else "ERROR: faltan lecturas")
+        return 0 if stored == accepted else 1
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Compare request latency on a large operational.json per serializer.
+
+Writes a synthetic operational.json (indented and compact) to a temporary
+data directory and times, in-process, the list endpoints with every
+available serializer, against the previous pipeline (decoded records
+returned through FastAPI's default serialization):
+
+    cd backend
+    python -m benchmarks.bench_serialization --records 100000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+
+def _records(count: int) -> list[dict]:
+    start = date(2015, 1, 1)
+    return [
+        {
+            "fecha": (start + timedelta(days=index // 24)).isoformat(),
+            "presiones": {"entrada": 20.0 + index % 13 * 0.5, "salida": 5.0 + index % 7 * 0.25, "rechazo": 3.0},
+            "caudales_gpm": {"permeado": 10.0 + index % 5, "rechazo": 4.0, "recirculacion": 1.0},
+        }
+        for index in range(count)
+    ]
+
+
+def _time(client, url: str, repeat: int, before=None) -> float:
+    samples = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        response = client.get(url)
+        samples.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.text
+    return statistics.median(samples) * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data_dir = Path(tempfile.mkdtemp(prefix="ptap-serial-"))
+    os.environ["DATA_DIR"] = str(data_dir)
+    os.environ["STORAGE_ENGINE"] = "json"
+
+    from fastapi.testclient import TestClient
+
+    from app import main as api
+    from app import serialization
+
+    @api.app.get("/bench/legacy")
+    async def legacy() -> list[dict]:
+        _, storage = api.get_storage()
+        return storage.read("operational.json", [])
+
+    records = _records(args.records)
+    path = data_dir / "operational.json"
+    urls = {
+        "completo": "/api/operational",
+        "página 10k": "/api/operational?from=2020-01-01&limit=10000",
+        "proyección": "/api/operational?fields=fecha,presiones.entrada",
+    }
+
+    def clear_cache() -> None:
+        api.open_partition(()).cache.clear()
+
+    print(f"{args.records} registros, mediana de {args.repeat} peticiones (ms); frío = sin caché")
+    print(f"{'serializador':<12} {'archivo':<10} {'endpoint':<16} {'frío':>9} {'caliente':>9} {'MB':>6}")
+    try:
+        with TestClient(api.app) as client:
+            for serializer in serialization.SERIALIZERS:
+                serialization.use(serializer)
+                for compact in (False, True):
+                    path.write_bytes(serialization.dumps(records, indent=not compact))
+                    layout = "compacto" if compact else "indentado"
+                    size = path.stat().st_size / 1e6
+                    rows = {"legacy": "/bench/legacy", **urls}
+                    for label, url in rows.items():
+                        cold = _time(client, url, args.repeat, clear_cache)
+                        warm = _time(client, url, args.repeat)
+                        print(f"{serializer:<12} {layout:<10} {label:<16} {cold:>9.1f} {warm:>9.1f} {size:>6.1f}")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
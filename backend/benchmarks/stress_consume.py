@@ -0,0 +1,118 @@
+"""Hammer /api/chemicals/consume from many clients and check stock totals.
+
+Starts uvicorn with several workers on a temporary data directory, fires
+concurrent consumption requests and verifies that no update was lost:
+
+    cd backend
+    python -m benchmarks.stress_consume --workers 4 --requests 400 --concurrency 32
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+CHEMICALS = [
+    {"nombre": "Antiescalante", "stock_inicial": 100000.0, "stock": 100000.0, "unidad": "L"},
+    {"nombre": "Hipoclorito", "stock_inicial": 100000.0, "stock": 100000.0, "unidad": "L"},
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _request(url: str, payload: dict | None = None) -> tuple[int, object]:
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, error.read().decode("utf-8")
+
+
+def _wait_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if _request(f"{base_url}/api/health")[0] == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("El backend no respondió a tiempo")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--engine", choices=["json", "segments", "sqlite"], default="json")
+    args = parser.parse_args()
+
+    data_dir = Path(tempfile.mkdtemp(prefix="ptap-stress-"))
+    (data_dir / "chemicals.json").write_text(json.dumps(CHEMICALS), encoding="utf-8")
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "DATA_DIR": str(data_dir), "STORAGE_ENGINE": args.engine}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    try:
+        _wait_ready(base_url)
+
+        def consume(index: int) -> int:
+            payload = {
+                "fecha": "2024-10-01",
+                "items": [
+                    {"nombre": "Antiescalante", "consumo_diario": 1.0},
+                    {"nombre": "Hipoclorito", "consumo_diario": 0.5},
+                ],
+            }
+            return _request(f"{base_url}/api/chemicals/consume", payload)[0]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            statuses = list(pool.map(consume, range(args.requests)))
+        elapsed = time.perf_counter() - started
+
+        ok = statuses.count(200)
+        _, chemicals = _request(f"{base_url}/api/chemicals")
+        _, consumption = _request(f"{base_url}/api/chemicals/consumption")
+        stock = {item["nombre"]: item["stock"] for item in chemicals}
+        expected = {"Antiescalante": 100000.0 - ok * 1.0, "Hipoclorito": 100000.0 - ok * 0.5}
+
+        print(f"{args.requests} peticiones, {ok} OK, {len(statuses) - ok} rechazadas en {elapsed:.2f}s "
+              f"({args.requests / elapsed:.0f} req/s, {args.workers} workers, motor {args.engine})")
+        print(f"stock final:    {stock}")
+        print(f"stock esperado: {expected}")
+        print(f"filas de consumo: {len(consumption)} (esperadas {ok * 2})")
+        exact = stock == expected and len(consumption) == ok * 2
+        print("OK: totales exactos" if exact else "ERROR: se perdieron actualizaciones")
+        return 0 if exact else 1
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
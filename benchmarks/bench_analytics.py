@@ -0,0 +1,95 @@
+"""Compare analytics.py against the previous per-call implementations.
+
+    python -m benchmarks.bench_analytics --years 5
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+
+
+def legacy_analyze_dp_trend(df, window=5):
+    if len(df) < window:
+        return False, 0
+    df['DP'] = df['P_In'] - df['P_Out']
+    recent = df.tail(window)
+    x = np.arange(len(recent))
+    y = recent['DP'].values
+    slope, _ = np.polyfit(x, y, 1)
+    return slope > 0.05, slope
+
+
+def legacy_rolling_slopes(df, window=5):
+    dp = (df['P_In'] - df['P_Out']).to_numpy()
+    x = np.arange(window)
+    return np.array([np.polyfit(x, dp[i - window:i], 1)[0] for i in range(window, len(dp) + 1)])
+
+
+def legacy_check_stock_alerts(inventory_df):
+    alerts = []
+    for _, row in inventory_df.iterrows():
+        if row['Stock'] < 20:
+            alerts.append(f"Stock Crítico: {row['Chemical']}")
+    return alerts
+
+
+def synthetic_history(hours, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(hours)
+    fouling = (t % (24 * 90)) * 0.002
+    return pd.DataFrame({
+        'Date': pd.date_range('2020-01-01', periods=hours, freq='h'),
+        'P_In': 300 + fouling + rng.normal(0, 1.5, hours),
+        'P_Out': 280 - fouling / 2 + rng.normal(0, 1.5, hours),
+        'P_Perm': 10 + rng.normal(0, 0.3, hours),
+        'F_Perm': 1200 - fouling * 2 + rng.normal(0, 10, hours),
+        'F_Rej': 400 + rng.normal(0, 5, hours),
+    })
+
+
+def best_of(func, repeat=5):
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--years', type=float, default=5)
+    parser.add_argument('--window', type=int, default=5)
+    args = parser.parse_args()
+
+    df = synthetic_history(int(args.years * 365 * 24))
+    inventory = pd.DataFrame({
+        'Chemical': [f'Q{i}' for i in range(500)],
+        'Stock': np.random.default_rng(1).uniform(0, 100, 500),
+    })
+    print(f"{len(df)} lecturas horarias, ventana {args.window}")
+
+    expected = legacy_rolling_slopes(df.copy(), args.window)
+    got = analytics.rolling_slope((df['P_In'] - df['P_Out']).to_numpy(), args.window)[args.window - 1:]
+    assert np.allclose(expected, got, atol=1e-9), "las pendientes no coinciden"
+    assert legacy_check_stock_alerts(inventory) == [
+        f"Stock Crítico: {c}" for c in inventory.loc[analytics.stock_alert_mask(inventory), 'Chemical']
+    ]
+
+    rows = [
+        ("pendiente última ventana (polyfit)", best_of(lambda: legacy_analyze_dp_trend(df.copy(), args.window))),
+        ("pendiente última ventana (analytics)", best_of(lambda: analytics.analyze_dp_trend(df, args.window))),
+        ("pendientes de todas las ventanas (polyfit)", best_of(lambda: legacy_rolling_slopes(df, args.window), 1)),
+        ("pendientes de todas las ventanas (analytics)", best_of(lambda: analytics.dp_trend(df, args.window))),
+        ("indicadores NPF/recuperación/paso de sales", best_of(lambda: analytics.performance_indicators(df))),
+        ("alertas de stock (iterrows)", best_of(lambda: legacy_check_stock_alerts(inventory))),
+        ("alertas de stock (vectorizado)", best_of(lambda: analytics.stock_alert_mask(inventory))),
+    ]
+    for label, ms in rows:
+        print(f"{label:<48} {ms:10.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
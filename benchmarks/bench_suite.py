@@ -0,0 +1,234 @@
+"""Benchmark suite: API latency, storage and analytics against history size.
+
+Generates synthetic history with generate_mock_data, measures each group
+and writes a JSON report that later runs can be compared against:
+
+    python -m benchmarks.bench_suite --sizes 1000,10000,100000 --report bench_report.json
+    python -m benchmarks.bench_suite --compare bench_report.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# backend/app is a namespace package, which the Streamlit app.py would shadow:
+# import it before the project root is on the path.
+sys.path = [os.path.join(ROOT, 'backend')] + [p for p in sys.path if os.path.abspath(p or os.curdir) != ROOT]
+import app  # noqa: E402,F401
+sys.path.insert(1, ROOT)
+
+import analytics  # noqa: E402
+import logic  # noqa: E402
+import rollups  # noqa: E402
+from generate_mock_data import INVENTORY, api_records, generate_history  # noqa: E402
+from storage import ROStorage  # noqa: E402
+
+API_ENDPOINTS = [
+    "/api/operational",
+    "/api/operational?from={mid}&limit=1000",
+    "/api/operational?max_points=500",
+    "/api/operational?fields=fecha,presiones.entrada",
+    "/api/chemicals",
+    "/api/chemicals/consumption",
+    "/api/chemicals/forecast",
+    "/api/alerts",
+    "/api/rollups?period=month",
+    "/api/snapshot?max_points=500",
+    "/api/export/operational?format=ndjson",
+]
+
+
+def timings(func, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def summary(group, name, size, samples):
+    values = np.asarray(samples)
+    return {
+        "grupo": group,
+        "nombre": name,
+        "registros": size,
+        "muestras": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p90_ms": round(float(np.percentile(values, 90)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "media_ms": round(float(values.mean()), 3),
+    }
+
+
+def bench_analytics(df, repeat):
+    inventory = pd.DataFrame(INVENTORY)
+    cases = {
+        "analyze_dp_trend": lambda: logic.analyze_dp_trend(df),
+        "dp_trend": lambda: analytics.dp_trend(df),
+        "performance_indicators": lambda: analytics.performance_indicators(df),
+        "build_rollups": lambda: rollups.build_rollups(df),
+        "check_stock_alerts": lambda: logic.check_stock_alerts(inventory),
+    }
+    return [summary("analytics", name, len(df), timings(func, repeat)) for name, func in cases.items()]
+
+
+def bench_streamlit_storage(df, repeat, workdir):
+    results = []
+    row = df.iloc[-1].to_dict()
+    for backend in ROStorage.BACKENDS:
+        path = os.path.join(workdir, f"st-{backend}-{len(df)}")
+        storage = ROStorage(path, backend)
+        storage.operational.write(df)
+        storage.get_rollups()
+        results.append(summary("ROStorage", f"{backend} lectura", len(df),
+                               timings(storage.get_operational_data, repeat)))
+        results.append(summary("ROStorage", f"{backend} append", len(df),
+                               timings(lambda: storage.save_operational_entry(row), repeat)))
+        shutil.rmtree(path, ignore_errors=True)
+    return results
+
+
+def bench_api_storage(records, repeat, workdir):
+    from app.cache import FileCache
+    from app.config import STORAGE_ENGINES, AppConfig
+    from app.query import RangeQuery
+    from app.storage import create_storage
+
+    results = []
+    mid = records[len(records) // 2]["fecha"]
+    for engine in STORAGE_ENGINES:
+        cache = FileCache(256 * 1024 * 1024)
+        config = AppConfig(data_dir=Path(workdir) / f"api-{engine}-{len(records)}", storage_engine=engine)
+        storage = create_storage(config, cache)
+        storage.bulk_append("operational.json", [records])
+        page = RangeQuery(start=mid, limit=1000)
+        cases = [
+            ("lectura en frío", lambda: storage.read("operational.json", []), cache.clear),
+            ("lectura en caché", lambda: storage.read("operational.json", []), None),
+            ("página de 1000", lambda: storage.query("operational.json", page), None),
+            ("append", lambda: storage.append("operational.json", [records[-1]]), None),
+        ]
+        for name, func, setup in cases:
+            results.append(summary("storage", f"{engine} {name}", len(records), timings(func, repeat, setup)))
+        shutil.rmtree(config.data_dir, ignore_errors=True)
+    return results
+
+
+def bench_api(records, requests, workdir, engine):
+    data_dir = Path(workdir) / f"api-endpoints-{len(records)}"
+    data_dir.mkdir()
+    (data_dir / "operational.json").write_text(json.dumps(records), encoding="utf-8")
+    os.environ["DATA_DIR"] = str(data_dir)
+    os.environ["STORAGE_ENGINE"] = engine
+
+    from fastapi.testclient import TestClient
+
+    from app import main as api
+
+    mid = records[len(records) // 2]["fecha"][:10]
+    results = []
+    with TestClient(api.app) as client:
+        for template in API_ENDPOINTS:
+            url = template.format(mid=mid)
+
+            def get():
+                response = client.get(url)
+                assert response.status_code == 200, f"{url}: {response.status_code}"
+
+            get()  # warm-up: first request builds caches and derived state
+            results.append(summary("api", url.replace(mid, "{mid}"), len(records), timings(get, requests)))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous):
+    before = {(r["grupo"], r["nombre"], r["registros"]): r for r in previous["resultados"]}
+    print(f"\nComparación con {previous.get('commit')} ({previous.get('generado')}), p50:")
+    for result in current["resultados"]:
+        old = before.get((result["grupo"], result["nombre"], result["registros"]))
+        if old is None or not old["p50_ms"]:
+            continue
+        ratio = result["p50_ms"] / old["p50_ms"]
+        flag = "  <-- más lento" if ratio > 1.2 else ""
+        print(f"{result['grupo']:<10} {result['nombre']:<52} {result['registros']:>8} "
+              f"{old['p50_ms']:>10.2f} -> {result['p50_ms']:>10.2f} ms  x{ratio:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000', help="registros de historial, separados por comas")
+    parser.add_argument('--repeat', type=int, default=10, help="repeticiones de storage y analítica")
+    parser.add_argument('--requests', type=int, default=50, help="peticiones por endpoint")
+    parser.add_argument('--engine', default='json', help="motor del backend para los endpoints")
+    parser.add_argument('--groups', default='analytics,ROStorage,storage,api')
+    parser.add_argument('--report', default='bench_report.json')
+    parser.add_argument('--compare', help="informe anterior con el que comparar")
+    args = parser.parse_args()
+
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+    groups = set(args.groups.split(','))
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix="ptap-suite-")
+    results = []
+    try:
+        for size in sizes:
+            df = generate_history('2015-01-01', size, freq='1h', seed=size)
+            records = api_records(df, daily=False)
+            if 'analytics' in groups:
+                results += bench_analytics(df, args.repeat)
+            if 'ROStorage' in groups:
+                results += bench_streamlit_storage(df, args.repeat, workdir)
+            if 'storage' in groups:
+                results += bench_api_storage(records, args.repeat, workdir)
+            print(f"{size} registros: listo", file=sys.stderr)
+        if 'api' in groups:
+            # The app keeps its storage per process, so endpoints run once, at the largest size.
+            results += bench_api(records, args.requests, workdir, args.engine)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "generado": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": vars(args),
+        "resultados": results,
+    }
+    for result in results:
+        print(f"{result['grupo']:<10} {result['nombre']:<52} {result['registros']:>8} "
+              f"p50 {result['p50_ms']:>9.2f}  p90 {result['p90_ms']:>9.2f}  p99 {result['p99_ms']:>9.2f} ms")
+    if previous is not None:
+        compare(report, previous)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nInforme: {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import os
+
+import streamlit as st
+
+import analytics
+from dashboard import create_gauge, create_line_chart
+from storage import ROStorage
+
+# Every cached call takes the version of the files it depends on
+# (mtime/size, see ROStorage.*_version) as an argument, so a write through
+# save_operational_entry / update_inventory changes the key and the next
+# rerun recomputes; otherwise page switches and widget changes are served
+# from memory. Frames and figures are shared between sessions via
+# cache_resource and must be treated as read-only.
+
+DASHBOARD_COLUMNS = ('Date', 'P_In', 'P_Out', 'F_Perm', 'F_Rej')
+
+
+def _config_version(base_path):
+    config_path = os.path.join(base_path, 'config.json')
+    if not os.path.exists(config_path):
+        return None
+    stat = os.stat(config_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+@st.cache_resource(max_entries=4)
+def _get_storage(base_path, config_version):
+    return ROStorage(base_path)
+
+
+def get_storage(base_path):
+    return _get_storage(base_path, _config_version(base_path))
+
+
+@st.cache_resource(max_entries=8)
+def load_operational(base_path, version, columns=None):
+    return get_storage(base_path).get_operational_data(list(columns) if columns else None)
+
+
+@st.cache_data(max_entries=8)
+def load_inventory(base_path, version):
+    return get_storage(base_path).get_inventory()
+
+
+@st.cache_data(max_entries=8)
+def load_rollups(base_path, version, period):
+    return get_storage(base_path).get_rollups(period)
+
+
+@st.cache_data(max_entries=8)
+def dp_trend(base_path, version, window=5):
+    return analytics.analyze_dp_trend(load_operational(base_path, version, DASHBOARD_COLUMNS), window)
+
+
+@st.cache_resource(max_entries=8)
+def dashboard_figures(base_path, version, theme):
+    df = load_operational(base_path, version, DASHBOARD_COLUMNS)
+    last_entry = df.iloc[-1]
+    gauges = [
+        create_gauge(last_entry['P_In'], "P. Entrada", "psi", 0, 400),
+        create_gauge(last_entry['P_Out'], "P. Salida", "psi", 0, 400),
+        create_gauge(last_entry['F_Perm'], "C. Permeado", "LPH", 0, 2000),
+        create_gauge(last_entry['F_Rej'], "C. Rechazo", "LPH", 0, 2000),
+    ]
+    trend = df[['Date', 'P_In', 'P_Out']].assign(DP=analytics.dp_series(df))
+    line_chart = create_line_chart(trend, ['P_In', 'P_Out', 'DP'], "Tendencia de Presiones")
+    return gauges, line_chart
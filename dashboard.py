@@ -1,6 +1,10 @@
 import plotly.graph_objects as go
 import streamlit as st
 
+from analytics import downsample
+
+MAX_CHART_POINTS = 2000
+
 def create_gauge(value, title, unit, min_val=0, max_val=10, thresholds=None):
     fig = go.Figure(go.Indicator(
         mode = "gauge+number",
@@ -20,10 +24,17 @@ def create_gauge(value, title, unit, min_val=0, max_val=10, thresholds=None):
     fig.update_layout(height=250, margin=dict(l=20, r=20, t=50, b=20))
     return fig
 
-def create_line_chart(df, y_columns, title):
+def create_line_chart(df, y_columns, title, max_points=MAX_CHART_POINTS):
+    # Long histories are reduced per series with LTTB, so drawing cost does
+    # not grow with the number of readings
+    downsampled = len(df) > max_points
     fig = go.Figure()
     for col in y_columns:
-        fig.add_trace(go.Scatter(x=df['Date'], y=df[col], name=col, mode='lines+markers'))
+        series = downsample(df, 'Date', col, max_points)
+        fig.add_trace(go.Scatter(
+            x=series['Date'], y=series[col], name=col,
+            mode='lines' if downsampled else 'lines+markers'
+        ))
     
     fig.update_layout(
         title=title,
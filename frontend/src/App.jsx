@@ -18,6 +18,12 @@ const initialOperational = {
 
 const roles = ["Operador", "Supervisor"];
 
+// The backend reduces long histories to this many points per chart series.
+const MAX_CHART_POINTS = 1000;
+// Live entries are appended raw to the downsampled snapshot; after this many
+// the snapshot is reloaded so the charts go back to the reduced series.
+const RELOAD_AFTER_DELTAS = 200;
+
 const apiFetch = async (url, options = {}) => {
   const response = await fetch(url, {
     headers: { "Content-Type": "application/json" },
@@ -32,6 +38,15 @@ const apiFetch = async (url, options = {}) => {
 
 const formatDate = (value) => value?.slice(5) ?? "";
 
+// Appends pushed entries, skipping those the last snapshot already holds
+// (a reload can land before the event of the same write), and keeps at
+// most MAX_CHART_POINTS.
+const appendLive = (prev, entries) => {
+  const recent = new Set(prev.slice(-entries.length).map((item) => JSON.stringify(item)));
+  const added = entries.filter((item) => !recent.has(JSON.stringify(item)));
+  return [...prev, ...added].slice(-MAX_CHART_POINTS);
+};
+
 const AlertBadge = ({ label, tone = "danger" }) => (
   <div className={`alert alert-${tone}`}>{label}</div>
 );
@@ -42,7 +57,7 @@ export default function App() {
   const [chemicals, setChemicals] = useState([]);
   const [consumption, setConsumption] = useState([]);
   const [alerts, setAlerts] = useState({ stock: [], delta_p: [] });
-  const [config, setConfig] = useState({ data_dir: "", dp_threshold: 15 });
+  const [config, setConfig] = useState({ data_dir: "", dp_threshold: 15, dp_norm_threshold: 15 });
   const [opForm, setOpForm] = useState(initialOperational);
   const [consumptionForm, setConsumptionForm] = useState({
     fecha: new Date().toISOString().slice(0, 10),
@@ -51,19 +66,16 @@ export default function App() {
   const [statusMessage, setStatusMessage] = useState("");
   const [errorMessage, setErrorMessage] = useState("");
 
+  // One request for the whole dashboard. The browser revalidates it with
+  // If-None-Match, so an unchanged snapshot comes back as a bodiless 304.
   const refreshAll = async () => {
-    const [opData, chemData, consData, alertData, configData] = await Promise.all([
-      apiFetch("/api/operational"),
-      apiFetch("/api/chemicals"),
-      apiFetch("/api/chemicals/consumption"),
-      apiFetch("/api/alerts"),
-      apiFetch("/api/config")
-    ]);
-    setOperational(opData);
+    const snapshot = await apiFetch(`/api/snapshot?max_points=${MAX_CHART_POINTS}`);
+    const chemData = snapshot.chemicals;
+    setOperational(snapshot.operational);
     setChemicals(chemData);
-    setConsumption(consData);
-    setAlerts(alertData);
-    setConfig(configData);
+    setConsumption(snapshot.consumption);
+    setAlerts(snapshot.alerts);
+    setConfig(snapshot.config);
 
     setConsumptionForm((prev) => ({
       ...prev,
@@ -71,8 +83,42 @@ export default function App() {
     }));
   };
 
+  // Live updates: the backend pushes only what changed. The full reload runs
+  // once the stream is open (and again on reconnects, "resync" or every
+  // RELOAD_AFTER_DELTAS entries), so no write made in between is missed.
   useEffect(() => {
-    refreshAll().catch((err) => setErrorMessage(err.message));
+    let deltas = 0;
+    const reload = () => {
+      deltas = 0;
+      refreshAll().catch((err) => setErrorMessage(err.message));
+    };
+    const pushed = (count) => {
+      deltas += count;
+      if (deltas >= RELOAD_AFTER_DELTAS) {
+        reload();
+      }
+    };
+    const events = new EventSource("/api/events?topics=operational,consumption,chemicals,alerts");
+    const listen = (name, handler) =>
+      events.addEventListener(name, (event) => handler(JSON.parse(event.data)));
+
+    events.onopen = reload;
+    listen("operational", (entries) => {
+      setOperational((prev) => appendLive(prev, entries));
+      pushed(entries.length);
+    });
+    listen("consumption", (items) => {
+      setConsumption((prev) => appendLive(prev, items));
+      pushed(items.length);
+    });
+    listen("chemicals", (changed) =>
+      setChemicals((prev) =>
+        prev.map((item) => changed.find((update) => update.nombre === item.nombre) || item)
+      )
+    );
+    listen("alerts", setAlerts);
+    listen("resync", reload);
+    return () => events.close();
   }, []);
 
   useEffect(() => {
@@ -90,6 +136,7 @@ export default function App() {
       });
       setStatusMessage("Registro operativo guardado.");
       setOpForm(initialOperational);
+      // Revalidated with the snapshot ETag; also covers a dropped stream.
       await refreshAll();
     } catch (err) {
       setErrorMessage(err.message);
@@ -187,7 +234,11 @@ export default function App() {
               {alerts.delta_p.map((alert, index) => (
                 <AlertBadge
                   key={`dp-${index}`}
-                  label={`${alert.mensaje} (ΔP ${alert.delta_p})`}
+                  label={
+                    alert.delta_p_norm != null
+                      ? `${alert.mensaje} (ΔP normalizado ${alert.delta_p_norm}, ΔP ${alert.delta_p})`
+                      : `${alert.mensaje} (ΔP ${alert.delta_p})`
+                  }
                 />
               ))}
               {alerts.stock.map((alert, index) => (
@@ -222,6 +273,10 @@ export default function App() {
               <span>ΔP umbral</span>
               <strong>{config.dp_threshold} psi</strong>
             </div>
+            <div className="stat">
+              <span>ΔP normalizado umbral</span>
+              <strong>{config.dp_norm_threshold} psi</strong>
+            </div>
           </div>
         </header>
 
@@ -1,42 +1,122 @@
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
+"""Generate synthetic RO plant data.
+
+Without arguments writes a week of daily data (operational_data.csv and
+inventory.csv) in the current directory, as before. For load tests:
+
+    python generate_mock_data.py --plants 3 --skids 4 --years 5 --freq 1h --out mock --backend-dir mock/api
+"""
+import argparse
+import json
 import os
+from datetime import datetime, timedelta
 
-# Set base path
-base_path = os.getcwd()
-operational_path = os.path.join(base_path, 'operational_data.csv')
-inventory_path = os.path.join(base_path, 'inventory.csv')
-
-# Generate 7 days of data
-dates = [(datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7, 0, -1)]
-
-# Increasing P_In to trigger alert
-p_in = [300, 305, 310, 316, 322, 330, 340]
-p_out = [280, 280, 279, 278, 277, 276, 275] # DP goes from 20 to 65
-
-data = {
-    'Date': dates,
-    'P_In': p_in,
-    'P_Out': p_out,
-    'P_Perm': [10, 11, 10, 12, 11, 10, 11],
-    'P_Rej': [250, 252, 251, 253, 250, 255, 260],
-    'P_Rec': [200, 205, 202, 206, 200, 208, 210],
-    'F_Perm': [1200, 1180, 1150, 1120, 1100, 1050, 1000],
-    'F_Rej': [400, 410, 420, 430, 440, 450, 460],
-    'F_Rec': [500, 500, 500, 500, 500, 500, 500],
-    'Meter_Reading': [1000, 2000, 3000, 4000, 5000, 6000, 7000]
-}
-
-df = pd.DataFrame(data)
-df.to_csv(operational_path, index=False)
-
-# Inventory with some low stock
-inv = pd.DataFrame([
-    {"Chemical": "Antiescalante", "Stock": 15, "Daily_Cons": 2}, # Low stock (<20)
+import numpy as np
+import pandas as pd
+
+from storage import OPERATIONAL_COLUMNS
+
+INVENTORY = [
+    {"Chemical": "Antiescalante", "Stock": 15, "Daily_Cons": 2},  # Low stock (<20)
     {"Chemical": "Hipoclorito", "Stock": 80, "Daily_Cons": 5},
-    {"Chemical": "Cloruro", "Stock": 50, "Daily_Cons": 10}
-])
-inv.to_csv(inventory_path, index=False)
+    {"Chemical": "Cloruro", "Stock": 50, "Daily_Cons": 10},
+]
+
+
+def generate_history(start, periods, freq='1D', fouling_rate=1.5, irreversible_rate=0.01,
+                     cip_days=30, noise=1.0, seed=0):
+    """Operational history of one skid.
+
+    The pressure drop grows by ``fouling_rate`` per day and a CIP cleaning
+    every ``cip_days`` removes it, except for a slow irreversible part.
+    Permeate flow falls as the membranes foul; Meter_Reading integrates it.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=periods, freq=freq)
+    step_hours = pd.Timedelta(freq).total_seconds() / 3600
+    days = np.arange(periods) * step_hours / 24
+    since_cip = np.mod(days, cip_days)
+    fouling = fouling_rate * since_cip + irreversible_rate * days
+
+    def jitter(scale):
+        return rng.normal(0, noise * scale, periods)
+
+    p_in = 300 + fouling + jitter(1.5)
+    f_perm = np.clip(1200 * 60 / (60 + fouling) + jitter(10), 0, None)
+    data = {
+        'Date': dates,
+        'P_In': p_in,
+        'P_Out': 280 - 0.2 * fouling + jitter(1.5),
+        'P_Perm': 10 + jitter(0.3),
+        'P_Rej': p_in - 50 + jitter(1.0),
+        'P_Rec': 200 + jitter(2.0),
+        'F_Perm': f_perm,
+        'F_Rej': 400 + 0.5 * fouling + jitter(5),
+        'F_Rec': 500 + jitter(5),
+        'Meter_Reading': 1000 + np.cumsum(f_perm * step_hours),
+    }
+    df = pd.DataFrame(data, columns=OPERATIONAL_COLUMNS)
+    values = OPERATIONAL_COLUMNS[1:]
+    df[values] = df[values].round(2)
+    return df
+
+
+def api_records(df, daily):
+    # Same shape as the FastAPI OperationalEntry records
+    fecha = df['Date'].dt.strftime('%Y-%m-%d' if daily else '%Y-%m-%dT%H:%M:%S')
+    return [
+        {
+            "fecha": f,
+            "presiones": {"entrada": p_in, "salida": p_out, "rechazo": p_rej},
+            "caudales_gpm": {"permeado": f_perm, "rechazo": f_rej, "recirculacion": f_rec},
+        }
+        for f, p_in, p_out, p_rej, f_perm, f_rej, f_rec in zip(
+            fecha, df['P_In'], df['P_Out'], df['P_Rej'], df['F_Perm'], df['F_Rej'], df['F_Rec']
+        )
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--plants', type=int, default=1)
+    parser.add_argument('--skids', type=int, default=1, help="skids por planta")
+    parser.add_argument('--days', type=float, default=7)
+    parser.add_argument('--years', type=float, help="alternativa a --days")
+    parser.add_argument('--freq', default='1D', help="intervalo de muestreo (pandas), p. ej. 1D, 1h, 15min")
+    parser.add_argument('--fouling-rate', type=float, default=1.5, help="aumento diario de ΔP")
+    parser.add_argument('--cip-days', type=float, default=30, help="días entre limpiezas CIP")
+    parser.add_argument('--noise', type=float, default=1.0, help="escala del ruido de los sensores")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=os.getcwd(), help="carpeta de datos de la app Streamlit")
+    parser.add_argument('--backend-dir', help="además, escribe los datos en el formato del backend")
+    args = parser.parse_args()
+
+    days = args.years * 365 if args.years is not None else args.days
+    step = pd.Timedelta(args.freq)
+    periods = int(timedelta(days=days) / step)
+    daily = step == pd.Timedelta('1D')
+    start = (datetime.now() - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    single = args.plants == 1 and args.skids == 1
+
+    for plant in range(args.plants):
+        for skid in range(args.skids):
+            df = generate_history(start, periods, args.freq, args.fouling_rate, cip_days=args.cip_days,
+                                  noise=args.noise, seed=[args.seed, plant, skid])
+            # One plant with one skid keeps the original layout: files directly in --out
+            base = args.out if single else os.path.join(args.out, f"planta-{plant + 1}", f"skid-{skid + 1}")
+            os.makedirs(base, exist_ok=True)
+            df.to_csv(os.path.join(base, 'operational_data.csv'), index=False,
+                      date_format='%Y-%m-%d' if daily else '%Y-%m-%d %H:%M:%S')
+            pd.DataFrame(INVENTORY).to_csv(os.path.join(base, 'inventory.csv'), index=False)
+            if args.backend_dir:
+                target = os.path.join(args.backend_dir, 'plants', f"planta-{plant + 1}", 'skids', f"skid-{skid + 1}")
+                os.makedirs(target, exist_ok=True)
+                with open(os.path.join(target, 'operational.json'), 'w', encoding='utf-8') as f:
+                    json.dump(api_records(df, daily), f)
+
+    total = periods * args.plants * args.skids
+    print(f"Mock data generated successfully: {args.plants} planta(s) x {args.skids} skid(s), "
+          f"{periods} registros por skid ({total} en total).")
+
 
-print("Mock data generated successfully.")
+if __name__ == '__main__':
+    main()
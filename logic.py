@@ -1,26 +1,13 @@
-import pandas as pd
 import numpy as np
 
+import analytics
+
 def calculate_dp(p_in, p_out):
     return p_in - p_out
 
 def analyze_dp_trend(df, window=5):
-    if len(df) < window:
-        return False, 0
-    
-    # Calculate daily DP
-    df['DP'] = df['P_In'] - df['P_Out']
-    recent = df.tail(window)
-    
-    # Simple linear trend check
-    x = np.arange(len(recent))
-    y = recent['DP'].values
-    slope, _ = np.polyfit(x, y, 1)
-    
-    # If slope is positive and substantial
-    threshold_slope = 0.05 
-    is_increasing = slope > threshold_slope
-    return is_increasing, slope
+    # Does not add a DP column to the caller's frame; see analytics.dp_series
+    return analytics.analyze_dp_trend(df, window=window, threshold_slope=0.05)
 
 def calculate_daily_production(current_meter, last_meter):
     if last_meter is None:
@@ -28,12 +15,25 @@ def calculate_daily_production(current_meter, last_meter):
     return max(0, current_meter - last_meter)
 
 def check_stock_alerts(inventory_df, critical_pct=20):
-    alerts = []
-    # Assuming we have an 'Initial_Stock' or just comparing to a reference or max stock
-    # For now, let's assume Stock is absolute and alerts are based on a fixed low value or logic
-    # The requirement says 'If stock is < 20%'. Let's assume 100 is max for demo or add Max_Stock.
-    for index, row in inventory_df.iterrows():
-        # Using a simple check for demo: if Stock < 20
-        if row['Stock'] < 20: 
-            alerts.append(f"Stock Crítico: {row['Chemical']}")
-    return alerts
+    # Using a simple check for demo: if Stock < 20
+    critical = inventory_df.loc[analytics.stock_alert_mask(inventory_df, 20), 'Chemical']
+    return [f"Stock Crítico: {chem}" for chem in critical]
+
+def update_consumption_rate(inventory_df, consumption, alpha=0.3):
+    # Daily_Cons keeps an exponentially weighted daily consumption per chemical,
+    # updated with each saved record instead of re-reading any history
+    today = inventory_df['Chemical'].map(consumption).astype(float)
+    previous = inventory_df['Daily_Cons'].astype(float)
+    rate = np.where(previous > 0, alpha * today + (1 - alpha) * previous, today)
+    inventory_df['Daily_Cons'] = np.where(today.notna(), rate, previous)
+    return inventory_df
+
+def stock_forecast(inventory_df, lead_days=7):
+    rate = inventory_df['Daily_Cons'].to_numpy(dtype=float)
+    stock = inventory_df['Stock'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_left = np.where(rate > 0, stock / rate, np.nan)
+    forecast = inventory_df[['Chemical', 'Stock', 'Daily_Cons']].copy()
+    forecast['Days_Left'] = np.round(days_left, 1)
+    forecast['Reorder_In'] = np.round(days_left - lead_days, 1)
+    return forecast.sort_values('Days_Left', na_position='last')
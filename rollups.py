@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+from logic import calculate_daily_production
+
+PERIODS = ('day', 'week', 'month')
+ROLLUP_COLUMNS = ['P_In', 'P_Out', 'P_Perm', 'P_Rej', 'P_Rec', 'F_Perm', 'F_Rej', 'F_Rec']
+
+# rollups.json layout:
+#   {"version": <operational version it was built from>, "last_meter": float|None,
+#    "day" | "week" | "month": {period_key: {"rows": n, "production": L,
+#                                            "columns": {col: {"min", "max", "sum", "count"}}}}}
+
+
+def empty_rollups(version=None):
+    return {'version': version, 'last_meter': None, **{period: {} for period in PERIODS}}
+
+
+def period_keys(timestamp):
+    timestamp = pd.Timestamp(timestamp)
+    year, week, _ = timestamp.isocalendar()
+    return {
+        'day': timestamp.strftime('%Y-%m-%d'),
+        'week': f"{year}-W{week:02d}",
+        'month': timestamp.strftime('%Y-%m'),
+    }
+
+
+def _bucket(rollups, period, key):
+    return rollups[period].setdefault(key, {'rows': 0, 'production': 0.0, 'columns': {}})
+
+
+def add_entry(rollups, data):
+    value = data.get('Meter_Reading')
+    meter = None if value is None or pd.isna(value) else float(value)
+    production = calculate_daily_production(meter, rollups['last_meter']) if meter is not None else 0
+    if meter is not None:
+        rollups['last_meter'] = meter
+
+    for period, key in period_keys(data['Date']).items():
+        bucket = _bucket(rollups, period, key)
+        bucket['rows'] += 1
+        bucket['production'] += float(production)
+        for col in ROLLUP_COLUMNS:
+            value = data.get(col)
+            if value is None or pd.isna(value):
+                continue
+            value = float(value)
+            stats = bucket['columns'].get(col)
+            if stats is None:
+                bucket['columns'][col] = {'min': value, 'max': value, 'sum': value, 'count': 1}
+            else:
+                stats['min'] = min(stats['min'], value)
+                stats['max'] = max(stats['max'], value)
+                stats['sum'] += value
+                stats['count'] += 1
+    return rollups
+
+
+def build_rollups(df, version=None):
+    # Full rebuild, grouped with pandas instead of replaying add_entry per row.
+    rollups = empty_rollups(version)
+    if df.empty:
+        return rollups
+
+    dates = pd.to_datetime(df['Date'])
+    iso = dates.dt.isocalendar()
+    keys = {
+        'day': dates.dt.strftime('%Y-%m-%d'),
+        'week': iso['year'].astype(str) + '-W' + iso['week'].astype(str).str.zfill(2),
+        'month': dates.dt.strftime('%Y-%m'),
+    }
+    # Same rule as calculate_daily_production, applied to the whole series:
+    # the first reading and meter resets produce 0.
+    meter = df['Meter_Reading'].astype(float) if 'Meter_Reading' in df else pd.Series(np.nan, index=df.index)
+    previous = meter.ffill().shift()
+    production = (meter - previous).clip(lower=0).fillna(0)
+    columns = [col for col in ROLLUP_COLUMNS if col in df]
+    values = df[columns].astype(float)
+
+    for period, key in keys.items():
+        grouped = values.groupby(key.to_numpy())
+        stats = {name: grouped.agg(name) for name in ('min', 'max', 'sum', 'count')}
+        rows = key.value_counts()
+        produced = production.groupby(key.to_numpy()).sum()
+        for bucket_key in rows.index:
+            bucket = {'rows': int(rows[bucket_key]), 'production': float(produced[bucket_key]), 'columns': {}}
+            for col in columns:
+                count = int(stats['count'].at[bucket_key, col])
+                if count:
+                    bucket['columns'][col] = {
+                        'min': float(stats['min'].at[bucket_key, col]),
+                        'max': float(stats['max'].at[bucket_key, col]),
+                        'sum': float(stats['sum'].at[bucket_key, col]),
+                        'count': count,
+                    }
+            rollups[period][bucket_key] = bucket
+
+    last = meter.dropna()
+    rollups['last_meter'] = float(last.iloc[-1]) if not last.empty else None
+    return rollups
+
+
+def rollup_frame(rollups, period):
+    rows = []
+    for key in sorted(rollups[period]):
+        bucket = rollups[period][key]
+        row = {'Period': key, 'Rows': bucket['rows'], 'Production': bucket['production']}
+        for col, stats in bucket['columns'].items():
+            row[f"{col}_min"] = stats['min']
+            row[f"{col}_max"] = stats['max']
+            row[f"{col}_mean"] = stats['sum'] / stats['count']
+        rows.append(row)
+    return pd.DataFrame(rows)
@@ -1,31 +1,256 @@
 import pandas as pd
+import numpy as np
 import json
 import os
+import shutil
+import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
 
+import rollups
+
+OPERATIONAL_COLUMNS = [
+    'Date', 'P_In', 'P_Out', 'P_Perm', 'P_Rej', 'P_Rec',
+    'F_Perm', 'F_Rej', 'F_Rec', 'Meter_Reading'
+]
+
+
+def _to_datetime(values):
+    # Hourly rows are stored with a time and form rows with only the date;
+    # ISO8601 parses both in the same column.
+    return pd.to_datetime(values, format='ISO8601')
+
+
+def _file_version(path):
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class CSVBackend:
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def version(self):
+        return _file_version(self.path)
+
+    def read(self, columns=None):
+        usecols = None if columns is None else lambda col: col in columns
+        df = pd.read_csv(self.path, usecols=usecols)
+        if 'Date' in df:
+            df['Date'] = _to_datetime(df['Date'])
+        return df
+
+    def append(self, data):
+        # Only the new row is written, in the column order of the existing header
+        header = pd.read_csv(self.path, nrows=0).columns
+        pd.DataFrame([data]).reindex(columns=header).to_csv(self.path, mode='a', header=False, index=False)
+
+    def write(self, df):
+        df.to_csv(self.path, index=False)
+
+
+class ColumnarBackend:
+    # One raw little-endian file per column (float64, Date as int64 seconds),
+    # memory-mapped on read so the dashboard only touches the columns it plots.
+    DATE_DTYPE = np.dtype('<i8')
+    VALUE_DTYPE = np.dtype('<f8')
+
+    def __init__(self, directory, columns=OPERATIONAL_COLUMNS):
+        self.directory = directory
+        self.columns = list(columns)
+        os.makedirs(directory, exist_ok=True)
+
+    def _column_path(self, column):
+        return os.path.join(self.directory, f"{column}.bin")
+
+    def _dtype(self, column):
+        return self.DATE_DTYPE if column == 'Date' else self.VALUE_DTYPE
+
+    def __len__(self):
+        # A crash between column writes can leave some columns one row longer;
+        # the shortest column is the committed length.
+        sizes = [
+            os.path.getsize(self._column_path(col)) // self._dtype(col).itemsize
+            if os.path.exists(self._column_path(col)) else 0
+            for col in self.columns
+        ]
+        return min(sizes)
+
+    def exists(self):
+        return len(self) > 0
+
+    def version(self):
+        return tuple(_file_version(self._column_path(col)) for col in self.columns)
+
+    def _encode(self, column, values):
+        if column == 'Date':
+            return _to_datetime(values).values.astype('datetime64[s]').astype(self.DATE_DTYPE)
+        return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=self.VALUE_DTYPE)
+
+    def read(self, columns=None):
+        columns = self.columns if columns is None else [col for col in self.columns if col in columns]
+        rows = len(self)
+        data = {}
+        for col in columns:
+            if rows == 0:
+                values = np.empty(0, dtype=self._dtype(col))
+            else:
+                values = np.memmap(self._column_path(col), dtype=self._dtype(col), mode='r', shape=(rows,))
+            if col == 'Date':
+                values = values.view('datetime64[s]')
+            data[col] = values
+        return pd.DataFrame(data, columns=columns, copy=False)
+
+    def append(self, data):
+        rows = len(self)
+        for col in self.columns:
+            path = self._column_path(col)
+            with open(path, 'ab') as f:
+                f.truncate(rows * self._dtype(col).itemsize)
+                f.write(self._encode(col, [data.get(col, np.nan)]).tobytes())
+
+    def write(self, df):
+        tmp_dir = self.directory + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for col in self.columns:
+            values = df[col] if col in df else pd.Series(np.nan, index=df.index)
+            self._encode(col, values).tofile(os.path.join(tmp_dir, f"{col}.bin"))
+        old_dir = self.directory + '.old'
+        shutil.rmtree(old_dir, ignore_errors=True)
+        os.replace(self.directory, old_dir)
+        os.replace(tmp_dir, self.directory)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class SQLiteBackend:
+    # One table with an index on Date, in WAL mode so the dashboard can keep
+    # reading while a save is in progress. PRAGMA user_version counts writes
+    # and is the cache version.
+    TABLE = 'operational'
+
+    def __init__(self, path, columns=OPERATIONAL_COLUMNS):
+        self.path = path
+        self.columns = list(columns)
+        definition = ', '.join(
+            ['Date TEXT NOT NULL'] + [f"{col} REAL" for col in self.columns if col != 'Date']
+        )
+        with self._connect() as conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.TABLE} ({definition})")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.TABLE}_date ON {self.TABLE} (Date)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def exists(self):
+        with self._connect() as conn:
+            return conn.execute(f"SELECT 1 FROM {self.TABLE} LIMIT 1").fetchone() is not None
+
+    def version(self):
+        with self._connect() as conn:
+            return conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def read(self, columns=None):
+        columns = self.columns if columns is None else [col for col in self.columns if col in columns]
+        with self._connect() as conn:
+            df = pd.read_sql_query(
+                f"SELECT {', '.join(columns)} FROM {self.TABLE} ORDER BY rowid", conn
+            )
+        if 'Date' in df:
+            df['Date'] = _to_datetime(df['Date'])
+        return df
+
+    def _rows(self, df):
+        df = df.reindex(columns=self.columns)
+        df['Date'] = _to_datetime(df['Date']).dt.strftime('%Y-%m-%d %H:%M:%S')
+        values = df.astype(object).where(df.notna(), None)
+        return values.itertuples(index=False, name=None)
+
+    def _insert(self, conn, df):
+        marks = ', '.join('?' * len(self.columns))
+        conn.executemany(
+            f"INSERT INTO {self.TABLE} ({', '.join(self.columns)}) VALUES ({marks})", self._rows(df)
+        )
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        conn.execute(f"PRAGMA user_version = {version + 1}")
+
+    def append(self, data):
+        # The connection context manager commits the insert and the version together
+        with self._connect() as conn:
+            self._insert(conn, pd.DataFrame([data]))
+
+    def write(self, df):
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.TABLE}")
+            self._insert(conn, df)
+
+
 class ROStorage:
-    def __init__(self, base_path):
+    BACKENDS = ('csv', 'columnar', 'sqlite')
+
+    def __init__(self, base_path, backend=None):
         self.base_path = base_path
         self.config_path = os.path.join(base_path, 'config.json')
         self.operational_path = os.path.join(base_path, 'operational_data.csv')
+        self.columnar_path = os.path.join(base_path, 'operational_data.columns')
+        self.sqlite_path = os.path.join(base_path, 'operational_data.sqlite3')
         self.inventory_path = os.path.join(base_path, 'inventory.csv')
+        self.rollups_path = os.path.join(base_path, 'rollups.json')
         self._ensure_files()
+        self.backend_name = backend or self.load_config().get('storage_backend', 'csv')
+        self.operational = self._create_backend(self.backend_name)
+        # A config written before switch_backend existed: import the CSV history
+        csv = CSVBackend(self.operational_path)
+        if self.backend_name != 'csv' and not self.operational.exists() and csv.exists():
+            self.operational.write(csv.read())
+
+    def _create_backend(self, name):
+        if name not in self.BACKENDS:
+            raise ValueError(f"Backend de almacenamiento no soportado: {name}")
+        if name == 'columnar':
+            return ColumnarBackend(self.columnar_path)
+        if name == 'sqlite':
+            return SQLiteBackend(self.sqlite_path)
+        return CSVBackend(self.operational_path)
+
+    def switch_backend(self, name):
+        # Only the configured backend holds the history: it is copied whole
+        # into the new one before the config points there, so going back to
+        # an earlier format never shows it as it was when it was left.
+        if name == self.backend_name:
+            return
+        backend = self._create_backend(name)
+        backend.write(self.operational.read())
+        config = self.load_config()
+        config['storage_backend'] = name
+        self.save_config(config)
+        self.backend_name = name
+        self.operational = backend
 
     def _ensure_files(self):
         if not os.path.exists(self.base_path):
             os.makedirs(self.base_path)
-        
+
         # Initial config
         if not os.path.exists(self.config_path):
             with open(self.config_path, 'w') as f:
-                json.dump({"threshold_dp": 2.5, "critical_stock_pct": 20}, f)
+                json.dump({"threshold_dp": 2.5, "critical_stock_pct": 20, "storage_backend": "csv"}, f)
 
         # Operational data
         if not os.path.exists(self.operational_path):
-            df = pd.DataFrame(columns=[
-                'Date', 'P_In', 'P_Out', 'P_Perm', 'P_Rej', 'P_Rec',
-                'F_Perm', 'F_Rej', 'F_Rec', 'Meter_Reading'
-            ])
+            df = pd.DataFrame(columns=OPERATIONAL_COLUMNS)
             df.to_csv(self.operational_path, index=False)
 
         # Inventory
@@ -45,13 +270,65 @@ class ROStorage:
         with open(self.config_path, 'w') as f:
             json.dump(config, f)
 
-    def get_operational_data(self):
-        return pd.read_csv(self.operational_path)
+    def operational_version(self):
+        return (self.backend_name, self.operational.version())
+
+    def _rollup_version(self):
+        # JSON round-trip so it compares equal to the copy stored in rollups.json
+        return json.loads(json.dumps(self.operational_version()))
+
+    def inventory_version(self):
+        return _file_version(self.inventory_path)
+
+    def get_operational_data(self, columns=None):
+        return self.operational.read(columns)
 
     def save_operational_entry(self, data):
-        df = self.get_operational_data()
-        df = pd.concat([df, pd.DataFrame([data])], ignore_index=True)
-        df.to_csv(self.operational_path, index=False)
+        before = self._rollup_version()
+        self.operational.append(data)
+        # Rollups follow the entry incrementally when they were built from the
+        # data as it was just before this append; otherwise (first use, file
+        # edited or imported) they are rebuilt from the whole history.
+        current = self._read_rollups()
+        if current is not None and current['version'] == before:
+            current = rollups.add_entry(current, data)
+            current['version'] = self._rollup_version()
+        else:
+            current = self._build_rollups()
+        self._write_rollups(current)
+
+    def _read_rollups(self):
+        if not os.path.exists(self.rollups_path):
+            return None
+        with open(self.rollups_path, 'r') as f:
+            return json.load(f)
+
+    def _write_rollups(self, data):
+        tmp_path = self.rollups_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.rollups_path)
+
+    def _build_rollups(self):
+        columns = ['Date', 'Meter_Reading'] + rollups.ROLLUP_COLUMNS
+        return rollups.build_rollups(self.operational.read(columns), self._rollup_version())
+
+    def get_rollups(self, period='day'):
+        current = self._read_rollups()
+        if current is None or current['version'] != self._rollup_version():
+            current = self._build_rollups()
+            self._write_rollups(current)
+        return rollups.rollup_frame(current, period)
+
+    def import_csv(self, path):
+        self.operational.write(CSVBackend(path).read())
+
+    def export_csv(self, path):
+        df = self.operational.read()
+        if 'Date' in df:
+            daily = (df['Date'].dt.normalize() == df['Date']).all()
+            df['Date'] = df['Date'].dt.strftime('%Y-%m-%d' if daily else '%Y-%m-%d %H:%M:%S')
+        df.to_csv(path, index=False)
 
     def get_inventory(self):
         return pd.read_csv(self.inventory_path)